@@ -0,0 +1,86 @@
+"""
+Cost and size of the "features" context mode at 10k points per series.
+
+Usage:  python benchmarks/bench_features.py [--points 10000] [--repeat 20] [--no-numpy]
+
+Reports the time `features.digest` takes per series, the time to build
+each context mode for four series, and the prompt tokens of the feature
+digest against the packed raw context (700-token budget) and against the
+full raw arrays the LLM would otherwise need to see.
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import math
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import features  # noqa: E402
+import lazy      # noqa: E402
+import utils     # noqa: E402
+from series import Series  # noqa: E402
+
+
+def _payload(n: int, seed: int = 0):
+    """Hourly vitals with daily cycles, a glucose level shift and spikes."""
+    rnd = random.Random(seed)
+    t0 = 1_700_000_000
+    ts = [t0 + i * 3600 for i in range(n)]
+    day = [math.sin(2 * math.pi * (i % 24) / 24) for i in range(n)]
+    glucose = [110 + 25 * day[i] + rnd.gauss(0, 8) + (25 if i > 0.7 * n else 0)
+               + (140 if rnd.random() < 0.001 else 0) for i in range(n)]
+    return {
+        "glucose": Series(glucose, ts),
+        "weight":  Series([82 - i * 0.0004 + rnd.gauss(0, 0.3) for i in range(n)], ts),
+        "bp_sys":  Series([124 + 4 * day[i] + rnd.gauss(0, 5) for i in range(n)], ts),
+        "bp_dia":  Series([80 + 3 * day[i] + rnd.gauss(0, 4) for i in range(n)], ts),
+    }
+
+
+def _median_ms(fn, repeat: int) -> float:
+    fn()  # warm-up (lazy NumPy import, caches)
+    out = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t) * 1e3)
+    return round(statistics.median(out), 3)
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--points", type=int, default=10_000)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--budget", type=int, default=700)
+    ap.add_argument("--no-numpy", action="store_true", help="force the pure-Python path")
+    args = ap.parse_args(argv)
+    if args.no_numpy:
+        lazy.np = None
+
+    ts = _payload(args.points)
+    res = {"numpy": lazy.numpy() is not None, "points_per_series": args.points}
+    res["digest_ms"] = {k: _median_ms(lambda v=v, k=k: features.digest(v, k), args.repeat)
+                        for k, v in ts.items()}
+    res["context_ms"] = {
+        mode: _median_ms(lambda m=mode: utils.build_context_from_payload("q", ts, args.budget, mode=m),
+                         args.repeat)
+        for mode in utils.CONTEXT_MODES
+    }
+    full = utils._dumps(ts)
+    toks = {"raw_full": utils.est_tokens(full)}
+    for mode in utils.CONTEXT_MODES:
+        toks[mode] = utils.est_tokens(utils.build_context_from_payload("q", ts, args.budget, mode=mode))
+    res["tokens"] = toks
+    res["reduction_vs_raw_full"] = round(toks["raw_full"] / toks["features"], 1)
+    res["reduction_vs_raw_packed"] = round(toks["raw"] / toks["features"], 1)
+    print(json.dumps(res, indent=2))
+
+
+if __name__ == "__main__":
+    main()
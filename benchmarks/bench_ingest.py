@@ -0,0 +1,100 @@
+"""
+Peak memory and time to ingest a ~5 MB request body.
+
+Usage:  python benchmarks/bench_ingest.py [--mb 5] [--repeat 3]
+
+Compares the old path (`json.loads` + `validate_payload`) with
+`ingest.parse_body` + `validate_payload`.  Each variant runs in a fresh
+interpreter so peak RSS (ru_maxrss) is not polluted by the other; the
+tracemalloc peak is reported alongside.
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+
+def make_body(mb: float, seed: int = 0) -> str:
+    """Timed glucose objects, numeric weight, and large unknown series."""
+    rnd = random.Random(seed)
+    t0 = 1_700_000_000
+    target = int(mb * 1024 * 1024)
+    n = max(target // 82, 100)
+    body = {
+        "prompt": "How has my glucose trended this month?",
+        "timeseries": {
+            "glucose": [{"timestamp": t0 + i * 300, "value": round(rnd.gauss(110, 15), 1)}
+                        for i in range(n)],
+            "weight": [round(80 + rnd.random(), 2) for _ in range(n)],
+            "steps": [{"timestamp": t0 + i * 60, "value": rnd.randrange(200)} for i in range(n // 2)],
+            "sleep": [{"start": "2025-07-01T23:00:00Z", "stage": "rem"}] * (n // 4),
+        },
+    }
+    return json.dumps(body)
+
+
+def _run(variant: str, path: str, repeat: int) -> dict:
+    import utils
+    import ingest
+
+    text = Path(path).read_text(encoding="utf-8")
+    if variant == "json.loads":
+        run = lambda: utils.validate_payload(json.loads(text))  # noqa: E731
+    else:
+        run = lambda: utils.validate_payload(  # noqa: E731
+            ingest.parse_body(text, utils.MAX_INPUT_POINTS, utils._ALIASES))
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - t)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"variant": variant, "body_mb": round(len(text) / 2**20, 2),
+            "ms": round(min(times) * 1000, 1), "tracemalloc_peak_mb": round(peak / 2**20, 1),
+            "rss_growth_mb": round((rss - base) / 1024, 1)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mb", type=float, default=5.0)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--variant", help=argparse.SUPPRESS)
+    ap.add_argument("--body", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.variant:
+        print(json.dumps(_run(args.variant, args.body, args.repeat)))
+        return
+    # the body is generated here so building it does not inflate the
+    # children's baseline RSS
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as fh:
+        fh.write(make_body(args.mb))
+    try:
+        for variant in ("json.loads", "ingest"):
+            out = subprocess.run([sys.executable, __file__, "--variant", variant,
+                                  "--body", fh.name, "--repeat", str(args.repeat)],
+                                 check=True, capture_output=True, text=True).stdout
+            r = json.loads(out)
+            print(f"{r['variant']:>10}: {r['body_mb']} MB body  {r['ms']:>7} ms  "
+                  f"peak alloc {r['tracemalloc_peak_mb']:>6} MB  RSS growth {r['rss_growth_mb']:>6} MB")
+    finally:
+        os.unlink(fh.name)
+
+
+if __name__ == "__main__":
+    main()
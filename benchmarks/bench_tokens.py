@@ -0,0 +1,86 @@
+"""
+Token-counting cost of `build_context_from_payload` at 10k points.
+
+Usage:  python benchmarks/bench_tokens.py [--points 10000] [--repeat 20]
+
+Reports, per request, the wall time spent inside the token counter
+with a cold fragment memo (new vitals) and a warm one (follow-up
+question over the same vitals), plus how full the budget ended up.
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import tokens  # noqa: E402
+import utils   # noqa: E402
+from series import Series  # noqa: E402
+
+
+def _payload(n: int, seed: int = 0):
+    rnd = random.Random(seed)
+    t0 = 1_700_000_000
+    ts = [t0 + i * 300 for i in range(n)]
+    return {
+        "glucose": Series([float(rnd.randint(70, 200)) for _ in range(n)], ts),
+        "weight":  Series([round(rnd.uniform(60, 90), 1) for _ in range(n)], ts),
+        "bp_sys":  Series([float(rnd.randint(100, 160)) for _ in range(n)], ts),
+        "bp_dia":  Series([float(rnd.randint(60, 100)) for _ in range(n)], ts),
+    }
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--points", type=int, default=10_000)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--budget", type=int, default=700)
+    args = ap.parse_args(argv)
+
+    counter = tokens.get_counter()
+    spent = [0.0]
+    inner = counter.count
+
+    def timed(text: str) -> int:
+        t = time.perf_counter()
+        try:
+            return inner(text)
+        finally:
+            spent[0] += time.perf_counter() - t
+
+    counter.count = timed
+    ts = _payload(args.points)
+    utils.build_context_from_payload("q", ts, args.budget)  # import/JIT warm-up
+
+    res = {}
+    for mode in ("cold", "warm"):
+        count_ms, total_ms = [], []
+        for _ in range(args.repeat):
+            if mode == "cold":
+                tokens.clear_memo()
+            spent[0] = 0.0
+            t = time.perf_counter()
+            ctx = utils.build_context_from_payload("q", ts, args.budget)
+            total_ms.append((time.perf_counter() - t) * 1e3)
+            count_ms.append(spent[0] * 1e3)
+        res[mode] = {
+            "count_ms_median": round(statistics.median(count_ms), 3),
+            "count_ms_max": round(max(count_ms), 3),
+            "build_ms_median": round(statistics.median(total_ms), 3),
+        }
+    counter.count = inner
+    res["counter"] = counter.name
+    res["points_per_series"] = args.points
+    res["budget"] = args.budget
+    res["tokens_used"] = utils.est_tokens(ctx)
+    print(json.dumps(res, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Tokens per 1k points of each raw-context encoding (see src/wire.py).
+
+Usage:  python benchmarks/bench_wire.py [--days 30] [--repeat 10] [--budget 700] [--no-numpy]
+
+Builds realistic vitals (5-minute CGM glucose as a random walk, a daily
+weight that often repeats, blood pressure twice a day), then reports per
+encoding: prompt tokens and characters per 1k points for the full
+history, encode / decode time, and how many points fit into `--budget`
+context tokens once packed.  Only "columns" carries timestamps; the
+JSON forms send values alone.
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import lazy   # noqa: E402
+import utils  # noqa: E402
+import wire   # noqa: E402
+from series import Series  # noqa: E402
+
+
+def _payload(days: int, seed: int = 0):
+    rnd = random.Random(seed)
+    t0 = 1_700_000_000
+    n = days * 288
+    g, glucose = 120.0, []
+    for _ in range(n):
+        g = min(max(g + rnd.gauss(0, 3), 55.0), 320.0)
+        glucose.append(round(g))
+    w, weight = 82.0, []
+    for _ in range(days):
+        if rnd.random() < 0.4:
+            w += rnd.choice((-0.1, 0.1, -0.2, 0.2))
+        weight.append(w)
+    bp_ts = [t0 + d * 86_400 + h * 3600 for d in range(days) for h in (7, 19)]
+    return {
+        "glucose": Series(glucose, [t0 + i * 300 for i in range(n)]),
+        "weight":  Series(weight, [t0 + d * 86_400 + 6 * 3600 for d in range(days)]),
+        "bp_sys":  Series([rnd.randint(110, 140) for _ in bp_ts], bp_ts),
+        "bp_dia":  Series([rnd.randint(70, 92) for _ in bp_ts], bp_ts),
+    }
+
+
+def _median_ms(fn, repeat: int) -> float:
+    fn()  # warm-up (lazy NumPy import, caches)
+    out = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t) * 1e3)
+    return round(statistics.median(out), 3)
+
+
+def _points(ctx: str, encoding: str) -> int:
+    data = json.loads(ctx) if encoding == "json" else wire.decode(ctx, encoding)
+    return sum(len(v) for v in data.values())
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--repeat", type=int, default=10)
+    ap.add_argument("--budget", type=int, default=700)
+    ap.add_argument("--no-numpy", action="store_true", help="force the pure-Python path")
+    args = ap.parse_args(argv)
+    if args.no_numpy:
+        lazy.np = None
+
+    ts = _payload(args.days)
+    total = sum(len(v) for v in ts.values())
+    res = {"numpy": lazy.numpy() is not None, "points": total, "budget": args.budget, "encodings": {}}
+    for enc in utils.CONTEXT_ENCODINGS:
+        full = utils._dumps(ts, enc)
+        packed = utils.build_context_from_payload("q", ts, args.budget, encoding=enc)
+        row = {
+            "tokens_per_1k_points": round(utils.est_tokens(full) * 1000 / total, 1),
+            "chars_per_1k_points": round(len(full) * 1000 / total),
+            "encode_ms": _median_ms(lambda e=enc: utils._dumps(ts, e), args.repeat),
+            "points_in_budget": _points(packed, enc),
+        }
+        if enc != "json":
+            row["decode_ms"] = _median_ms(lambda f=full, e=enc: wire.decode(f, e), args.repeat)
+        res["encodings"][enc] = row
+    base = res["encodings"]["json"]["tokens_per_1k_points"]
+    for row in res["encodings"].values():
+        row["vs_json"] = round(row["tokens_per_1k_points"] / base, 2)
+    print(json.dumps(res, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Per-module import cost of the Lambda entry point (cold-start budget).
+
+Usage:  python benchmarks/import_time.py [--module handler] [--budget-ms 250] [--top 15]
+
+Runs `python -X importtime -c "import <module>"` from src/ in a fresh
+interpreter (best of `--runs`) and prints the most expensive modules by
+self time.  Exits non-zero when the module's cumulative import time is
+over budget; tests/test_import_time.py applies the same check.
+"""
+
+from __future__ import annotations
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+SRC = Path(__file__).resolve().parents[1] / "src"
+
+# Settings that legitimately pull in boto3/numpy at import time.
+_EAGER_ENV = ("PREWARM", "USE_TIMESTREAM", "RESPONSE_CACHE_TABLE")
+
+Row = Tuple[str, int, int]  # (module, self us, cumulative us)
+
+
+def measure(module: str = "handler", env: Optional[Dict[str, str]] = None) -> List[Row]:
+    """Import rows for one fresh interpreter, in import order."""
+    if env is None:
+        env = {k: v for k, v in os.environ.items() if k not in _EAGER_ENV}
+        env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=SRC, env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cum_us)))
+    return rows
+
+
+def best_of(module: str = "handler", runs: int = 3) -> List[Row]:
+    """The run with the lowest cumulative time for `module`."""
+    return min((measure(module) for _ in range(runs)), key=lambda r: total_ms(r, module))
+
+
+def total_ms(rows: List[Row], module: str = "handler") -> float:
+    return next(cum for name, _, cum in rows if name == module) / 1000.0
+
+
+def report(rows: List[Row], top: int = 15) -> str:
+    lines = [f"{'self ms':>8} {'cum ms':>8}  module"]
+    for name, self_us, cum_us in sorted(rows, key=lambda r: -r[1])[:top]:
+        lines.append(f"{self_us / 1000:8.1f} {cum_us / 1000:8.1f}  {name}")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--module", default="handler")
+    ap.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "250")))
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--top", type=int, default=15)
+    args = ap.parse_args()
+    rows = best_of(args.module, args.runs)
+    total = total_ms(rows, args.module)
+    print(report(rows, args.top))
+    print(f"\nimport {args.module}: {total:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    sys.exit(0 if total <= args.budget_ms else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""
+Load generator for the handler, with a latency-modelled Bedrock stand-in.
+
+Usage:
+    python benchmarks/loadgen.py [--corpus payload.json|requests.jsonl] [--rps 20]
+        [--concurrency 8] [--requests 200] [--target inproc|http] [--url URL]
+        [--median-ms 800] [--throttle-rate 0.02] [--max-inflight 0] [--time-scale 1.0]
+
+Replays a corpus of request bodies against `handler.handler`, either
+in-process or over HTTP (`dev_server`, started on a free port unless
+`--url` names a running one), at a fixed offered rate with at most
+`--concurrency` requests in flight.  A corpus is a `.json` file holding
+one payload (the shape of payload.json) or a list of them, or a
+`.jsonl` file with one payload - or one `{"body": ...}` event - per
+line.  Without `--corpus`, synthetic payloads of 10 to 1000 points are
+used.
+
+`FakeBedrock` replaces the Bedrock client: each call sleeps for a
+log-normal base latency plus a per-token cost for the estimated input
+and the sampled output tokens, and fails with a ThrottlingException
+at `--throttle-rate` or when more than `--max-inflight` calls overlap.
+`--time-scale` shrinks every modelled delay, for quick runs.
+
+Prints one JSON report: latency percentiles (from each request's
+scheduled start, so queueing behind a full pool counts), throughput,
+errors by type, handler CPU time per request (thread CPU, which
+excludes the modelled waits), peak RSS and, with `--trace-memory`,
+traced allocation peaks.  `--warmup` requests (default 1) run first
+and are not counted, so one-off lazy imports do not skew the tail.
+"""
+
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import http.client
+import io
+import json
+import math
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.parse
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("MODEL_ID", "bench-model")
+
+import cache       # noqa: E402
+import dev_server  # noqa: E402
+import handler     # noqa: E402
+import metrics     # noqa: E402
+import utils       # noqa: E402
+
+# ------------------------------------------------------------------ #
+# Bedrock stand-in
+# ------------------------------------------------------------------ #
+
+
+class ThrottlingException(Exception):
+    """Shaped like botocore's ClientError for a throttled InvokeModel."""
+
+    def __init__(self) -> None:
+        super().__init__("An error occurred (ThrottlingException) when calling the "
+                         "InvokeModel operation: Too many requests, please wait before trying again.")
+        self.response = {"Error": {"Code": "ThrottlingException"},
+                         "ResponseMetadata": {"HTTPStatusCode": 429}}
+
+
+class FakeBedrock:
+    """
+    `invoke_model` with modelled latency:
+        base   ~ log-normal(median_ms, sigma)
+        + ms_per_input_token  x estimated prompt tokens
+        + ms_per_output_token x sampled output tokens (capped by max_tokens)
+    all multiplied by `time_scale`.  Thread-safe; counts calls.
+    """
+
+    def __init__(
+        self,
+        median_ms: float = 800.0,
+        sigma: float = 0.35,
+        ms_per_input_token: float = 0.05,
+        ms_per_output_token: float = 12.0,
+        output_tokens=(60, 300),
+        throttle_rate: float = 0.0,
+        max_inflight: int = 0,
+        time_scale: float = 1.0,
+        seed: int = 0,
+    ) -> None:
+        self.median_ms, self.sigma = median_ms, sigma
+        self.ms_per_input_token, self.ms_per_output_token = ms_per_input_token, ms_per_output_token
+        self.output_tokens = output_tokens
+        self.throttle_rate, self.max_inflight = throttle_rate, max_inflight
+        self.time_scale = time_scale
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self.inflight = self.calls = self.throttled = 0
+        self.modelled_ms: List[float] = []
+
+    def latency_ms(self, input_tokens: int, output_tokens: int) -> float:
+        with self._lock:
+            base = self.median_ms * math.exp(self._rnd.gauss(0.0, self.sigma))
+        return base + self.ms_per_input_token * input_tokens + self.ms_per_output_token * output_tokens
+
+    def invoke_model(self, modelId, body, **_):  # noqa: N803 - boto3 naming
+        req = json.loads(body)
+        in_tokens = utils.est_tokens(body.decode() if isinstance(body, bytes) else body)
+        with self._lock:
+            self.calls += 1
+            throttle = (self.max_inflight and self.inflight >= self.max_inflight) \
+                or self._rnd.random() < self.throttle_rate
+            if throttle:
+                self.throttled += 1
+            else:
+                self.inflight += 1
+            lo, hi = self.output_tokens
+            out_tokens = min(self._rnd.randint(lo, hi),
+                             req.get("max_tokens") or (req.get("inferenceConfig") or {}).get("maxTokens") or hi)
+        if throttle:
+            time.sleep(0.02 * self.time_scale)  # the service answers 429s quickly
+            raise ThrottlingException()
+        try:
+            ms = self.latency_ms(in_tokens, out_tokens)
+            time.sleep(ms * self.time_scale / 1000.0)
+        finally:
+            with self._lock:
+                self.inflight -= 1
+                self.modelled_ms.append(ms)
+        text = " ".join(["steady"] * out_tokens)
+        payload = {"content": [{"type": "text", "text": text}],
+                   "usage": {"input_tokens": in_tokens, "output_tokens": out_tokens}}
+        return {"body": io.BytesIO(json.dumps(payload).encode())}
+
+# ------------------------------------------------------------------ #
+# Corpus
+# ------------------------------------------------------------------ #
+
+_QUESTIONS = ("How is my glucose doing?", "What's my latest BP?", "How has my weight trended this month?",
+              "Why was my sugar high yesterday?", "Summarise my vitals for the last week.")
+
+
+def synthetic_corpus(n: int = 50, seed: int = 0) -> List[str]:
+    """Request bodies with 10-1000 points per series and a mix of questions."""
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        points = rnd.choice((10, 100, 1000))
+        series = {k: [round(rnd.gauss(mu, sd), 1) for _ in range(points)]
+                  for k, (mu, sd) in {"glucose": (110, 15), "weight": (81, 0.5),
+                                      "bp_sys": (125, 8), "bp_dia": (80, 5)}.items()}
+        out.append(json.dumps({"prompt": _QUESTIONS[i % len(_QUESTIONS)], "timeseries": series}))
+    return out
+
+
+def load_corpus(path: str) -> List[str]:
+    """Request bodies from a .json payload (or list) or a .jsonl file."""
+    text = Path(path).read_text(encoding="utf-8")
+    if path.endswith(".jsonl"):
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        doc = json.loads(text)
+        items = doc if isinstance(doc, list) else [doc]
+    bodies = []
+    for item in items:
+        body = item.get("body") if isinstance(item, dict) and "body" in item else item
+        bodies.append(body if isinstance(body, str) else json.dumps(body))
+    if not bodies:
+        raise ValueError(f"{path}: empty corpus")
+    return bodies
+
+# ------------------------------------------------------------------ #
+# Targets
+# ------------------------------------------------------------------ #
+
+
+def _inproc(body: str) -> int:
+    return handler.handler({"body": body}, None)["statusCode"]
+
+
+class _HttpTarget:
+    """One keep-alive connection per worker thread."""
+
+    def __init__(self, url: str) -> None:
+        u = urllib.parse.urlsplit(url)
+        self.host, self.port, self.path = u.hostname, u.port or 80, u.path or "/query"
+        self._local = threading.local()
+
+    def __call__(self, body: str) -> int:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            conn.request("POST", self.path, body.encode(), {"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            resp.read()
+            return resp.status
+        except Exception:
+            conn.close()
+            self._local.conn = None
+            raise
+
+# ------------------------------------------------------------------ #
+# Driver
+# ------------------------------------------------------------------ #
+
+
+def _pct(sorted_vals: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile."""
+    if not sorted_vals:
+        return None
+    k = max(math.ceil(p / 100.0 * len(sorted_vals)) - 1, 0)
+    return round(sorted_vals[k], 3)
+
+
+def _summary(vals: List[float]) -> Dict:
+    s = sorted(vals)
+    return {"p50": _pct(s, 50), "p95": _pct(s, 95), "p99": _pct(s, 99),
+            "max": _pct(s, 100), "mean": round(sum(s) / len(s), 3) if s else None}
+
+
+def _rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run(
+    corpus: List[str],
+    rps: float = 20.0,
+    concurrency: int = 8,
+    requests: int = 200,
+    target: str = "inproc",
+    url: Optional[str] = None,
+    bedrock: Optional[FakeBedrock] = None,
+    keep_cache: bool = False,
+    trace_memory: bool = False,
+    warmup: int = 1,
+) -> Dict:
+    """Drive `requests` requests at `rps`; returns the report dict."""
+    bedrock = bedrock or FakeBedrock()
+    saved = (handler.__dict__.get("bedrock"), handler.RESPONSE_CACHE, handler.handler)
+    handler.bedrock = bedrock
+    if not keep_cache:
+        handler.RESPONSE_CACHE = cache.TieredCache(cache.LRUCache(0))  # every request reaches the model
+    sinks = metrics.set_sinks([metrics.emf_line])  # format the metrics line, print nothing
+    cpu_ms: List[float] = []
+    alloc_kb: List[float] = []
+    inner = saved[2]
+
+    def measured(event, context):
+        # runs on whichever thread serves the request (worker or HTTP server)
+        t = time.thread_time()
+        if trace_memory and concurrency == 1:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        try:
+            return inner(event, context)
+        finally:
+            cpu_ms.append((time.thread_time() - t) * 1000.0)
+            if trace_memory and concurrency == 1:
+                alloc_kb.append((tracemalloc.get_traced_memory()[1] - base) / 1024.0)
+
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def one(call, body: str, scheduled: float) -> None:
+        try:
+            key = str(call(body))
+        except Exception as err:  # an unhandled handler error, as Lambda would report it
+            key = type(err).__name__
+        done = time.perf_counter()
+        with lock:
+            latencies.append((done - scheduled) * 1000.0)
+            statuses[key] = statuses.get(key, 0) + 1
+
+    server = None
+    try:
+        warm = time.perf_counter()
+        for body in corpus[:warmup]:  # lazy imports, token tables: not part of steady state
+            try:
+                inner({"body": body}, None)
+            except Exception:
+                pass
+        warm_ms = (time.perf_counter() - warm) * 1000.0
+        bedrock.calls = bedrock.throttled = 0
+        bedrock.modelled_ms.clear()
+
+        handler.handler = measured
+        if target == "http" and url is None:
+            server = dev_server.make_server(port=0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = f"http://127.0.0.1:{server.server_port}/query"
+        call = _HttpTarget(url) if target == "http" else _inproc
+        if trace_memory:
+            tracemalloc.start()
+
+        pool = ThreadPoolExecutor(max_workers=concurrency)
+        t0 = time.perf_counter()
+        for i in range(requests):
+            scheduled = t0 + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one, call, corpus[i % len(corpus)], scheduled)
+        pool.shutdown(wait=True)
+        elapsed = time.perf_counter() - t0
+        traced_peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        handler.handler = inner
+        metrics.set_sinks(sinks)
+        handler.RESPONSE_CACHE = saved[1]
+        if saved[0] is None:
+            handler.__dict__.pop("bedrock", None)
+        else:
+            handler.bedrock = saved[0]
+
+    ok = statuses.get("200", 0)
+    report = {
+        "target": target, "requests": requests, "offered_rps": rps, "concurrency": concurrency,
+        "duration_s": round(elapsed, 3), "throughput_rps": round(requests / elapsed, 2),
+        "warmup_ms": round(warm_ms, 1), "ok": ok, "error_rate": round(1 - ok / requests, 4), "statuses": statuses,
+        "latency_ms": _summary(latencies),
+        "cpu_ms_per_request": _summary(cpu_ms),
+        "memory": {"rss_peak_mb": _rss_mb()},
+        "bedrock": {"calls": bedrock.calls, "throttled": bedrock.throttled,
+                    "modelled_ms": _summary(bedrock.modelled_ms), "time_scale": bedrock.time_scale},
+    }
+    if traced_peak is not None:
+        report["memory"]["traced_peak_mb"] = round(traced_peak / 2**20, 2)
+    if alloc_kb:
+        report["memory"]["alloc_peak_kb_per_request"] = _summary(alloc_kb)
+    return report
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--corpus", help=".json payload(s) or .jsonl request bodies")
+    ap.add_argument("--rps", type=float, default=20.0)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--target", choices=("inproc", "http"), default="inproc")
+    ap.add_argument("--url", help="running server for --target http (default: start dev_server)")
+    ap.add_argument("--warmup", type=int, default=1, help="uncounted requests run first")
+    ap.add_argument("--keep-cache", action="store_true", help="leave the response cache on")
+    ap.add_argument("--trace-memory", action="store_true",
+                    help="tracemalloc peaks (per request only with --concurrency 1)")
+    ap.add_argument("--median-ms", type=float, default=800.0)
+    ap.add_argument("--sigma", type=float, default=0.35)
+    ap.add_argument("--ms-per-input-token", type=float, default=0.05)
+    ap.add_argument("--ms-per-output-token", type=float, default=12.0)
+    ap.add_argument("--throttle-rate", type=float, default=0.0)
+    ap.add_argument("--max-inflight", type=int, default=0, help="throttle above this many overlapping calls")
+    ap.add_argument("--time-scale", type=float, default=1.0, help="multiply every modelled delay")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--output", help="also write the report here")
+    args = ap.parse_args(argv)
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(seed=args.seed)
+    bedrock = FakeBedrock(args.median_ms, args.sigma, args.ms_per_input_token, args.ms_per_output_token,
+                          throttle_rate=args.throttle_rate, max_inflight=args.max_inflight,
+                          time_scale=args.time_scale, seed=args.seed)
+    report = run(corpus, args.rps, args.concurrency, args.requests, args.target, args.url,
+                 bedrock, args.keep_cache, args.trace_memory, args.warmup)
+    out = json.dumps(report, indent=2)
+    print(out)
+    if args.output:
+        Path(args.output).write_text(out + "\n")
+
+
+if __name__ == "__main__":
+    main()
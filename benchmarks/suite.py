@@ -0,0 +1,296 @@
+"""
+Micro-benchmarks for the utils pipeline and the handler hot path.
+
+Usage:
+    python benchmarks/suite.py [--sizes 10,100,1000,10000] [--output results.json]
+    python benchmarks/suite.py --no-numpy --compare benchmarks/baseline.json   # CI gate
+    python benchmarks/suite.py --no-numpy --output benchmarks/baseline.json    # refresh baseline
+
+Every stage is timed for each series size and payload shape:
+
+    flat    {"prompt", "glucose": [..], "systolic": [..], ...}  (aliases)
+    nested  {"prompt", "timeseries": {"glucose": [..], ...}}
+    timed   nested, with {"timestamp": ISO-8601, "value": v} points
+            (the shape of payload.json)
+
+Per benchmark we record the best per-call time (µs) over `--repeat`
+auto-ranged runs, the tracemalloc peak (bytes) of one call, and the
+number of blocks it allocated and kept.  Times are also stored relative
+to a fixed pure-Python calibration loop, so `--compare` can check
+results from a different machine against the stored baseline; the
+allocation figures are compared as-is.
+
+The calibration loop runs before and after every size/shape group and
+each group is scaled by the median of its runs, so a host that speeds
+up or slows down mid-suite does not skew every later entry.  Entries
+`--compare` flags are measured again (`--retries` times) and keep
+their best time before the gate fails.
+"""
+
+from __future__ import annotations
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("MODEL_ID", "bench-model")
+
+import cache    # noqa: E402
+import handler  # noqa: E402
+import ingest   # noqa: E402
+import lazy     # noqa: E402
+import metrics  # noqa: E402
+import utils    # noqa: E402
+
+SIZES = (10, 100, 1000, 10_000)
+SHAPES = ("flat", "nested", "timed")
+
+# ------------------------------------------------------------------ #
+# Payloads
+# ------------------------------------------------------------------ #
+
+_FLAT_KEYS = {"glucose": "glucose", "weight": "weight", "bp_sys": "systolic", "bp_dia": "diastolic"}
+_LEVELS = {"glucose": (110, 15), "weight": (81, 0.5), "bp_sys": (125, 8), "bp_dia": (80, 5)}
+
+
+def make_payload(n: int, shape: str, seed: int = 0) -> Dict:
+    rnd = random.Random(seed)
+    t0 = 1_750_000_000
+    series = {}
+    for name, (mu, sd) in _LEVELS.items():
+        vals = [round(rnd.gauss(mu, sd), 1) for _ in range(n)]
+        if shape == "timed":
+            series[name] = [{"timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(t0 + i * 3600)),
+                             "value": v} for i, v in enumerate(vals)]
+        else:
+            series[name] = vals
+    prompt = "How has my glucose trended over the last week?"
+    if shape == "flat":
+        return dict({"prompt": prompt}, **{_FLAT_KEYS[k]: v for k, v in series.items()})
+    return {"prompt": prompt, "timeseries": series}
+
+
+class _StubBedrock:
+    """Returns a fixed Claude-style answer without any network I/O."""
+
+    _BODY = json.dumps({"content": [{"type": "text", "text": "Your glucose is stable."}]}).encode()
+
+    def invoke_model(self, **_):
+        return {"body": io.BytesIO(self._BODY)}
+
+# ------------------------------------------------------------------ #
+# Stages
+# ------------------------------------------------------------------ #
+
+
+def stages(payload: Dict) -> Dict[str, Callable[[], object]]:
+    """Zero-argument callables for every stage, inputs prepared up front."""
+    body = json.dumps(payload)
+    event = {"body": body}
+    raw = payload.get("timeseries", payload)
+    glucose_raw = raw["glucose"]
+    _, ts = utils.validate_payload(payload)
+    summary = utils.summarise_vitals(**ts)
+    return {
+        "coerce_series": lambda: utils.coerce_series(glucose_raw),
+        "parse_body": lambda: ingest.parse_body(body, utils.MAX_INPUT_POINTS, utils._ALIASES),
+        "validate_payload": lambda: utils.validate_payload(payload),
+        "describe_series": lambda: utils.describe_series(ts["glucose"], "glucose", units=" mg/dL"),
+        "summarise_vitals": lambda: utils.summarise_vitals(**ts),
+        "build_context": lambda: utils.build_context_from_payload(payload["prompt"], ts),
+        "feature_digest": lambda: utils.build_context_from_payload(payload["prompt"], ts, mode="features"),
+        "trim_text_to_tokens": lambda: utils.trim_text_to_tokens(summary * 8, 60),
+        "handler": lambda: handler.handler(event, None),
+    }
+
+# ------------------------------------------------------------------ #
+# Measurement
+# ------------------------------------------------------------------ #
+
+
+def _per_call_us(fn: Callable[[], object], repeat: int, min_time: float) -> float:
+    gc_was_enabled = gc.isenabled()
+    gc.disable()  # as timeit does: collections land on whichever call is unlucky
+    try:
+        return _best_us(fn, repeat, min_time)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _best_us(fn: Callable[[], object], repeat: int, min_time: float) -> float:
+    number = 1
+    while True:  # auto-range: enough calls per run to be measurable
+        t = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - t
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed * 10 < min_time else 10 if elapsed == 0 else max(2, int(min_time / elapsed) + 1)
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        t = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - t) / number)
+    return best * 1e6
+
+
+def _allocs(fn: Callable[[], object]) -> Tuple[int, int]:
+    tracemalloc.start()
+    try:
+        before = sys.getallocatedblocks()
+        tracemalloc.reset_peak()
+        result = fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        kept = sys.getallocatedblocks() - before
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak, max(kept, 0)
+
+
+def calibrate() -> float:
+    """µs for a fixed pure-Python workload (machine-speed reference)."""
+    def work():
+        acc = 0.0
+        for i in range(20_000):
+            acc += (i % 7) * 1.5
+        return json.dumps([acc] * 200)
+    return _per_call_us(work, 5, 0.05)
+
+
+def run(sizes=SIZES, shapes=SHAPES, repeat: int = 5, min_time: float = 0.02, only=None) -> Dict:
+    """Measure every stage/shape/size (or just the keys in `only`)."""
+    saved = (handler.__dict__.get("bedrock"), handler.RESPONSE_CACHE)
+    handler.bedrock = _StubBedrock()
+    handler.RESPONSE_CACHE = cache.TieredCache(cache.LRUCache(0))  # always a miss
+    # keep the cost of formatting the metrics line, not the terminal output
+    sinks = metrics.set_sinks([metrics.emf_line])
+    try:
+        calibs = [calibrate()]
+        results = {}
+        for n in sizes:
+            for shape in shapes:
+                todo = {stage: fn for stage, fn in stages(make_payload(n, shape)).items()
+                        if only is None or f"{stage}/{shape}/{n}" in only}
+                if not todo:
+                    continue
+                group = {}
+                for stage, fn in todo.items():
+                    fn()  # warm memo tables / lazy imports
+                    us = _per_call_us(fn, repeat, min_time)
+                    peak, kept = _allocs(fn)
+                    group[f"{stage}/{shape}/{n}"] = {"us": round(us, 2), "peak_bytes": peak, "blocks": kept}
+                calibs.append(calibrate())
+                calib = statistics.median(calibs[-2:])  # the runs either side of the group
+                for key, r in group.items():
+                    results[key] = dict(r, rel=round(r["us"] / calib, 5), calib_us=round(calib, 2))
+        calib = statistics.median(calibs)
+    finally:
+        metrics.set_sinks(sinks)
+        handler.RESPONSE_CACHE = saved[1]
+        if saved[0] is None:
+            handler.__dict__.pop("bedrock", None)
+        else:
+            handler.bedrock = saved[0]
+    return {
+        "meta": {"python": platform.python_version(), "machine": platform.machine(),
+                 "numpy": getattr(lazy.numpy(), "__version__", None), "calibration_us": round(calib, 2)},
+        "results": results,
+    }
+
+# ------------------------------------------------------------------ #
+# Baseline comparison
+# ------------------------------------------------------------------ #
+
+
+def compare(
+    current: Dict,
+    baseline: Dict,
+    tolerance: float = 1.0,
+    min_us: float = 20.0,
+    min_bytes: int = 4096,
+) -> List[str]:
+    """
+    Regressions of `current` against `baseline`, one line each, starting
+    with the benchmark key.  Times are compared after calibration (`rel`
+    x the calibration of the entry's own group); a change must exceed
+    both the relative tolerance and the absolute floor to count, which
+    keeps tiny benchmarks from flapping.
+    """
+    calib = current["meta"]["calibration_us"]
+    out = []
+    for key, base in sorted(baseline["results"].items()):
+        cur = current["results"].get(key)
+        if cur is None:
+            continue
+        expect_us = base["rel"] * cur.get("calib_us", calib)
+        if cur["us"] > expect_us * (1 + tolerance) and cur["us"] - expect_us > min_us:
+            out.append(f"{key}: time {cur['us']:.1f} µs vs {expect_us:.1f} µs expected")
+        if (cur["peak_bytes"] > base["peak_bytes"] * (1 + tolerance)
+                and cur["peak_bytes"] - base["peak_bytes"] > min_bytes):
+            out.append(f"{key}: peak alloc {cur['peak_bytes']} B vs {base['peak_bytes']} B")
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--sizes", default=",".join(map(str, SIZES)))
+    ap.add_argument("--shapes", default=",".join(SHAPES))
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--output", help="write results JSON here")
+    ap.add_argument("--compare", help="baseline JSON; exit 1 on regressions")
+    ap.add_argument("--tolerance", type=float, default=1.0,
+                    help="allowed slowdown / allocation growth (1.0 = 2x)")
+    ap.add_argument("--retries", type=int, default=2,
+                    help="re-measure flagged entries this many times before failing")
+    ap.add_argument("--no-numpy", action="store_true",
+                    help="benchmark the pure-Python paths (CI does not install numpy)")
+    args = ap.parse_args()
+    if args.no_numpy:
+        sys.modules["numpy"] = None  # makes the lazy import report "not installed"
+
+    sizes, shapes = [int(s) for s in args.sizes.split(",")], args.shapes.split(",")
+    res = run(sizes, shapes, args.repeat)
+    regressions: List[str] = []
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if baseline["meta"].get("numpy") != res["meta"]["numpy"]:
+            print(f"note: baseline numpy={baseline['meta'].get('numpy')}, current={res['meta']['numpy']}")
+        regressions = compare(res, baseline, args.tolerance)
+        for _ in range(args.retries):
+            if not regressions:
+                break
+            flagged = {line.split(":", 1)[0] for line in regressions}
+            print(f"re-measuring {len(flagged)} flagged entr{'y' if len(flagged) == 1 else 'ies'}")
+            for key, r in run(sizes, shapes, args.repeat, only=flagged)["results"].items():
+                if r["rel"] < res["results"][key]["rel"]:  # keep each entry's best run
+                    res["results"][key] = r
+            regressions = compare(res, baseline, args.tolerance)
+    for key, r in res["results"].items():
+        print(f"{key:<36} {r['us']:>11.1f} µs {r['peak_bytes'] / 1024:>9.1f} KiB peak {r['blocks']:>6} blocks")
+    if args.output:
+        Path(args.output).write_text(json.dumps(res, indent=1, sort_keys=True) + "\n")
+    if args.compare:
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,9 +6,12 @@ from pathlib import Path
 from aws_cdk import (
     Stack,
     Duration,
+    RemovalPolicy,
+    aws_dynamodb as dynamodb,
     aws_lambda as _lambda,
     aws_apigatewayv2_alpha as apigw,
     aws_apigatewayv2_integrations_alpha as integrations,
+    aws_apigatewayv2_authorizers_alpha as authorizers,
     aws_iam as iam, 
     CfnOutput,
 )
@@ -47,6 +50,34 @@ class ApiStack(Stack):
                 "or export MODEL_ID=<bedrock-model-id> before running CDK."
             )
 
+        # Optional small model for the cascade's fast tier (see src/cascade.py);
+        # without it every question goes to MODEL_ID, as before.
+        fast_model_id = (
+            self.node.try_get_context("FAST_MODEL_ID")
+            or os.environ.get("FAST_MODEL_ID", "")
+        )
+
+        # Timestream stays off unless explicitly enabled (-c USE_TIMESTREAM=true);
+        # the table names match DataStack.
+        use_timestream = str(
+            self.node.try_get_context("USE_TIMESTREAM")
+            or os.environ.get("USE_TIMESTREAM", "false")
+        ).lower() == "true"
+
+        # Callers are authenticated by a JWT authorizer when an issuer is
+        # given (-c JWT_ISSUER=... -c JWT_AUDIENCE=...); the handler reads
+        # Timestream only for the patient in the token's PATIENT_CLAIM.
+        jwt_issuer = self.node.try_get_context("JWT_ISSUER") or os.environ.get("JWT_ISSUER", "")
+        jwt_audience = self.node.try_get_context("JWT_AUDIENCE") or os.environ.get("JWT_AUDIENCE", "")
+        patient_claim = (self.node.try_get_context("PATIENT_CLAIM")
+                         or os.environ.get("PATIENT_CLAIM", "sub"))
+        if use_timestream and not jwt_issuer:  # pragma: no cover
+            raise ValueError(
+                "USE_TIMESTREAM=true exposes stored patient vitals and needs an "
+                "authenticated API: supply -c JWT_ISSUER=<issuer-url> "
+                "-c JWT_AUDIENCE=<client-id>."
+            )
+
         fn = PythonFunction(
             self,
             "TimeseriesAgent",
@@ -58,16 +89,56 @@ class ApiStack(Stack):
             timeout=Duration.seconds(10),
             environment={
                 "MODEL_ID": model_id,
+                "USE_TIMESTREAM": "true" if use_timestream else "false",
+                "DB_NAME": "vitals_db",
+                "TABLE": "vitals_ts",
+                "PATIENT_CLAIM": patient_claim,
+                # build the Bedrock client during INIT (full CPU burst)
+                # instead of on the first request, with one TLS connection open
+                "PREWARM": "true",
+                "CLIENT_WARMUP_CONNECTIONS": "1",
+                **({"CASCADE": "on", "FAST_MODEL_ID": fast_model_id} if fast_model_id else {}),
             },
         )
 
-        # Only Bedrock permissions are needed while Timestream is disabled.
+        # Shared response-cache and session tiers (-c SHARED_STATE=true).
+        # Both hold patient health data: session items are running
+        # aggregates and recent readings of a patient's vitals, cache
+        # items are answers derived from them.  DynamoDB TTL deletes
+        # items once their "expires" time (RESPONSE_CACHE_TTL /
+        # SESSION_TTL after the write) has passed.
+        shared_state = str(
+            self.node.try_get_context("SHARED_STATE")
+            or os.environ.get("SHARED_STATE", "false")
+        ).lower() == "true"
+        if shared_state:
+            for name, env in (("ResponseCache", "RESPONSE_CACHE_TABLE"), ("Sessions", "SESSION_TABLE")):
+                table = dynamodb.Table(
+                    self,
+                    name,
+                    partition_key=dynamodb.Attribute(name="pk", type=dynamodb.AttributeType.STRING),
+                    billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                    time_to_live_attribute="expires",
+                    encryption=dynamodb.TableEncryption.AWS_MANAGED,
+                    removal_policy=RemovalPolicy.DESTROY,
+                )
+                table.grant_read_write_data(fn)
+                fn.add_environment(env, table.table_name)
+
         fn.add_to_role_policy(
             iam.PolicyStatement(
-                actions=["bedrock:InvokeModel"],
+                # the streaming route and server mode call the response-stream API
+                actions=["bedrock:InvokeModel", "bedrock:InvokeModelWithResponseStream"],
                 resources=["*"],  # or specific model ARN
             )
         )
+        if use_timestream:
+            fn.add_to_role_policy(
+                iam.PolicyStatement(
+                    actions=["timestream:DescribeEndpoints", "timestream:Select"],
+                    resources=["*"],
+                )
+            )
 
         api = apigw.HttpApi(
             self,
@@ -78,10 +149,26 @@ class ApiStack(Stack):
             ),
         )
 
+        integration = integrations.HttpLambdaIntegration("Hook", fn)
+        auth = {}
+        if jwt_issuer:
+            auth["authorizer"] = authorizers.HttpJwtAuthorizer(
+                "PatientJwt", jwt_issuer,
+                jwt_audience=[a for a in jwt_audience.split(",") if a],
+            )
         api.add_routes(
             path="/query",
             methods=[apigw.HttpMethod.POST],
-            integration=integrations.HttpLambdaIntegration("Hook", fn),
+            integration=integration,
+            **auth,
+        )
+        # {"items": [{prompt, timeseries}, ...]} answered concurrently
+        # within one invocation; see handler._batch.
+        api.add_routes(
+            path="/query/batch",
+            methods=[apigw.HttpMethod.POST],
+            integration=integration,
+            **auth,
         )
 
         self.api_url = api.api_endpoint
@@ -33,7 +33,8 @@ class DataStack(Stack):
                              "timestream:SelectValues"],
                     resources=["*"]),
                 iam.PolicyStatement(
-                    actions=["bedrock:InvokeModel"],
+                    actions=["bedrock:InvokeModel",
+                             "bedrock:InvokeModelWithResponseStream"],
                     resources=["*"])
             ])
 
@@ -0,0 +1,309 @@
+"""
+Offline bulk processing of JSONL request corpora for the Time-Series -> LLM handler.
+
+    MODEL_ID=<bedrock-model-id> python src/bulk.py requests.jsonl answers.jsonl [--resume]
+    MODEL_ID=<bedrock-model-id> python src/bulk.py requests.jsonl input.jsonl --bedrock-batch
+
+Responsibilities
+----------------
+1. Stream a JSONL file with one request per line: a payload as POSTed
+   to /query (`{"prompt": ..., "timeseries": {...}}`, optionally with
+   an `"id"`) or an API-Gateway-shaped `{"body": "..."}` event.
+2. Validate each record and build its context (`handler._prepare`:
+   `utils.validate_payload`, series routing, the cascade plan and
+   `utils.build_context_from_payload`) in a pool of `BULK_PROCESSES`
+   processes, `BULK_CHUNK` lines per task.
+3. Answer the prepared records with at most `BULK_CONCURRENCY` model
+   calls in flight, through the same response cache, cascade, hedging
+   and throttle retries as `handler`.  Each call gets
+   `BULK_DEADLINE_S` once it starts.
+4. Write one line per record, in input order:
+   `{"line": n, "id": ..., "answer": ..., "cache": "HIT" | "MISS"}` or
+   `{"line": n, "id": ..., "error": ..., "status": 4xx/5xx}`.
+   With `--bedrock-batch` no model is called: valid records become
+   Bedrock batch-inference input (`{"recordId", "modelInput"}`), and
+   invalid ones go to `<output>.errors.jsonl`.
+5. Checkpoint every `BULK_CHECKPOINT_EVERY` records, so `--resume`
+   continues an interrupted run.  No line is lost or repeated.
+
+Design notes
+------------
+- Memory stays constant: at most `window` chunks are read ahead of the
+  output, and a chunk is dropped once its lines are written.  Model
+  calls for a chunk start as soon as its preparation finishes, so the
+  ordered writer never holds back the calls behind it.
+- The checkpoint (`<output>.ckpt`) records the input byte offset after
+  the last written record and the size of each output file.  It is
+  written after the outputs are flushed and fsynced, via a temporary
+  file and `os.replace`.  On resume the outputs are truncated to those
+  sizes first, so lines written after the last checkpoint are dropped
+  and then written again.
+- Worker processes use "forkserver" (or "spawn"), not fork: by the time
+  they start, the main process is running model-call threads.
+- Lines go to the workers as raw bytes and are parsed by
+  `handler._parse`, so the body-size limit and the selective parser
+  in `ingest` apply as they do online.
+- Batch-inference input is built with the cascade off: every record
+  gets a body for MODEL_ID.
+- No metrics line is emitted per record; the run prints one JSON
+  summary.  Records carry no authenticated identity, so a record with
+  a `session_id` is an error line (401), as it would be in the API.
+- Records that fail (400s, or 429 / 504 once their deadline runs out)
+  are written as error lines and are not retried on resume; select
+  them by "status" to run them again.
+"""
+
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional, Tuple
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+import handler
+
+PROCESSES = int(os.getenv("BULK_PROCESSES", str(os.cpu_count() or 1)))
+CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "8"))
+CHUNK = int(os.getenv("BULK_CHUNK", "64"))
+DEADLINE_S = float(os.getenv("BULK_DEADLINE_S", "60"))
+CHECKPOINT_EVERY = int(os.getenv("BULK_CHECKPOINT_EVERY", "1000"))
+
+# ------------------------------------------------------------------ #
+# Preparation (runs in the worker processes)
+# ------------------------------------------------------------------ #
+
+
+def _record_id(payload) -> Optional[object]:
+    rid = payload.get("id") if isinstance(payload, dict) else None
+    return rid if isinstance(rid, (str, int)) and not isinstance(rid, bool) else None
+
+
+def _prepare_line(raw: bytes, cascade_enabled: Optional[bool]) -> Tuple:
+    """("ok", id, prepared) or ("error", id, status, message) for one line."""
+    rid = None
+    try:
+        payload = handler._parse({"body": raw.decode("utf-8", errors="replace")})
+        rid = _record_id(payload)
+        if isinstance(payload, dict) and isinstance(payload.get("body"), str):   # an event
+            payload = handler._parse({"body": payload["body"]})
+            rid = rid if rid is not None else _record_id(payload)
+        return ("ok", rid, handler._prepare(payload, cascade_enabled=cascade_enabled))
+    except handler._HttpError as err:
+        return ("error", rid, err.status, str(err))
+
+
+def _prepare_chunk(lines: List[bytes], cascade_enabled: Optional[bool] = None) -> List[Tuple]:
+    return [_prepare_line(raw, cascade_enabled) for raw in lines]
+
+# ------------------------------------------------------------------ #
+# Input, output and checkpoints
+# ------------------------------------------------------------------ #
+
+
+def _chunks(f, line: int, offset: int, size: int):
+    """Chunks of (line number, input offset after it, raw line) for non-blank lines."""
+    batch = []
+    for raw in f:
+        line += 1
+        offset += len(raw)
+        if raw.strip():
+            batch.append((line, offset, raw))
+            if len(batch) == size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _open_output(path: str, size: Optional[int]):
+    """`path` for appending after its first `size` bytes (None: start empty)."""
+    if size is None or not os.path.exists(path):
+        return open(path, "wb")
+    f = open(path, "r+b")
+    f.truncate(size)
+    f.seek(size)
+    return f
+
+
+def _save(path: str, state: Dict, outputs: Dict) -> None:
+    for f in outputs.values():
+        f.flush()
+        os.fsync(f.fileno())
+    state["outputs"] = {p: f.tell() for p, f in outputs.items()}
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def _line(obj: Dict) -> bytes:
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n"
+
+# ------------------------------------------------------------------ #
+# Runner
+# ------------------------------------------------------------------ #
+
+
+def _answer(prepared: Tuple, deadline_s: float) -> Dict:
+    try:
+        answer, hit = handler._answer(*prepared, deadline=time.monotonic() + deadline_s)
+        return {"answer": answer, "cache": "HIT" if hit else "MISS"}
+    except Exception as err:  # as in handler._batch: one record never fails the run
+        return {"error": str(err), "status": getattr(err, "status", 502)}
+
+
+def _done(result) -> Future:
+    fut = Future()
+    fut.set_result(result)
+    return fut
+
+
+def _chain(prep: Future, submit) -> Future:
+    """Future of the per-record (id, future) pairs `submit` makes once `prep` is done."""
+    out = Future()
+
+    def start(f):
+        try:
+            out.set_result([submit(item) for item in f.result()])
+        except BaseException as err:  # surfaces in the writer
+            out.set_exception(err)
+
+    prep.add_done_callback(start)
+    return out
+
+
+def run(
+    src: str,
+    dst: str,
+    processes: int = PROCESSES,
+    concurrency: int = CONCURRENCY,
+    chunk: int = CHUNK,
+    deadline_s: float = DEADLINE_S,
+    checkpoint: Optional[str] = None,
+    checkpoint_every: int = CHECKPOINT_EVERY,
+    resume: bool = False,
+    bedrock_batch: bool = False,
+) -> Dict:
+    """Process `src` into `dst` (see the module docstring); returns the run summary."""
+    checkpoint = checkpoint or dst + ".ckpt"
+    errors_path = dst + ".errors.jsonl" if bedrock_batch else None
+    state = {"input": os.path.abspath(src), "offset": 0, "line": 0, "records": 0, "outputs": {}}
+    if resume and os.path.exists(checkpoint):
+        with open(checkpoint, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved.get("input") != state["input"]:
+            raise ValueError(f"{checkpoint} belongs to {saved.get('input')}, not {src}")
+        state.update(saved)
+    sizes = state["outputs"] if resume else {}
+    outputs = {dst: _open_output(dst, sizes.get(dst))}
+    if errors_path:
+        outputs[errors_path] = _open_output(errors_path, sizes.get(errors_path))
+    out, errs = outputs[dst], outputs.get(errors_path)
+
+    counts = {"ok": 0, "errors": 0, "cache_hits": 0}
+    first_line, t0 = state["line"], time.perf_counter()
+    cascade_enabled = False if bedrock_batch else None
+    methods = multiprocessing.get_all_start_methods()
+    prep_pool = (ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context(
+        "forkserver" if "forkserver" in methods else "spawn")) if processes > 0 else None)
+    model_pool = None if bedrock_batch else ThreadPoolExecutor(concurrency, thread_name_prefix="bulk")
+    handler.invoke.reserve(concurrency)
+    window: Deque[Tuple[List[Tuple[int, int]], Future]] = deque()
+    max_window = max(2 * max(processes, 1), math.ceil(2 * concurrency / chunk))
+
+    def prepare(lines):
+        if prep_pool is not None:
+            return prep_pool.submit(_prepare_chunk, lines, cascade_enabled)
+        fut = Future()
+        try:
+            fut.set_result(_prepare_chunk(lines, cascade_enabled))
+        except BaseException as err:
+            fut.set_exception(err)
+        return fut
+
+    def submit(item):
+        if item[0] == "error":
+            return item[1], _done({"error": item[3], "status": item[2]})
+        if bedrock_batch:
+            return item[1], _done({"modelInput": item[2][2]})
+        return item[1], model_pool.submit(_answer, item[2], deadline_s)
+
+    def write(line, rid, result):
+        if "modelInput" in result:
+            out.write(_line({"recordId": str(rid) if rid is not None else f"{line:011d}",
+                             "modelInput": result["modelInput"]}))
+            counts["ok"] += 1
+            return
+        head = {"line": line} if rid is None else {"line": line, "id": rid}
+        (errs if errs is not None and "error" in result else out).write(_line({**head, **result}))
+        counts["errors" if "error" in result else "ok"] += 1
+        counts["cache_hits"] += result.get("cache") == "HIT"
+
+    def drain():
+        meta, fut = window.popleft()
+        for (line, offset), (rid, rec) in zip(meta, fut.result()):
+            write(line, rid, rec.result())
+            state.update(offset=offset, line=line, records=state["records"] + 1)
+            if state["records"] % checkpoint_every == 0:
+                _save(checkpoint, state, outputs)
+
+    try:
+        with open(src, "rb") as f:
+            f.seek(state["offset"])
+            for batch in _chunks(f, state["line"], state["offset"], chunk):
+                fut = _chain(prepare([raw for _, _, raw in batch]), submit)
+                window.append(([(line, offset) for line, offset, _ in batch], fut))
+                while len(window) >= max_window:
+                    drain()
+            while window:
+                drain()
+        state["done"] = True
+    finally:
+        # whatever was written is consistent with the checkpoint
+        _save(checkpoint, state, outputs)
+        for pool in (prep_pool, model_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        for fh in outputs.values():
+            fh.close()
+
+    seconds = time.perf_counter() - t0
+    records = counts["ok"] + counts["errors"]
+    return {"records": records, **counts, "resumed_after_line": first_line,
+            "seconds": round(seconds, 3), "records_per_s": round(records / seconds, 1) if seconds else None,
+            "output": dst, **({"errors_file": errors_path} if errors_path else {})}
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Answer (or prepare) a JSONL corpus of requests.")
+    ap.add_argument("input")
+    ap.add_argument("output")
+    ap.add_argument("--processes", type=int, default=PROCESSES,
+                    help="preparation processes (0: prepare in this process)")
+    ap.add_argument("--concurrency", type=int, default=CONCURRENCY, help="model calls in flight")
+    ap.add_argument("--chunk", type=int, default=CHUNK, help="lines per preparation task")
+    ap.add_argument("--deadline", type=float, default=DEADLINE_S, help="seconds per model call")
+    ap.add_argument("--checkpoint", help="checkpoint file (default: OUTPUT.ckpt)")
+    ap.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY)
+    ap.add_argument("--resume", action="store_true", help="continue from the checkpoint")
+    ap.add_argument("--bedrock-batch", action="store_true",
+                    help="write Bedrock batch-inference input instead of calling the model")
+    args = ap.parse_args(argv)
+    if not handler.MODEL_ID:
+        ap.error("MODEL_ID is not set")
+    try:
+        summary = run(args.input, args.output, args.processes, args.concurrency, args.chunk,
+                      args.deadline, args.checkpoint, args.checkpoint_every, args.resume,
+                      args.bedrock_batch)
+    except KeyboardInterrupt:
+        sys.exit("interrupted; run again with --resume to continue")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
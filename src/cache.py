@@ -0,0 +1,219 @@
+"""
+Response cache for the Time-Series -> LLM Lambda.
+
+Responsibilities
+----------------
+1. Build deterministic cache keys from model id, system-prompt version,
+   normalised user prompt and a hash of the vitals context.
+2. Hold answers in a size- and TTL-bounded in-process LRU that survives
+   across warm invocations of the same container.
+3. Optionally back the LRU with a shared second tier (local directory or
+   a DynamoDB table) so hits survive container recycling.
+
+Design notes
+------------
+- Tiers share one tiny interface: `get(key) -> Optional[str]` and
+  `set(key, value)`.  Anything exposing DynamoDB's `get_item` /
+  `put_item` works as the table client (boto3 or a test fake).
+- The LRU uses a monotonic clock; persistent tiers store wall-clock
+  expiry so entries stay valid across processes.
+- Cache failures never fail a request: second-tier errors are counted
+  and treated as misses.
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+# ------------------------------------------------------------------ #
+# Keys
+# ------------------------------------------------------------------ #
+
+_WS = re.compile(r"\s+")
+
+
+def normalise_prompt(prompt: str) -> str:
+    """Case-fold and collapse whitespace; trailing '?'/'.' are ignored."""
+    return _WS.sub(" ", prompt.casefold()).strip().rstrip("?.! ")
+
+
+def context_hash(context: str) -> str:
+    return hashlib.sha256(context.encode()).hexdigest()
+
+
+def make_key(model_id: str, prompt_version: str, prompt: str, context: str, system: str = "") -> str:
+    """`system` is the system prompt actually sent (see prompts.prefix)."""
+    raw = "\x1f".join((model_id, prompt_version, normalise_prompt(prompt),
+                       context_hash(context), context_hash(system)))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+# ------------------------------------------------------------------ #
+# Tier 1: in-process LRU
+# ------------------------------------------------------------------ #
+
+
+class LRUCache:
+    """Size- and TTL-bounded LRU with hit/miss counters (thread-safe)."""
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        ttl: float = 900.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires, value = item
+                if expires > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._data), "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+# ------------------------------------------------------------------ #
+# Tier 2: shared / persistent stand-ins
+# ------------------------------------------------------------------ #
+
+
+class FileCache:
+    """One JSON file per key in `directory` (e.g. /tmp or an EFS mount)."""
+
+    def __init__(self, directory: str, ttl: float = 900.0) -> None:
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), encoding="utf-8") as fh:
+                item = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if item.get("expires", 0) <= time.time():
+            try:  # expired entries are deleted when next read
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            return None
+        return item.get("value")
+
+    def set(self, key: str, value: str) -> None:
+        tmp = self._path(key) + f".{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"expires": time.time() + self.ttl, "value": value}, fh)
+        os.replace(tmp, self._path(key))  # atomic publish
+
+
+class DynamoCache:
+    """
+    DynamoDB-shaped tier: `pk` (S) key, `value` (S), `expires` (N, epoch
+    seconds).  The table's TTL attribute must be `expires` (the stack's
+    SHARED_STATE tables set it) or expired items are never deleted.
+    """
+
+    def __init__(self, client, table: str, ttl: float = 900.0) -> None:
+        self.client = client
+        self.table = table
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[str]:
+        item = self.client.get_item(TableName=self.table, Key={"pk": {"S": key}}).get("Item")
+        if not item or float(item["expires"]["N"]) <= time.time():
+            return None
+        return item["value"]["S"]
+
+    def set(self, key: str, value: str) -> None:
+        self.client.put_item(TableName=self.table, Item={
+            "pk": {"S": key},
+            "value": {"S": value},
+            "expires": {"N": str(int(time.time() + self.ttl))},
+        })
+
+
+class TieredCache:
+    """LRU in front of an optional shared tier; L2 hits are promoted."""
+
+    def __init__(self, l1: LRUCache, l2=None) -> None:
+        self.l1 = l1
+        self.l2 = l2
+        self.l2_hits = self.l2_errors = 0
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.l1.get(key)
+        if value is not None or self.l2 is None:
+            return value
+        try:
+            value = self.l2.get(key)
+        except Exception:
+            self.l2_errors += 1
+            return None
+        if value is not None:
+            self.l2_hits += 1
+            self.l1.set(key, value)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self.l1.set(key, value)
+        if self.l2 is not None:
+            try:
+                self.l2.set(key, value)
+            except Exception:
+                self.l2_errors += 1
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.l1.stats(), l2_hits=self.l2_hits, l2_errors=self.l2_errors)
+
+
+def from_env() -> TieredCache:
+    """
+    RESPONSE_CACHE_SIZE  (entries, 0 disables the LRU; default 256)
+    RESPONSE_CACHE_TTL   (seconds; default 900)
+    RESPONSE_CACHE_DIR   (enables the file tier)
+    RESPONSE_CACHE_TABLE (enables the DynamoDB tier; wins over DIR)
+    """
+    size = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+    ttl = float(os.getenv("RESPONSE_CACHE_TTL", "900"))
+    l2 = None
+    if os.getenv("RESPONSE_CACHE_TABLE"):
+        import boto3  # deferred: only needed when the tier is enabled
+        l2 = DynamoCache(boto3.client("dynamodb"), os.environ["RESPONSE_CACHE_TABLE"], ttl)
+    elif os.getenv("RESPONSE_CACHE_DIR"):
+        l2 = FileCache(os.environ["RESPONSE_CACHE_DIR"], ttl)
+    return TieredCache(LRUCache(size, ttl), l2)
@@ -0,0 +1,137 @@
+"""
+Model cascade for the Time-Series -> LLM Lambda.
+
+Responsibilities
+----------------
+1. Plan which tier answers a question:
+   - "stats": simple lookups ("what's my latest BP?") are answered from
+     `utils.summarise_vitals` without calling any model;
+   - "fast":  routine questions go to a small, fast model (FAST_MODEL_ID);
+   - "large": complex questions (why / compare / advice ..., or long
+     ones) go straight to MODEL_ID.
+2. Recognise a rejection from the fast model (the ESCALATE sentinel it
+   is asked to reply with, an empty answer, or a stock "I can't tell"
+   reply) so the handler re-asks the large model.
+
+Design notes
+------------
+- Planning is a few regex searches over the question; no model call is
+  spent deciding where a question goes.  Complexity is checked first, so
+  "is my latest reading normal?" goes to the large model, not the stats
+  tier.
+- `CASCADE=off` (the default) keeps every question on MODEL_ID, as
+  before.  With `CASCADE=on` and no FAST_MODEL_ID, routine questions
+  also go to MODEL_ID; the stats tier still applies.
+- A stats answer is only given when every series it covers has data;
+  otherwise the question goes to a model, which can say what is missing.
+- The handler records the tier, the reason and whether the fast model
+  escalated on the invocation's metrics line (see metrics.py).
+"""
+
+from __future__ import annotations
+from typing import Dict, NamedTuple, Optional, Sequence
+import os
+import re
+
+import rollup
+import utils
+from series import DAY
+
+ENABLED = os.getenv("CASCADE", "off").lower() in ("1", "on", "true", "yes")
+FAST_MODEL_ID = os.getenv("FAST_MODEL_ID", "")
+FAST_MAX_TOKENS = int(os.getenv("FAST_MAX_TOKENS", "500"))
+
+# Questions longer than this (words) skip the fast tier.
+MAX_FAST_WORDS = int(os.getenv("CASCADE_MAX_FAST_WORDS", "30"))
+# ... and longer than this skip the stats tier.
+MAX_LOOKUP_WORDS = 12
+# The stats summary covers trailing 7- and 30-day windows.
+MAX_LOOKUP_HORIZON = 30 * DAY
+
+TIERS = ("stats", "fast", "large")
+
+ESCALATE = "ESCALATE"
+# Appended to the fast model's system prompt.
+FAST_SYSTEM_SUFFIX = (
+    "\n\nIf answering needs clinical judgement, advice, or reasoning beyond "
+    f"reading the supplied numbers, or you are not sure, reply with exactly {ESCALATE}."
+)
+
+_LOOKUP = re.compile(
+    r"^\s*(what(?:'?s| is| was| are| were)|show(?: me)?|tell me|give me|list)\b"
+    r".*\b(latest|last reading|current(?:ly)?|most recent|right now|now|"
+    r"average|avg|mean)\b", re.IGNORECASE)
+
+_COMPLEX = re.compile(
+    r"\b(why|how come|should|explain\w*|compar\w*|correlat\w*|relat\w*|caus\w*|"
+    r"recommend\w*|advi[cs]e|suggest\w*|plan|risk\w*|predict\w*|forecast\w*|"
+    r"diagnos\w*|medication|medicine|dose|dosage|insulin|worr\w*|concern\w*|"
+    r"danger\w*|normal|healthy|improv\w*|better|worse|and then|what if)\b", re.IGNORECASE)
+
+_REJECTED = re.compile(
+    r"^\W*(i (?:do not|don't|can ?not|can't|am unable to|'m unable to) "
+    r"(?:know|tell|say|answer|determine|help)|not enough (?:data|information))",
+    re.IGNORECASE)
+
+
+class Plan(NamedTuple):
+    """Where one question goes; `answer` is set for the stats tier."""
+
+    tier: str
+    reason: str
+    model_id: Optional[str] = None
+    answer: Optional[str] = None
+    body: Optional[Dict] = None  # the fast model's request body (set by the handler)
+
+# ------------------------------------------------------------------ #
+# Planning
+# ------------------------------------------------------------------ #
+
+
+def stats_answer(question: str, ts_dict: Dict[str, Sequence[float]]) -> Optional[str]:
+    """Summary lines for a simple lookup over `ts_dict`, else None."""
+    if len(question.split()) > MAX_LOOKUP_WORDS or not _LOOKUP.search(question):
+        return None
+    h = rollup.horizon(question)
+    if h is not None and h > MAX_LOOKUP_HORIZON:
+        return None
+    wanted = set(ts_dict)
+    if wanted & {"bp_sys", "bp_dia"}:
+        wanted |= {"bp_sys", "bp_dia"}  # summarised as a pair
+    if any(not len(ts_dict.get(k) or ()) for k in wanted):
+        return None
+    return utils.summarise_vitals(**{k: ts_dict[k] for k in wanted})
+
+
+def plan(
+    question: str,
+    ts_dict: Dict[str, Sequence[float]],
+    large_model: Optional[str],
+    enabled: Optional[bool] = None,
+    fast_model: Optional[str] = None,
+) -> Plan:
+    """Tier for `question`; `enabled` / `fast_model` default to the env settings."""
+    enabled = ENABLED if enabled is None else enabled
+    fast_model = FAST_MODEL_ID if fast_model is None else fast_model
+    if not enabled:
+        return Plan("large", "cascade_off", large_model)
+
+    hit = _COMPLEX.search(question)
+    if hit:
+        return Plan("large", "complex:" + hit.group(1).lower(), large_model)
+    answer = stats_answer(question, ts_dict)
+    if answer is not None:
+        return Plan("stats", "lookup", None, answer)
+    if len(question.split()) > MAX_FAST_WORDS:
+        return Plan("large", "long", large_model)
+    if not fast_model:
+        return Plan("large", "no_fast_model", large_model)
+    return Plan("fast", "routine", fast_model)
+
+
+def rejected(answer) -> bool:
+    """True if a fast-tier answer asks for (or needs) the large model."""
+    if not isinstance(answer, str):
+        return True
+    text = answer.strip()
+    return not text or ESCALATE in text[:40] or bool(_REJECTED.search(text))
@@ -0,0 +1,204 @@
+"""
+Managed boto3 clients for the Time-Series -> LLM Lambda.
+
+Responsibilities
+----------------
+1. Build one client per AWS service on first use (thread-safe) with an
+   explicit connection policy: a bounded keep-alive pool of
+   `MAX_POOL` connections, TCP keep-alive and short connect / read
+   timeouts, all through botocore's public `Config`.
+2. Refuse to send a request once the caller's deadline has passed
+   (`with clients.deadline(t): ...`), so a retry or hedge that would
+   only be billed and thrown away never leaves the process.
+3. Count requests per service: in flight, the peak and the total
+   sent, so metrics show how much concurrent fan-out the pool sees.
+4. Optionally open `WARMUP_CONNECTIONS` connections during Lambda INIT
+   (`warm`), paying the TCP + TLS handshakes before the first request.
+
+Design notes
+------------
+- boto3 is imported on first use, as before: `import handler` stays
+  free of botocore.
+- Only public botocore interfaces are used: `Config` for the pool and
+  timeouts, and the client's event hooks (`before-send`,
+  `response-received`) for the deadline check and the counters.
+- botocore fixes a client's timeouts at construction, so they are not
+  shortened per request.  `invoke` stops waiting at the deadline on its
+  own; a stalled call then keeps its thread until the read timeout,
+  which for Bedrock defaults to the Lambda timeout (10 s).
+- botocore's retries would sleep past the deadline (its legacy mode
+  makes five attempts), so Bedrock clients make one attempt and leave
+  throttles to `invoke`; other services keep botocore's defaults.
+- The default pool covers `INVOKE_WORKERS` (16) concurrent model calls
+  plus a few streams; urllib3 does not block past it, it opens a
+  connection that is discarded afterwards.  `peak` above `MAX_POOL`
+  is the sign that happened.
+- `warm` makes real, read-only `ListAsyncInvokes` calls at the same
+  time.  An AccessDenied answer still leaves its connection open in
+  the pool, so the function's role needs no extra permission.
+"""
+
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Optional
+import os
+import threading
+import time
+
+MAX_POOL = int(os.getenv("CLIENT_MAX_POOL", "20"))
+TCP_KEEPALIVE = os.getenv("CLIENT_TCP_KEEPALIVE", "on").lower() not in ("0", "off", "false", "no")
+CONNECT_TIMEOUT_S = float(os.getenv("CLIENT_CONNECT_TIMEOUT_S", "2.0"))
+READ_TIMEOUT_S = float(os.getenv("CLIENT_READ_TIMEOUT_S", "60"))
+WARMUP_CONNECTIONS = int(os.getenv("CLIENT_WARMUP_CONNECTIONS", "0"))
+
+# botocore's own attempts per call; Bedrock throttles are retried by
+# invoke.py within the deadline, so botocore makes a single attempt.
+MAX_ATTEMPTS = {"bedrock-runtime": int(os.getenv("CLIENT_BEDROCK_MAX_ATTEMPTS", "1"))}
+
+# Per-service read timeouts; a Bedrock answer cannot outlive the Lambda.
+READ_TIMEOUTS = {"bedrock-runtime": float(os.getenv("CLIENT_BEDROCK_READ_TIMEOUT_S", "10"))}
+
+# A cheap read-only call per service that `warm` can repeat.
+_WARM_CALLS = {"bedrock-runtime": ("list_async_invokes", {"maxResults": 1})}
+
+# ------------------------------------------------------------------ #
+# Deadline
+# ------------------------------------------------------------------ #
+
+_local = threading.local()
+
+
+@contextmanager
+def deadline(t: Optional[float]):
+    """Refuse to send requests on this thread after monotonic deadline `t`."""
+    prev = getattr(_local, "deadline", None)
+    _local.deadline = t
+    try:
+        yield
+    finally:
+        _local.deadline = prev
+
+
+def expired() -> bool:
+    """Whether this thread's deadline (if any) has passed."""
+    t = getattr(_local, "deadline", None)
+    return t is not None and time.monotonic() >= t
+
+# ------------------------------------------------------------------ #
+# Request statistics
+# ------------------------------------------------------------------ #
+
+
+class RequestStats:
+    """Requests of one client (all operations, thread-safe)."""
+
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.peak = 0
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def before_send(self, **kwargs) -> None:
+        if expired():
+            # raised inside botocore's send, so it surfaces as the call's error
+            raise TimeoutError("deadline passed before the request was sent")
+        with self._lock:
+            self.in_flight += 1
+            self.sent += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def response_received(self, **kwargs) -> None:
+        # fires once per attempt, after an answer or an error
+        with self._lock:
+            self.in_flight = max(self.in_flight - 1, 0)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"in_flight": self.in_flight, "peak": self.peak, "sent": self.sent}
+
+
+def _hook(client, stats: RequestStats) -> bool:
+    meta = getattr(client, "meta", None)
+    if meta is None:  # a stand-in client (tests)
+        return False
+    events, service = meta.events, meta.service_model.service_id.hyphenize()
+    events.register(f"before-send.{service}", stats.before_send)
+    events.register(f"response-received.{service}", stats.response_received)
+    return True
+
+# ------------------------------------------------------------------ #
+# Clients
+# ------------------------------------------------------------------ #
+
+_CLIENTS: Dict[str, object] = {}
+_STATS: Dict[str, RequestStats] = {}
+_LOCK = threading.Lock()
+
+
+def config(service: str):
+    """The botocore Config a managed `service` client is built with."""
+    from botocore.config import Config  # deferred with boto3
+    attempts = MAX_ATTEMPTS.get(service)
+    return Config(
+        max_pool_connections=MAX_POOL,
+        tcp_keepalive=TCP_KEEPALIVE,
+        connect_timeout=CONNECT_TIMEOUT_S,
+        read_timeout=READ_TIMEOUTS.get(service, READ_TIMEOUT_S),
+        retries={"mode": "standard", "total_max_attempts": attempts} if attempts else None,
+    )
+
+
+def build(service: str, stats: Optional[RequestStats] = None, **kwargs):
+    """A new client with the managed config (`kwargs` go to boto3.client)."""
+    import boto3  # deferred: keeps botocore out of cold start
+    client = boto3.client(service, config=config(service), **kwargs)
+    if stats is not None:
+        _hook(client, stats)
+    return client
+
+
+def get(service: str):
+    """Memoised managed client for `service` (thread-safe)."""
+    client = _CLIENTS.get(service)
+    if client is None:
+        with _LOCK:
+            client = _CLIENTS.get(service)
+            if client is None:
+                stats = _STATS.setdefault(service, RequestStats())
+                client = _CLIENTS[service] = build(service, stats)
+    return client
+
+
+def stats(service: str) -> Dict[str, int]:
+    """Request counters for `service`; empty until its client is built."""
+    s = _STATS.get(service)
+    return s.snapshot() if s is not None else {}
+
+
+def warm(client, connections: int = 1) -> int:
+    """
+    Open up to `connections` keep-alive connections to the client's
+    endpoint with that many concurrent cheap calls; returns how many got
+    an HTTP answer (an error answer counts: its connection is pooled).
+    """
+    name, params = _WARM_CALLS.get(client.meta.service_model.service_id.hyphenize(), (None, None))
+    n = min(connections, MAX_POOL)
+    if name is None or n <= 0:
+        return 0
+    call = getattr(client, name)
+    barrier = threading.Barrier(n, timeout=CONNECT_TIMEOUT_S)
+
+    def one(_) -> bool:
+        try:
+            barrier.wait()  # all at once, so none can reuse another's connection
+        except threading.BrokenBarrierError:
+            pass
+        try:
+            call(**params)
+        except Exception as err:
+            return getattr(err, "response", None) is not None  # e.g. AccessDenied
+        return True
+
+    with ThreadPoolExecutor(max_workers=n, thread_name_prefix="warm") as pool:
+        return sum(pool.map(one, range(n)))
@@ -0,0 +1,80 @@
+"""
+Minimal local HTTP server for the Time-Series -> LLM handler.
+
+    MODEL_ID=<bedrock-model-id> python src/dev_server.py --port 8080
+
+POST /query         -> `handler.handler` (same JSON as API Gateway)
+POST /query/batch   -> `handler.handler` with `{"items": [...]}`
+POST /query/stream  -> `handler.stream_handler`, sent as chunked
+                       `text/event-stream` so tokens reach the client
+                       as soon as Bedrock produces them.
+
+Single process, one thread per connection; meant for local use and
+for exercising the streaming path, not for production traffic.
+"""
+
+from __future__ import annotations
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+
+import handler
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):  # noqa: N802 - http.server naming
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > handler.MAX_BODY_BYTES:  # refuse before reading it
+            self.close_connection = True
+            self._reply({"statusCode": 413, "headers": {"Content-Type": "application/json"},
+                         "body": json.dumps({"error": "request body too large"})})
+            return
+        path = self.path.split("?", 1)[0].rstrip("/") or "/"
+        event = {"body": self.rfile.read(length).decode("utf-8", errors="replace"),
+                 "rawPath": path, "requestContext": {"http": {"method": "POST", "path": path}}}
+        if path == "/query/stream":
+            self._stream(handler.stream_handler(event, None))
+        elif path in ("/query", "/query/batch"):
+            self._reply(handler.handler(event, None))
+        else:
+            self._reply({"statusCode": 404, "headers": {"Content-Type": "application/json"},
+                         "body": json.dumps({"error": "not found"})})
+
+    def _reply(self, resp):
+        body = resp.get("body", "").encode("utf-8")
+        self.send_response(resp.get("statusCode", 200))
+        for k, v in (resp.get("headers") or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, frames):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for frame in frames:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(frame), frame))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, fmt, *args):  # keep test output quiet
+        pass
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8080) -> ThreadingHTTPServer:
+    return ThreadingHTTPServer((host, port), _Handler)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    args = ap.parse_args()
+    srv = make_server(args.host, args.port)
+    print(f"listening on http://{args.host}:{srv.server_port}")
+    srv.serve_forever()
@@ -0,0 +1,143 @@
+"""
+Shape-preserving downsampling for the Time-Series -> LLM Lambda.
+
+Responsibilities
+----------------
+1. Reduce one series to a point budget with Largest-Triangle-Three-
+   Buckets (LTTB), which keeps peaks, troughs and trend changes that a
+   plain stride or mean would flatten.
+2. Keep the most recent readings verbatim - they matter most to the
+   questions users ask ("what was my glucose this morning?").
+
+Design notes
+------------
+- The x-axis is the timestamp for timed `Series` and the index
+  otherwise, so irregular sampling is weighted correctly.
+- Output is always a subset of the input points in original order; no
+  values are synthesised.
+"""
+
+from __future__ import annotations
+from typing import List, Optional, Sequence
+
+import lazy
+from series import Series
+
+# Most recent points always passed through exactly.
+KEEP_LATEST = 12
+
+
+def _bucket_bounds(n: int, n_out: int) -> List[int]:
+    """Bucket edges over the interior points 1..n-2 (LTTB layout)."""
+    every = (n - 2) / (n_out - 2)
+    return [int(i * every) + 1 for i in range(n_out - 1)] + [n - 1]
+
+
+def _lttb_py(y: Sequence[float], x: Sequence[float], n_out: int) -> List[int]:
+    n = len(y)
+    edges = _bucket_bounds(n, n_out)
+    out = [0]
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # average of the *next* bucket is the third triangle vertex;
+        # the final bucket's "next" is just the last point
+        nlo, nhi = hi, edges[i + 2]
+        if nhi <= nlo:
+            nhi = nlo + 1
+        span = nhi - nlo
+        avg_x = sum(x[nlo:nhi]) / span
+        avg_y = sum(y[nlo:nhi]) / span
+
+        ax, ay = x[a], y[a]
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((ax - avg_x) * (y[j] - ay) - (ax - x[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        out.append(best)
+        a = best
+    out.append(n - 1)
+    return out
+
+
+def _lttb_np(y: Sequence[float], x: Sequence[float], n_out: int) -> List[int]:
+    np = lazy.numpy()
+    n = len(y)
+    y = np.asarray(y, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    edges = _bucket_bounds(n, n_out)
+    cx = np.concatenate(([0.0], np.cumsum(x - x[0])))
+    cy = np.concatenate(([0.0], np.cumsum(y - y[0])))
+    out = [0]
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = hi, edges[i + 2]
+        if nhi <= nlo:
+            nhi = nlo + 1
+        span = nhi - nlo
+        avg_x = (cx[nhi] - cx[nlo]) / span + x[0]
+        avg_y = (cy[nhi] - cy[nlo]) / span + y[0]
+
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - avg_x) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (avg_y - ay))
+        a = lo + int(np.argmax(area))
+        out.append(a)
+    out.append(n - 1)
+    return out
+
+
+def lttb_indices(
+    y: Sequence[float],
+    n_out: int,
+    x: Optional[Sequence[float]] = None,
+) -> List[int]:
+    """
+    Indices of the `n_out` points LTTB keeps (first and last included).
+    Returns every index when the series already fits.
+    """
+    n = len(y)
+    if n_out >= n or n <= 2:
+        return list(range(n))
+    if n_out <= 2:
+        return [0, n - 1][-n_out:] if n_out > 0 else []
+    if x is None:
+        x = range(n)
+    if lazy.np_for(n) is not None:
+        return _lttb_np(y, x, n_out)
+    return _lttb_py(y, x, n_out)
+
+
+def downsample(
+    s: Sequence[float],
+    max_points: int,
+    keep_latest: int = KEEP_LATEST,
+) -> Sequence[float]:
+    """
+    Reduce `s` to at most `max_points`, keeping the latest
+    `keep_latest` readings exact and LTTB-sampling the rest.
+    Returns the input unchanged when it already fits.
+    """
+    n = len(s)
+    if n <= max_points:
+        return s
+    if max_points <= keep_latest:
+        return s[n - max_points:] if max_points > 0 else s[:0]
+
+    head_n = n - keep_latest
+    xs = s.ts if isinstance(s, Series) and s.timed else None
+    ys = s.values if isinstance(s, Series) else s
+    idx = lttb_indices(
+        ys[:head_n], max_points - keep_latest,
+        None if xs is None else xs[:head_n],
+    )
+    idx.extend(range(head_n, n))
+
+    if isinstance(s, Series):
+        return Series(
+            [ys[i] for i in idx],
+            None if xs is None else [xs[i] for i in idx],
+            presorted=True,
+        )
+    return [s[i] for i in idx]
@@ -0,0 +1,389 @@
+"""
+Compact feature digests for the Time-Series -> LLM Lambda.
+
+Responsibilities
+----------------
+1. Reduce one series to a small, fixed-size set of features: trailing
+   window means, linear trend slope, CUSUM change points and robust
+   z-score outliers.
+2. For glucose, add daily min/max and time-in-range (70-180 mg/dL).
+3. Serve the `"features"` context mode of
+   `utils.build_context_from_payload`, which sends these digests to the
+   model instead of (downsampled) raw arrays.
+
+Design notes
+------------
+- A digest's size does not grow with the series: a few windows, at most
+  `MAX_LISTED` change points / outliers and `DAILY_DAYS` days.
+- Windows follow `utils`: trailing calendar days ("7d") for timed
+  `Series`, trailing points ("7pt") otherwise.  Time labels are UTC
+  dates for timed series and indices for untimed ones.
+- CUSUM runs on values scaled by a robust noise estimate (`_noise`: MAD
+  of the first differences, so level shifts do not inflate it) and
+  capped at `CUSUM_CLIP` per point, so a lone spike is an outlier, not
+  a change point.  Outliers use the MAD of the values themselves.
+- A timed series spanning `SEASON_MIN_DAYS` or more first loses its
+  mean hour-of-day profile (`_deseason`).  Against a flat reference a
+  daily cycle would otherwise drift the sums past the threshold every
+  half-cycle; a level shift moves every hour alike, so it survives.
+  Reported means are still those of the raw values.
+- Each alarm starts a new segment whose reference level is the median
+  of its first `CUSUM_BURN_IN` points; at most `MAX_SEGMENTS` alarms
+  are followed, which bounds the cost on data CUSUM does not fit.
+  With NumPy the cumulative sums use the closed form
+  s_t = C_t - min(0, min_{j<=t} C_j), one vector pass per segment;
+  the pure-Python loop is the reference.
+- List entries are positional to save tokens: changes are [at, mean
+  before, mean after], outliers [at, value, robust z], glucose days
+  [date, min, max, % in range].
+- Values are rounded to one decimal place; the output depends only on
+  the data, so it is as prompt-cache friendly as the raw context.
+"""
+
+from __future__ import annotations
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+import math
+import operator
+import statistics as stats
+
+import lazy
+from series import DAY, Series
+
+WINDOWS = (7, 30)
+MAX_LISTED = 3                 # change points / outliers reported
+DAILY_DAYS = 7                 # glucose days itemised
+TIR_RANGE = (70.0, 180.0)      # mg/dL, consensus glucose target range
+OUTLIER_Z = 3.5                # robust |z| threshold (Iglewicz & Hoaglin)
+CUSUM_K = 0.75                 # allowance, in robust sigmas
+CUSUM_H = 10.0                 # alarm threshold, in robust sigmas
+CUSUM_BURN_IN = 96             # points that set each segment's level
+CUSUM_CLIP = 3.0               # per-point |z| cap, so lone spikes stay outliers
+MAX_SEGMENTS = 32              # CUSUM alarms followed per series
+SEASON_MIN_DAYS = 7            # span before the hour-of-day profile is removed
+
+# MAD / mean absolute deviation -> standard deviation for normal data
+_MAD_SCALE = 1.4826
+_MEAN_DEV_SCALE = math.sqrt(math.pi / 2.0)
+
+# ------------------------------------------------------------------ #
+# Small helpers
+# ------------------------------------------------------------------ #
+
+
+def _r(v: Optional[float], nd: int = 1) -> Optional[float]:
+    return None if v is None or not math.isfinite(v) else round(v, nd) + 0.0  # no "-0.0"
+
+
+def _label(x: Sequence[float], i: int):
+    if isinstance(x, Series) and x.timed:
+        return datetime.fromtimestamp(x.ts[i], timezone.utc).strftime("%Y-%m-%d")
+    return i
+
+
+def _timed(x: Sequence[float]) -> bool:
+    return isinstance(x, Series) and x.timed
+
+
+def _start(x: Sequence[float], w: int) -> int:
+    if _timed(x):
+        return x.window_start(w * DAY)
+    return max(len(x) - w, 0)
+
+
+def _as_np(x: Sequence[float]):
+    np = lazy.numpy()
+    vals = x.values if isinstance(x, Series) else x
+    if hasattr(vals, "typecode"):
+        return np.frombuffer(vals, dtype=np.float64)  # zero-copy
+    return np.asarray(vals, dtype=np.float64)
+
+
+def _values(x: Sequence[float]):
+    """Values as an ndarray on the NumPy path, else as a plain list."""
+    if lazy.np_for(len(x)) is not None:
+        return _as_np(x)
+    return x.tolist() if isinstance(x, Series) else [float(v) for v in x]
+
+# ------------------------------------------------------------------ #
+# Features (NumPy path + reference path each)
+# ------------------------------------------------------------------ #
+
+
+def _slope(x: Sequence[float], v, lo: int) -> Optional[float]:
+    """Least-squares slope per day (timed) or per point over v[lo:]."""
+    n = len(v) - lo
+    if n < 2:
+        return None
+    if not isinstance(v, list):
+        np = lazy.numpy()
+        y = v[lo:]
+        t = np.frombuffer(x.ts, dtype=np.int64)[lo:] / DAY if _timed(x) else np.arange(n, dtype=np.float64)
+        t = t - t.mean()
+        den = float(t @ t)
+        return float(t @ (y - y.mean())) / den if den else None
+    y = v[lo:]
+    if _timed(x):
+        t0 = x.ts[lo]
+        t = [(ts - t0) / DAY for ts in x.ts[lo:]]
+    else:
+        t = range(n)
+    tm, ym = sum(t) / n, sum(y) / n
+    den = sum((a - tm) ** 2 for a in t)
+    if not den:
+        return None
+    return sum(map(operator.mul, t, y)) / den - n * tm * ym / den
+
+
+def _robust(v) -> Tuple[float, float]:
+    """(median, MAD scaled to a standard deviation)."""
+    if not isinstance(v, list):
+        np = lazy.numpy()
+        med = float(np.median(v))
+        mad = float(np.median(np.abs(v - med)))
+    else:
+        med = stats.median(v)
+        mad = stats.median([abs(a - med) for a in v])
+    return med, _MAD_SCALE * mad
+
+
+def _noise(v) -> float:
+    """
+    Robust noise sigma from the first differences: MAD of diff(v) about
+    its median, scaled to a standard deviation and divided by sqrt(2)
+    (a difference of two independent points has twice the variance).
+    A level shift moves one difference, not half the series, so it
+    barely changes this estimate.  Falls back to the mean absolute
+    deviation of the differences when over half of them are equal
+    (quantised, slowly changing readings).
+    """
+    if len(v) < 2:
+        return 0.0
+    if not isinstance(v, list):
+        np = lazy.numpy()
+        d = np.diff(v)
+        dev = np.abs(d - float(np.median(d)))
+        mad, mean_dev = float(np.median(dev)), float(dev.mean())
+    else:
+        d = [b - a for a, b in zip(v, v[1:])]
+        md = stats.median(d)
+        dev = [abs(a - md) for a in d]
+        mad, mean_dev = stats.median(dev), math.fsum(dev) / len(dev)
+    sigma = _MAD_SCALE * mad if mad else _MEAN_DEV_SCALE * mean_dev
+    return sigma / math.sqrt(2.0)
+
+
+def _deseason(x: Sequence[float], v):
+    """
+    v minus its mean hour-of-day profile for a timed series spanning
+    SEASON_MIN_DAYS or more; otherwise v itself.  Over a shorter span
+    the profile would soak up part of a level shift.
+    """
+    if not _timed(x) or x.ts[-1] - x.ts[0] < SEASON_MIN_DAYS * DAY:
+        return v
+    if not isinstance(v, list):
+        np = lazy.numpy()
+        hour = np.frombuffer(x.ts, dtype=np.int64) % DAY // 3600
+        counts = np.bincount(hour, minlength=24)
+        sums = np.bincount(hour, weights=v, minlength=24)
+        profile = sums / np.maximum(counts, 1)
+        return v - profile[hour]
+    hour = [t % DAY // 3600 for t in x.ts]
+    sums, counts = [0.0] * 24, [0] * 24
+    for h, a in zip(hour, v):
+        sums[h] += a
+        counts[h] += 1
+    profile = [t / c if c else 0.0 for t, c in zip(sums, counts)]
+    return [a - profile[h] for h, a in zip(hour, v)]
+
+
+def _outliers(x: Sequence[float], v, med: float, sigma: float) -> Dict:
+    if not sigma:
+        return {"n": 0, "top": []}
+    if not isinstance(v, list):
+        np = lazy.numpy()
+        z = (v - med) / sigma
+        idx = np.flatnonzero(np.abs(z) > OUTLIER_Z)
+        # most extreme first; ties keep time order
+        order = idx[np.argsort(-np.abs(z[idx]), kind="stable")][:MAX_LISTED].tolist()
+        found = len(idx)
+    else:
+        lim = OUTLIER_Z * sigma
+        idx = [i for i, a in enumerate(v) if abs(a - med) > lim]
+        order = sorted(idx, key=lambda i: -abs(v[i] - med))[:MAX_LISTED]
+        found = len(idx)
+    return {"n": found, "top": [[_label(x, i), _r(float(v[i])), _r((float(v[i]) - med) / sigma)]
+                                for i in order]}
+
+
+def _alarm_py(v: Sequence[float], a: int, ref: float, sigma: float) -> Optional[Tuple[int, int]]:
+    """First CUSUM alarm from `a`: (alarm index, start of the drifting run)."""
+    inv, k, h, clip = 1.0 / sigma, CUSUM_K, CUSUM_H, CUSUM_CLIP
+    s_hi = s_lo = 0.0
+    run_hi = run_lo = a
+    for i in range(a, len(v)):
+        z = (v[i] - ref) * inv
+        if z > clip:
+            z = clip
+        elif z < -clip:
+            z = -clip
+        s_hi += z - k
+        if s_hi <= 0.0:
+            s_hi, run_hi = 0.0, i + 1
+        s_lo -= z + k
+        if s_lo <= 0.0:
+            s_lo, run_lo = 0.0, i + 1
+        if s_hi > h:
+            return i, run_hi
+        if s_lo > h:
+            return i, run_lo
+    return None
+
+
+def _alarm_np(v, a: int, ref: float, sigma: float) -> Optional[Tuple[int, int]]:
+    block = 4 * CUSUM_BURN_IN
+    while True:
+        # both sums restart at `a`, so a longer block just redoes the prefix
+        hit = _alarm_block(v[a:a + block], ref, sigma)
+        if hit is not None:
+            return a + hit[0], a + hit[1]
+        if a + block >= len(v):
+            return None
+        block *= 2
+
+
+def _alarm_block(v, ref: float, sigma: float) -> Optional[Tuple[int, int]]:
+    np = lazy.numpy()
+    z = np.clip((v - ref) / sigma, -CUSUM_CLIP, CUSUM_CLIP)
+    best = None
+    for c in (np.cumsum(z - CUSUM_K), np.cumsum(-z - CUSUM_K)):
+        floor = np.minimum.accumulate(np.minimum(c, 0.0))
+        hit = np.flatnonzero(c - floor > CUSUM_H)
+        if not len(hit):
+            continue
+        t = int(hit[0])
+        if best is not None and t >= best[0]:
+            continue  # the upper side wins ties, as in the loop
+        seg = c[:t + 1]
+        m = float(seg.min())
+        # the run starts after the last time the sum touched its floor
+        run = 0 if m > 0.0 else t - int(np.argmin(seg[::-1])) + 1
+        best = (t, run)
+    return best
+
+
+def _changes(x: Sequence[float], v) -> List[list]:
+    """Level shifts found by segment-restarting two-sided CUSUM."""
+    n = len(v)
+    if n < 2 * CUSUM_BURN_IN:
+        return []
+    r = _deseason(x, v)
+    sigma = _noise(r)
+    if not sigma:
+        return []
+    use_np = not isinstance(v, list)
+    alarm = _alarm_np if use_np else _alarm_py
+    cps: List[int] = []
+    a = 0
+    for _ in range(MAX_SEGMENTS):
+        if n - a < 2 * CUSUM_BURN_IN:
+            break
+        ref = stats.median(r[a:a + CUSUM_BURN_IN].tolist() if use_np else r[a:a + CUSUM_BURN_IN])
+        hit = alarm(r, a, ref, sigma)
+        if hit is None:
+            break
+        t, run = hit
+        if run > a:
+            cps.append(run)
+            a = run
+        else:  # drift from the very start: the burn-in straddled a shift
+            a = t + 1
+    bounds = [0] + cps + [n]
+    out = []
+    for j, cp in enumerate(cps[-MAX_LISTED:], start=len(cps) - min(len(cps), MAX_LISTED) + 1):
+        before = v[bounds[j - 1]:cp]
+        after = v[cp:bounds[j + 1]]
+        out.append([_label(x, cp),
+                    _r(float(before.mean()) if use_np else sum(before) / len(before)),
+                    _r(float(after.mean()) if use_np else sum(after) / len(after))])
+    return out
+
+
+def _daily(x: Sequence[float], v) -> Dict:
+    """Glucose: last DAILY_DAYS days as [date, min, max, TIR%] + 30-day TIR."""
+    lo_ok, hi_ok = TIR_RANGE
+    use_np = not isinstance(v, list)
+    np = lazy.numpy() if use_np else None
+    out: Dict = {}
+    n = len(v)
+    s30 = _start(x, 30)
+    if n - s30:
+        if use_np:
+            win = v[s30:]
+            inr = int(np.count_nonzero((win >= lo_ok) & (win <= hi_ok)))
+        else:
+            inr = sum(1 for a in v[s30:] if lo_ok <= a <= hi_ok)
+        out["tir_30" + ("d" if _timed(x) else "pt")] = round(100.0 * inr / (n - s30))
+    if not _timed(x) or not n:
+        return out
+    # day starts, walking back from the latest reading; one bisect per day
+    starts: List[int] = []
+    i = n
+    while i > 0 and len(starts) < DAILY_DAYS:
+        i = x.index_at((x.ts[i - 1] // DAY) * DAY)
+        starts.append(i)
+    starts.reverse()
+    ends = starts[1:] + [n]
+    if use_np:
+        seg = v[starts[0]:]
+        at = np.asarray(starts, dtype=np.intp) - starts[0]
+        lows = np.minimum.reduceat(seg, at).tolist()
+        highs = np.maximum.reduceat(seg, at).tolist()
+        inrs = np.add.reduceat(((seg >= lo_ok) & (seg <= hi_ok)).astype(np.int64), at).tolist()
+    else:
+        segs = [v[j:e] for j, e in zip(starts, ends)]
+        lows, highs = [min(g) for g in segs], [max(g) for g in segs]
+        inrs = [sum(1 for a in g if lo_ok <= a <= hi_ok) for g in segs]
+    out["daily"] = [[_label(x, j), round(lo), round(hi), round(100.0 * k / (e - j))]
+                    for j, e, lo, hi, k in zip(starts, ends, lows, highs, inrs)]
+    return out
+
+# ------------------------------------------------------------------ #
+# Public API
+# ------------------------------------------------------------------ #
+
+
+def digest(x: Sequence[float], name: str = "") -> Dict:
+    """Fixed-size feature summary of one series (empty dict if no data)."""
+    n = len(x)
+    if not n:
+        return {}
+    v = _values(x)
+    unit = "d" if _timed(x) else "pt"
+    out: Dict = {"n": n}
+    if _timed(x):
+        out["span"] = [_label(x, 0), _label(x, n - 1)]
+    out["latest"] = _r(float(v[-1]))
+
+    means = {}
+    for w in WINDOWS:
+        s = _start(x, w)
+        means[f"{w}{unit}"] = _r(math.fsum(v[s:]) / (n - s))
+    means["all"] = _r(float(v.mean()) if not isinstance(v, list) else math.fsum(v) / n)
+    out["mean"] = means
+
+    lo = _start(x, WINDOWS[-1])
+    out["slope_per_" + unit] = {f"{WINDOWS[-1]}{unit}": _r(_slope(x, v, lo), 3),
+                                "all": _r(_slope(x, v, 0), 3)}
+
+    med, sigma = _robust(v)
+    out["changes"] = _changes(x, v)
+    out["outliers"] = _outliers(x, v, med, sigma)
+    if name == "glucose":
+        out.update(_daily(x, v))
+    return out
+
+
+def digest_all(ts_dict: Dict[str, Sequence[float]]) -> Dict[str, Dict]:
+    """Digest of every non-empty series (input order)."""
+    return {k: digest(v, k) for k, v in ts_dict.items() if len(v)}
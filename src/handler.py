@@ -1,9 +1,34 @@
-import json, os, boto3
+import json, os, time
+from concurrent.futures import ThreadPoolExecutor, wait
+import cache
+import cascade
+import clients
+import ingest
+import invoke
+import lazy
+import metrics
+import prompts
+import semcache
+import session
+import streaming
+import timestream
+import tokens
 import utils
+import wire
 
 
-# Bedrock is still required
-bedrock = boto3.client("bedrock-runtime")
+# ── AWS CLIENTS (built on first use) ──────────────────────────────────
+# Importing boto3 and building a client loads botocore's service models
+# (~0.4 s), so it happens on the first model call rather than at import:
+# requests rejected with a 4xx never pay for it.  `handler.bedrock` and
+# `handler.ts_q` still resolve (module __getattr__ below); assigning
+# either replaces the client, as tests do.  Pool size, keep-alive and
+# timeouts are set in clients.py.
+_client = clients.get
+
+def _bedrock():
+    client = globals().get("bedrock")
+    return client if client is not None else _client("bedrock-runtime")
 
 # ------------------------------------------------------------------ #
 #  SYSTEM PROMPT                                                     #
@@ -17,7 +42,7 @@ bedrock = boto3.client("bedrock-runtime")
 SYSTEM_PROMPT = (
     "You are a helpful life-coach / clinical assistant.\n"
     "You will receive the patient’s raw vitals data in JSON format, "
-    "contained in the assistant message named 'vitals'. Each key maps to "
+    "labelled 'vitals' and given before the question. Each key maps to "
     "an array of numeric values recorded chronologically.\n\n"
     "When answering the user, you may compute averages, trends, or other "
     "descriptive statistics **on-the-fly** as needed, but base every "
@@ -25,95 +50,552 @@ SYSTEM_PROMPT = (
     "or period is missing, state so explicitly. Keep responses concise, "
     "clear, and grounded in the provided numbers."
 )
+# Same rules for the "features" context mode, which sends per-series
+# digests (see features.py) instead of raw arrays.
+SYSTEM_PROMPT_FEATURES = (
+    "You are a helpful life-coach / clinical assistant.\n"
+    "You will receive a JSON digest of the patient’s vitals, labelled "
+    "'vitals' and given before the question. Each key is a metric; its "
+    "object gives the point count, date span, latest value, trailing "
+    "window means, trend slopes per day, detected level changes, outliers "
+    "with robust z-scores and, for glucose, daily min/max and percent "
+    "time in range (70-180 mg/dL).\n\n"
+    "Base every statement strictly on that digest. If data for a metric "
+    "or period is missing, state so explicitly. Keep responses concise, "
+    "clear, and grounded in the provided numbers."
+)
+# The "rollup" mode sends bucketed rows when the question names a time
+# horizon, and the raw arrays otherwise.
+SYSTEM_PROMPT_ROLLUP = (
+    "You are a helpful life-coach / clinical assistant.\n"
+    "You will receive the patient’s vitals in JSON format, labelled "
+    "'vitals' and given before the question. Each key is a metric and maps "
+    "either to an array of readings in chronological order, or to an "
+    "object whose 'res' is the bucket size (e.g. '1h', '1d', '7d') and "
+    "whose 'rows' are [bucket start (UTC), mean, min, max, reading count], "
+    "oldest first.\n\n"
+    "Base every statement strictly on that supplied data. If data for a "
+    "metric or period is missing, state so explicitly. Keep responses "
+    "concise, clear, and grounded in the provided numbers."
+)
+SYSTEM_PROMPTS = {"raw": SYSTEM_PROMPT, "features": SYSTEM_PROMPT_FEATURES,
+                  "rollup": SYSTEM_PROMPT_ROLLUP}
+
+# Bump whenever a system prompt changes so cached answers are not reused.
+SYSTEM_PROMPT_VERSION = "2025-10-v2"
+
+# Context mode when a request does not pick one (see utils.CONTEXT_MODES).
+CONTEXT_MODE = os.getenv("CONTEXT_MODE", "raw")
+
+# How raw-mode vitals are written when a request does not pick one:
+# "json", or a rounded compact encoding (see wire.py).
+CONTEXT_ENCODING = os.getenv("CONTEXT_ENCODING", "json")
+
+# Send (and fetch) only the series a question mentions; questions naming
+# none get all of them.  ROUTE_SERIES=off always sends everything.
+ROUTE_SERIES = os.getenv("ROUTE_SERIES", "on").lower() not in ("0", "off", "false", "no")
+
+# Provider-side prompt caching: "auto" marks cache points for models that
+# support them (Anthropic, Amazon Nova); "off" sends the plain message list.
+PROMPT_CACHE = os.getenv("PROMPT_CACHE", "auto")
+
+# Answers for repeated (model, system prompt, question, vitals), kept across warm
+# invocations; see cache.from_env for the RESPONSE_CACHE_* settings.
+RESPONSE_CACHE = cache.from_env()
+
+# Answers to near-duplicate questions over the same vitals context
+# ("how's my sugar?" / "how is my glucose doing?"); off unless
+# SEMANTIC_CACHE_SIZE is set, see semcache.from_env.
+SEMANTIC_CACHE = semcache.from_env()
+
+# Per-session running aggregates, so clients with a `session_id` send only
+# new points; see session.from_env for the SESSION_* settings.
+SESSIONS = session.from_env()
+
+# ── AWS TIMESTREAM (behind USE_TIMESTREAM) ────────────────────────────
+# Off by default: the client is a stub that always returns an empty
+# result set, preventing any network calls or data access.
+USE_TIMESTREAM = os.getenv("USE_TIMESTREAM", "false").lower() in ("1", "true", "yes")
 
-# ── TEMPORARILY DISABLE AWS TIMESTREAM ────────────────────────────────
-# Replace the Timestream client with a stub that always returns an
-# empty result set, preventing any network calls or data access.
 def _noop(*_, **__):
     return {"Rows": []}
 
-ts_q = type("NoTimestreamClient", (), {"query": staticmethod(_noop)})()
+_NO_TIMESTREAM = type("NoTimestreamClient", (), {"query": staticmethod(_noop)})()
+
+def _ts_client():
+    client = globals().get("ts_q")
+    if client is not None:
+        return client
+    return _client("timestream-query") if USE_TIMESTREAM else _NO_TIMESTREAM
 
 DB  = os.getenv("DB_NAME", "")
 TBL = os.getenv("TABLE", "")
 MODEL_ID = os.getenv("MODEL_ID")
 
-def fetch_latest(series: str, hours: int = 168):  # pylint: disable=unused-argument
-    """Timestream access disabled: return no data."""
-    return []
+# Per-patient series, refreshed incrementally once older than TS_CACHE_TTL.
+TS_HOURS = int(os.getenv("TS_HOURS", "168"))
+TS_CACHE = timestream.SeriesCache(
+    lambda **kw: timestream.fetch_latest_many(_ts_client(), DB, TBL, **kw),
+    ttl=float(os.getenv("TS_CACHE_TTL", "60")),
+    hours=TS_HOURS,
+)
+
+# Batch mode (POST /query/batch): bounded fan-out, finishing before the
+# Lambda timeout with whatever items are done.
+BATCH_MAX_ITEMS   = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_DEADLINE_S  = float(os.getenv("BATCH_DEADLINE_S", "9.0"))  # without a Lambda context
+DEADLINE_MARGIN_S = 0.5  # time kept back to serialise the response
+invoke.reserve(BATCH_CONCURRENCY)
+
+# `{"items": [...]}` is answered only on this route, and only it takes
+# that shape.  API Gateway passes the route as `rawPath` (HTTP API) or
+# `path` (REST), possibly after a stage prefix; a direct invoke has no
+# route and is read by the body's shape.
+BATCH_ROUTE = "/query/batch"
+
+def _route(event):
+    """The request path of an API Gateway event, or None."""
+    http = ((event or {}).get("requestContext") or {}).get("http") or {}
+    path = event.get("rawPath") or http.get("path") or event.get("path")
+    return path.split("?", 1)[0].rstrip("/") or "/" if isinstance(path, str) else None
+
+# Single requests stop waiting on the model (hedging and throttle retries
+# included, see invoke.py) this long after they start without a Lambda context.
+REQUEST_DEADLINE_S = float(os.getenv("REQUEST_DEADLINE_S", "9.0"))
+
+# Bodies above this are refused (413) before any decoding; the Lambda
+# sync-invoke payload cap is 6 MB anyway.
+MAX_BODY_BYTES = int(os.getenv("MAX_BODY_BYTES", str(6 * 1024 * 1024)))
+
+# The patient whose Timestream series may be read comes from the
+# caller's verified identity (this JWT / Lambda-authorizer claim), never
+# from the request body.  Without one nothing is fetched.
+PATIENT_CLAIM = os.getenv("PATIENT_CLAIM", "sub")
 
+def _patient_id(event):
+    """The authenticated patient id for `event`, or None."""
+    auth = ((event or {}).get("requestContext") or {}).get("authorizer") or {}
+    claims = (auth.get("jwt") or {}).get("claims") or auth.get("lambda") or {}
+    pid = claims.get(PATIENT_CLAIM)
+    return pid if isinstance(pid, str) and pid else None
 
-def handler(event, _):
+def fetch_latest_many(series, patient_id=None):
+    """All of `series` for one patient in a single (cached) query."""
+    if not USE_TIMESTREAM or not series or not patient_id:
+        return {}
+    return TS_CACHE.get(patient_id, tuple(series))
+
+
+class _HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _body_bytes(body: str) -> int:
+    return len(body) if body.isascii() else len(body.encode("utf-8"))
+
+
+def _parse(event):
+    """Size-check, then parse the body keeping only series we use."""
+    body = event.get("body") or "{}"
+    if isinstance(body, (bytes, bytearray)):
+        body = body.decode("utf-8", errors="replace")
+    if len(body) > MAX_BODY_BYTES or _body_bytes(body) > MAX_BODY_BYTES:
+        raise _HttpError(413, f"Request body exceeds {MAX_BODY_BYTES} bytes.")
     try:
-        payload = json.loads(event.get("body", "{}"))
-        userQ, ts_in = utils.validate_payload(payload)
+        return ingest.parse_body(body, utils.MAX_INPUT_POINTS, utils._ALIASES)
     except ValueError as err:
-        return {
-            "statusCode": 400,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": str(err)})
-        }
-
-    ts_dict = {
-        "glucose": ts_in.get("glucose") or fetch_latest("glucose"),
-        "weight" : ts_in.get("weight")  or fetch_latest("weight"),
-        "bp_sys" : ts_in.get("bp_sys")  or fetch_latest("bp_sys"),
-        "bp_dia" : ts_in.get("bp_dia")  or fetch_latest("bp_dia"),
-    }
+        raise _HttpError(400, str(err)) from err
 
-    context = utils.build_context_from_payload(userQ, ts_dict)
-    payload = {
-        "messages": [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "assistant", "name": "vitals", "content": context},
-            {"role": "user", "content": userQ},
-        ],
-        "max_tokens": 2000,
-    }
+
+def _prepare(payload, m=metrics.NULL, cascade_enabled=None, patient_id=None):
+    """
+    Validate one request payload, plan its tier (see cascade.py) and
+    build the Bedrock request body.  Series the payload lacks are read
+    from Timestream for the authenticated `patient_id` (see _patient_id);
+    a `session_id` is scoped to that patient and needs one (401 without).
+    `cascade_enabled` overrides the CASCADE setting (bulk.py turns it
+    off for batch-inference input).
+    Returns (question, vitals context, body, plan); raises _HttpError.
+    """
+    try:
+        sid, state = payload.get("session_id") if isinstance(payload, dict) else None, None
+        if sid is not None:
+            if patient_id is None:  # a bare session id would let anyone read it
+                raise _HttpError(401, "'session_id' needs an authenticated caller.")
+            key = session.store_key(patient_id, session.check_id(sid))
+            with m.stage("session"):
+                state = SESSIONS.get(key) or session.SessionState()
+        with m.stage("validate"):
+            userQ, ts_in = utils.validate_payload(payload, session=state)
+        mode = payload.get("context_mode") or CONTEXT_MODE
+        if mode not in utils.CONTEXT_MODES:
+            raise ValueError(f"'context_mode' must be one of {', '.join(utils.CONTEXT_MODES)}.")
+        encoding = payload.get("context_encoding") or CONTEXT_ENCODING
+        if encoding not in utils.CONTEXT_ENCODINGS:
+            raise ValueError(f"'context_encoding' must be one of {', '.join(utils.CONTEXT_ENCODINGS)}.")
+        if mode != "raw":
+            encoding = "json"
+        # only the series the question is about are fetched and sent;
+        # those the caller did not send come from Timestream, all at once
+        wanted = utils.relevant_series(userQ) if ROUTE_SERIES else timestream.SERIES
+        missing = [k for k in wanted if not ts_in.get(k)]
+    except ValueError as err:
+        raise _HttpError(400, str(err)) from err
+    if state is not None:  # only a request that passed validation changes its session
+        with m.stage("session"):
+            SESSIONS.put(key, state)
+    with m.stage("fetch"):
+        try:
+            fetched = fetch_latest_many(missing, patient_id)
+        except Exception as err:  # Timestream throttled / down: answer from the payload
+            m.set(fetch_error=type(err).__name__)
+            fetched = {}
+
+    ts_dict = {k: ts_in.get(k) or fetched.get(k) or [] for k in wanted}
+
+    with m.stage("route"):
+        plan = cascade.plan(userQ, ts_dict, MODEL_ID, enabled=cascade_enabled)
+    if plan.tier == "stats":             # answered from the numbers alone
+        return userQ, "", None, plan
+
+    with m.stage("context"):
+        context = utils.build_context_from_payload(
+            userQ, ts_dict, mode=mode, pyramids=state.pyramids() if state is not None else None,
+            encoding=encoding)
+    if m is not metrics.NULL:
+        skipped = [k for k in timestream.SERIES if k not in ts_dict]
+        m.set(points=sum(len(v) for v in ts_dict.values()),
+              context_bytes=len(context), context_tokens=utils.est_tokens(context),
+              series_skipped=len(skipped), skipped_series=",".join(skipped), context_encoding=encoding)
+    # system prompt + vitals form a stable prefix; the question comes last
+    system = SYSTEM_PROMPTS[mode] + wire.format_note(encoding)
+    body = prompts.build_body(system, context, userQ,
+                              prompts.cache_style(MODEL_ID, PROMPT_CACHE))
+    if plan.tier == "fast":
+        plan = plan._replace(body=prompts.build_body(
+            system + cascade.FAST_SYSTEM_SUFFIX, context, userQ,
+            prompts.cache_style(plan.model_id, PROMPT_CACHE), max_tokens=cascade.FAST_MAX_TOKENS))
     if not MODEL_ID:                     # extra runtime safety
-        return {
-            "statusCode": 500,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": "MODEL_ID not configured on Lambda"})
-        }
-
-    # -----------------------------------------------------------------
-    # Invoke Bedrock and robustly extract the assistant’s reply.
-    # Different foundation models return slightly different response
-    # shapes, so we fall-back through several possibilities instead of
-    # assuming a top-level “content” key.
-    # -----------------------------------------------------------------
-    resp = bedrock.invoke_model(
-        modelId=MODEL_ID,
-        body=json.dumps(payload).encode(),
-    )
+        raise _HttpError(500, "MODEL_ID not configured on Lambda")
+    return userQ, context, body, plan
 
-    raw_body = resp["body"].read()
 
+def _extract_answer(raw_body: bytes, usage=None) -> str:
+    """
+    Robustly extract the assistant’s reply from a full Bedrock body.
+    Different foundation models return slightly different response
+    shapes, so we fall-back through several possibilities instead of
+    assuming a top-level “content” key.  If `usage` is a dict it is
+    filled with the reported token counts (see prompts.cache_usage).
+    """
     try:
         body_json = json.loads(raw_body)
     except json.JSONDecodeError:
         # Model returned plain text – use it directly.
-        answer = raw_body.decode("utf-8", errors="ignore")
-    else:
-        # Common patterns across Bedrock providers
-        answer = (
-            body_json.get("content")                                  # Claude/Anthropic
-            or (body_json.get("message") or {}).get("content")        # Meta/DeepSeek “message”
-            or (
-                body_json.get("choices", [{}])[0]                     # OpenAI-style
-                .get("message", {})
-                .get("content")
-                if body_json.get("choices") else None
-            )
-            or body_json.get("results", [{}])[0].get("outputText")    # AI21-style
+        return raw_body.decode("utf-8", errors="ignore")
+    if usage is not None and isinstance(body_json, dict):
+        usage.update(prompts.cache_usage(body_json))
+
+    # Common patterns across Bedrock providers
+    answer = (
+        streaming.content_text(body_json.get("content"))        # Claude/Anthropic
+        or (body_json.get("message") or {}).get("content")        # Meta/DeepSeek “message”
+        or (
+            body_json.get("choices", [{}])[0]                     # OpenAI-style
+            .get("message", {})
+            .get("content")
+            if body_json.get("choices") else None
         )
+        or streaming.content_text(                               # Amazon Nova
+            ((body_json.get("output") or {}).get("message") or {}).get("content"))
+        or body_json.get("results", [{}])[0].get("outputText")    # AI21-style
+    )
+
+    if answer is None:  # final fallback – return entire JSON
+        answer = json.dumps(body_json)
+    return answer
+
+
+def _invoke(model_id, body, m, stage="invoke", deadline=None):
+    """
+    One Bedrock answer (hedged, throttle-retried; see invoke.py);
+    returns (answer, usage).  Raises _HttpError 429 / 504 once the
+    deadline leaves no room for another attempt.
+    """
+    if deadline is None:
+        deadline = _deadline(None, REQUEST_DEADLINE_S)
+    with m.stage(stage):
+        try:
+            raw, headers = invoke.invoke(_bedrock(), model_id, json.dumps(body).encode(), deadline, m)
+        except invoke.Throttled as err:
+            raise _HttpError(429, "Model is busy; please retry shortly.") from err
+        except invoke.DeadlineExceeded as err:
+            raise _HttpError(504, "Model did not answer in time.") from err
+    with m.stage("extract"):
+        usage = prompts.cache_usage(None, headers)
+        return _extract_answer(raw, usage), usage
+
 
-        if answer is None:  # final fallback – return entire JSON
-            answer = json.dumps(body_json)
+def _answer(userQ, context, body, plan=None, m=metrics.NULL, deadline=None):
+    """
+    Cached, cascaded Bedrock call; returns (answer, cache_hit).
+    A fast-tier answer the fast model rejects is re-asked of MODEL_ID;
+    the final answer is cached under the planned model's key.  Both
+    calls share `deadline` (monotonic; see _deadline).
+    """
+    plan = plan or cascade.Plan("large", "cascade_off", MODEL_ID)
+    m.set(tier=plan.tier, route_reason=plan.reason)
+    if plan.tier == "stats":
+        m.set(cache_hit=False, model_id="none")
+        return plan.answer, False
 
+    system = prompts.prefix(body)
+    answer = _cached(plan.model_id, userQ, context, system, m)
+    if answer is not None:
+        return answer, True
+
+    model_id = plan.model_id
+    if plan.tier == "fast":
+        answer, usage = _invoke(model_id, plan.body, m, "invoke_fast", deadline)
+        escalated = cascade.rejected(answer)
+        m.set(escalated=escalated)
+        if escalated:
+            model_id = MODEL_ID
+            answer, more = _invoke(model_id, body, m, deadline=deadline)
+            usage = {k: usage.get(k, 0) + more.get(k, 0) for k in {*usage, *more}}
+    else:
+        answer, usage = _invoke(model_id, body, m, deadline=deadline)
+    m.set(model_id=model_id, **usage)
+
+    _remember(plan.model_id, userQ, context, system, answer)
+    return answer, False
+
+
+def _cached(model_id, userQ, context, system, m=metrics.NULL):
+    """
+    Exact cache, then the near-duplicate cache; the answer or None.
+    Both are keyed on the system prompt sent (`prompts.prefix`), so
+    another mode, encoding or prompt style is a miss.
+    """
+    with m.stage("cache"):
+        answer = RESPONSE_CACHE.get(cache.make_key(model_id, SYSTEM_PROMPT_VERSION, userQ, context, system))
+    if answer is None and SEMANTIC_CACHE.maxsize > 0:
+        with m.stage("semantic"):
+            answer, score = SEMANTIC_CACHE.get(
+                semcache.scope_key(model_id, SYSTEM_PROMPT_VERSION, context, system), userQ)
+        m.set(semantic_hit=answer is not None, semantic_score=round(score, 3))
+    m.set(cache_hit=answer is not None)
+    return answer
+
+
+def _remember(model_id, userQ, context, system, answer):
+    if isinstance(answer, str) and answer:
+        RESPONSE_CACHE.set(cache.make_key(model_id, SYSTEM_PROMPT_VERSION, userQ, context, system), answer)
+        SEMANTIC_CACHE.set(semcache.scope_key(model_id, SYSTEM_PROMPT_VERSION, context, system), userQ, answer)
+
+
+def handler(event, context):
+    m = metrics.Invocation(route="query", model_id=MODEL_ID)
+    deadline = _deadline(context, REQUEST_DEADLINE_S)
+    resp = None
+    try:
+        with m.stage("parse"):
+            payload = _parse(event)
+        batch = isinstance(payload, dict) and "items" in payload
+        route = _route(event)
+        if route is not None and batch != route.endswith(BATCH_ROUTE):
+            raise _HttpError(400, f"Batch requests go to POST {BATCH_ROUTE}." if batch
+                             else f"POST {BATCH_ROUTE} needs an 'items' array.")
+        if batch:
+            m.set(route="batch")
+            resp = _batch(payload, context, m, _patient_id(event))
+        else:
+            answer, hit = _answer(*_prepare(payload, m, patient_id=_patient_id(event)),
+                                  m=m, deadline=deadline)
+            resp = _ok(answer, cache_hit=hit)
+    except _HttpError as err:
+        resp = _error(err.status, str(err))
+    finally:
+        # one metrics line per invocation, unhandled errors included
+        m.emit(status=resp["statusCode"] if resp else 500, **_request_stats())
+    return resp
+
+
+def _request_stats():
+    """Bedrock request counters for the metrics line."""
+    return {f"requests_{k}": v for k, v in clients.stats("bedrock-runtime").items()}
+
+
+def _deadline(context, default_s: float = BATCH_DEADLINE_S) -> float:
+    """Monotonic time by which a request (or batch) must stop waiting."""
+    remaining = default_s
+    if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+        remaining = context.get_remaining_time_in_millis() / 1000.0
+    return time.monotonic() + max(remaining - DEADLINE_MARGIN_S, 0.0)
+
+
+def _batch(payload, context, m=metrics.NULL, patient_id=None):
+    """
+    Answer `{"items": [{prompt, timeseries}, ...]}` in one invocation.
+    Items are validated up front, model calls fan out over a bounded
+    thread pool, and anything unfinished at the deadline reports 504.
+    Results keep request order; one item failing never fails the batch.
+    """
+    items = payload["items"]
+    if not isinstance(items, list) or not items:
+        raise _HttpError(400, "'items' must be a non-empty array.")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise _HttpError(400, f"At most {BATCH_MAX_ITEMS} items per batch.")
+    deadline = _deadline(context)
+
+    results = [None] * len(items)
+    pending = {}
+    pool = ThreadPoolExecutor(max_workers=min(BATCH_CONCURRENCY, len(items)))
+    try:
+        with m.stage("prepare"):
+            for i, item in enumerate(items):
+                try:
+                    prepared = _prepare(item, patient_id=patient_id)
+                except _HttpError as err:
+                    results[i] = {"error": str(err), "status": err.status}
+                    continue
+                pending[pool.submit(_answer, *prepared, deadline=deadline)] = i
+
+        with m.stage("invoke"):
+            wait(pending, timeout=max(deadline - time.monotonic(), 0.0))
+        for fut, i in pending.items():
+            if not fut.done():
+                fut.cancel()
+                results[i] = {"error": "deadline exceeded", "status": 504}
+            elif fut.exception() is not None:
+                err = fut.exception()
+                results[i] = {"error": str(err), "status": getattr(err, "status", 502)}
+            else:
+                answer, hit = fut.result()
+                results[i] = {"answer": answer, "cache": "HIT" if hit else "MISS"}
+    finally:
+        # stragglers keep running in their threads; we just stop waiting
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    m.set(items=len(items), items_failed=sum("error" in r for r in results))
     return {
         "statusCode": 200,
         "headers": {"Content-Type": "application/json; charset=utf-8"},
+        "body": json.dumps({"results": results}, ensure_ascii=False),
+    }
+
+
+def stream_handler(event, _):
+    """
+    Streaming variant of `handler`: yields Server-Sent Events frames
+    (`data: {"delta": ...}`) as Bedrock produces tokens, then a final
+    `event: done` frame with the full answer.  Errors - including ones
+    raised mid-stream - become a terminal `event: error` frame.
+
+    Python Lambdas cannot stream responses, so this is served by the
+    local/self-hosted server (see dev_server.py) rather than API Gateway.
+    """
+    m = metrics.Invocation(route="stream", model_id=MODEL_ID)
+    status = 200
+    try:
+        yield from _stream(event, m)
+    except _HttpError as err:
+        status = err.status
+        yield streaming.sse({"error": str(err), "status": err.status}, event="error")
+    finally:
+        m.emit(status=status, **_request_stats())
+
+
+def _stream(event, m):
+    with m.stage("parse"):
+        payload = _parse(event)
+    userQ, context, body, plan = _prepare(payload, m, patient_id=_patient_id(event))
+    m.set(tier=plan.tier, route_reason=plan.reason)
+    if plan.tier == "stats":
+        yield streaming.sse({"delta": plan.answer})
+        yield streaming.sse({"answer": plan.answer, "cache": "MISS"}, event="done")
+        return
+    # the fast tier is not used here: its rejection would reach the client
+    # before we could escalate, so streamed answers come from MODEL_ID
+
+    system = prompts.prefix(body)
+    answer = _cached(MODEL_ID, userQ, context, system, m)
+    if answer is not None:
+        yield streaming.sse({"delta": answer})
+        yield streaming.sse({"answer": answer, "cache": "HIT"}, event="done")
+        return
+
+    parts = []
+    try:
+        with m.stage("invoke"):
+            resp = _bedrock().invoke_model_with_response_stream(
+                modelId=MODEL_ID,
+                body=json.dumps(body).encode(),
+            )
+            for text in streaming.iter_text(resp["body"]):
+                if not parts:
+                    m.set(ttft_ms=m.elapsed_ms())
+                parts.append(text)
+                yield streaming.sse({"delta": text})
+    except Exception as err:  # surface to the client; the HTTP status is already sent
+        raise _HttpError(502, str(err)) from err
+
+    answer = "".join(parts)
+    _remember(MODEL_ID, userQ, context, system, answer)
+    yield streaming.sse({"answer": answer, "cache": "MISS"}, event="done")
+
+
+def _error(status: int, message: str):
+    return {
+        "statusCode": status,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps({"error": message})
+    }
+
+
+def _ok(answer, cache_hit: bool = False):
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Content-Type": "application/json; charset=utf-8",
+            "X-Cache": "HIT" if cache_hit else "MISS",
+        },
         "body": json.dumps({"answer": answer}, ensure_ascii=False),
     }
+
+
+def __getattr__(name):
+    """Lazy module attributes: `bedrock` and `ts_q` clients."""
+    if name == "bedrock":
+        return _bedrock()
+    if name == "ts_q":
+        return _ts_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# ── INIT-PHASE PRE-WARM (PREWARM=true) ────────────────────────────────
+# Lambda runs module import in the INIT phase with a full CPU burst, so
+# building clients there is cheaper than on the first request.
+
+def prewarm():
+    """
+    Build clients, load Bedrock operation models and the token counter;
+    open CLIENT_WARMUP_CONNECTIONS connections to Bedrock.
+    """
+    client = _bedrock()
+    for op in ("InvokeModel", "InvokeModelWithResponseStream"):
+        client.meta.service_model.operation_model(op)
+    clients.warm(client, clients.WARMUP_CONNECTIONS)
+    if USE_TIMESTREAM:
+        _ts_client()
+    lazy.numpy()
+    tokens.count(json.dumps({"glucose": [100.0] * 64}))  # builds the counter tables
+
+
+if os.getenv("PREWARM", "false").lower() in ("1", "true", "yes"):
+    try:
+        prewarm()
+    except Exception:  # never fail INIT; clients are retried on first use
+        pass
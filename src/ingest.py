@@ -0,0 +1,191 @@
+"""
+Memory-bounded request-body parsing for the Time-Series -> LLM Lambda.
+
+Responsibilities
+----------------
+1. Walk the request JSON once, materialising only what we use: scalar
+   fields (prompt, patient_id, ...), batch `items`, and the four known
+   vitals series.
+2. Skip unknown series (`steps`, `sleep`, ...) by scanning past them
+   without building any Python objects.
+3. Keep at most `max_points` elements per series while parsing (ring
+   buffer), coercing only those; plain numeric arrays take a fast path
+   that converts just the tail.
+
+Design notes
+------------
+- Output has the same shape `utils.validate_payload` expects, with the
+  series already coerced into `series.Series` under "timeseries".
+- When a series is longer than `max_points` the *last* elements in
+  arrival order are kept, then coerced with `Series.from_raw` (so timed
+  series are sorted as usual).
+- The fast path takes an array only if the whole of it, skipped
+  prefix included, is strict JSON numbers (`_NUMBERS`); anything else
+  (`NaN`, `+1`, `1_0`, ...) goes through the general path, which
+  rejects or coerces it as `json.loads` would.  Numbers that overflow
+  a double (`1e999`) are dropped, as `Series.from_raw` drops
+  non-finite values.
+- Malformed JSON raises `ValueError` (json.JSONDecodeError), as the
+  stdlib parser does; the byte limit is enforced by the caller before
+  any of this runs.
+"""
+
+from __future__ import annotations
+from array import array
+from collections import deque
+from typing import Dict, Optional, Tuple
+import json
+import math
+import re
+
+from series import Series
+
+SERIES = ("glucose", "weight", "bp_sys", "bp_dia")
+
+_decoder = json.JSONDecoder()
+_scan = _decoder.scan_once
+_WS = re.compile(r"[ \t\n\r]*+")
+_SEP = re.compile(r"[ \t\n\r]*+([,\]])[ \t\n\r]*+")
+# everything up to the next bracket, hopping over whole strings
+_RUN = re.compile(r'(?:[^"\[\]{}]++|"(?:[^"\\]++|\\.)*+")*+')
+_NUM = r"-?(?:0|[1-9][0-9]*+)(?:\.[0-9]++)?(?:[eE][+\-]?[0-9]++)?+"
+# the inside of an array of JSON numbers, e.g. " 1, -2.5e3 "
+_NUMBERS = re.compile(rf"[ \t\n\r]*+(?:{_NUM}[ \t\n\r]*+(?:,[ \t\n\r]*+{_NUM}[ \t\n\r]*+)*+)?+")
+
+
+def _ws(text: str, pos: int) -> int:
+    return _WS.match(text, pos).end()
+
+
+def _expect(text: str, pos: int, ch: str) -> int:
+    pos = _ws(text, pos)
+    if not text.startswith(ch, pos):
+        raise json.JSONDecodeError(f"Expecting '{ch}'", text, pos)
+    return pos + 1
+
+
+def _value(text: str, pos: int) -> Tuple[object, int]:
+    try:
+        return _scan(text, pos)
+    except StopIteration as err:
+        raise json.JSONDecodeError("Expecting value", text, err.value) from None
+
+
+def _skip(text: str, pos: int) -> int:
+    """Index just past the JSON value at `pos`, without decoding it."""
+    if not text.startswith(("[", "{"), pos):
+        return _value(text, pos)[1]  # scalar: cheap
+    depth = 0
+    while True:
+        pos = _RUN.match(text, pos).end()
+        c = text[pos:pos + 1]
+        if c in ("[", "{"):
+            depth += 1
+        elif c in ("]", "}"):
+            depth -= 1
+            if depth == 0:
+                return pos + 1
+        else:
+            raise json.JSONDecodeError("Unterminated container", text, pos)
+        pos += 1
+
+
+def _numeric_tail(text: str, lo: int, hi: int, max_points: int) -> Series:
+    """
+    Fast path for `[1, 2.5, ...]` spanning `text[lo:hi]` ("]" at hi - 1),
+    already matched by `_NUMBERS`.  Only the last `max_points` numbers
+    are converted; any that overflow to +/-inf are dropped.
+    """
+    start = lo
+    if text.count(",", lo, hi) >= max_points:
+        start = hi - 1
+        for _ in range(max_points):
+            start = text.rfind(",", lo, start)
+    body = text[start + 1:hi - 1].strip()
+    if not body:
+        return Series()
+    vals = array("d", map(float, body.split(",")))
+    if not all(map(math.isfinite, vals)):
+        vals = array("d", filter(math.isfinite, vals))
+    return Series(vals)
+
+
+def _series(text: str, pos: int, max_points: int) -> Tuple[Optional[Series], int]:
+    """Parse the value at `pos` as a series; None if it is not an array."""
+    if not text.startswith("[", pos):
+        return None, _skip(text, pos)
+    end = text.find("]", pos)
+    if end > 0 and _NUMBERS.fullmatch(text, pos + 1, end):
+        return _numeric_tail(text, pos, end + 1, max_points), end + 1
+
+    # general case: ring buffer of raw elements, coerced once at the end
+    buf: deque = deque(maxlen=max_points)
+    pos = _ws(text, pos + 1)
+    if text.startswith("]", pos):
+        return Series(), pos + 1
+    while True:
+        item, pos = _value(text, pos)
+        buf.append(item)
+        m = _SEP.match(text, pos)
+        if m is None:
+            raise json.JSONDecodeError("Expecting ',' delimiter", text, pos)
+        if m.group(1) == "]":
+            return Series.from_raw(buf), m.end()
+        pos = m.end()
+
+
+def _object(
+    text: str,
+    pos: int,
+    max_points: int,
+    aliases: Dict[str, str],
+    nested: bool,
+) -> Tuple[Dict, Dict[str, Series], int]:
+    """Members of the object at `pos`: (plain fields, series, end)."""
+    fields: Dict = {}
+    found: Dict[str, Series] = {}
+    inner: Dict[str, Series] = {}
+    pos = _expect(text, pos, "{")
+    if text.startswith("}", _ws(text, pos)):
+        return fields, found, _ws(text, pos) + 1
+    while True:
+        key, pos = _value(text, _ws(text, pos))
+        pos = _expect(text, pos, ":")
+        canon = aliases.get(key, key)
+        vpos = _ws(text, pos)
+        if canon in SERIES:
+            s, pos = _series(text, vpos, max_points)
+            if s is not None:
+                found[canon] = s
+        elif key == "timeseries" and not nested and text.startswith("{", vpos):
+            _, inner, pos = _object(text, vpos, max_points, aliases, nested=True)
+        elif nested or text.startswith(("[", "{"), vpos) and key != "items":
+            pos = _skip(text, vpos)           # unknown series / blobs
+        else:
+            fields[key], pos = _value(text, vpos)
+        pos = _ws(text, pos)
+        if text.startswith("}", pos):
+            pos += 1
+            break
+        pos = _expect(text, pos, ",")
+    found.update(inner)  # nested "timeseries" wins, as in validate_payload
+    return fields, found, pos
+
+
+def parse_body(
+    text: str,
+    max_points: int = 10_000,
+    aliases: Optional[Dict[str, str]] = None,
+) -> Dict:
+    """
+    Parse a request body into `{..scalar fields.., "timeseries": {name: Series}}`.
+    Non-object bodies are returned as decoded so validation can reject them.
+    """
+    pos = _ws(text, 0)
+    if not text.startswith("{", pos):
+        return json.loads(text)
+    fields, found, end = _object(text, pos, max_points, aliases or {}, nested=False)
+    if _ws(text, end) != len(text):
+        raise json.JSONDecodeError("Extra data", text, end)
+    fields["timeseries"] = found
+    return fields
@@ -0,0 +1,307 @@
+"""
+Deadline-aware Bedrock invocation for the Time-Series -> LLM Lambda.
+
+Responsibilities
+----------------
+1. Keep a rolling latency histogram per model (the last `WINDOW`
+   successful calls, log-spaced buckets).
+2. Hedge: when a call is still running after the model's observed p90
+   (`HEDGE_QUANTILE`), send an identical second request and take
+   whichever answers first.  The loser is cancelled if it has not
+   started, otherwise its response is closed unread.
+3. Retry throttling (ThrottlingException and friends) with full-jitter
+   exponential backoff, but only while the backoff plus the model's
+   median latency still fits before the request's deadline.
+4. Raise `Throttled` / `DeadlineExceeded` when the budget runs out, so
+   the handler can answer 429 / 504 instead of hitting the Lambda
+   timeout.
+
+Design notes
+------------
+- Calls run on a shared thread pool so the caller can wait on both the
+  primary and the hedge; the calling thread only waits.  The usual case
+  (no hedge) is one submit and one `result(timeout)`, about 30 µs on
+  top of the call.
+- Callers that fan out (`handler._batch`, the server's request threads,
+  `bulk`) `reserve` their concurrency, so primaries never queue behind
+  one another.  Hedges have their own pool of `HEDGE_WORKERS` threads;
+  when every one is busy the hedge is skipped (`hedge_skipped`) rather
+  than queued, since a queued hedge starts too late to help.
+- Streaming (`invoke_model_with_response_stream`) is not hedged: its
+  first tokens are already on the way to the client.
+- No hedging until a model has `MIN_SAMPLES` latencies, never earlier
+  than `HEDGE_MIN_MS`, and not after a throttle in the same
+  invocation: a hedge adds load, which is the wrong answer to 429s.
+- Python threads cannot be interrupted, so a losing request that is
+  already in flight still completes (and is billed); we stop waiting
+  for it and skip reading its body.
+- Each call runs under `clients.deadline`, so a primary or hedge that
+  only starts after the deadline is never sent.
+- Errors are recognised by the botocore `ClientError` shape
+  (`err.response["Error"]["Code"]`), so fakes need no botocore.
+"""
+
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeout
+from typing import Deque, Dict, List, Optional, Tuple
+import math
+import os
+import random
+import threading
+import time
+
+import clients
+import metrics
+
+HEDGE = os.getenv("INVOKE_HEDGE", "on").lower() not in ("0", "off", "false", "no")
+HEDGE_QUANTILE = float(os.getenv("INVOKE_HEDGE_QUANTILE", "0.9"))
+HEDGE_MIN_MS = float(os.getenv("INVOKE_HEDGE_MIN_MS", "300"))
+MIN_SAMPLES = int(os.getenv("INVOKE_MIN_SAMPLES", "20"))
+WINDOW = int(os.getenv("INVOKE_WINDOW", "200"))
+MAX_RETRIES = int(os.getenv("INVOKE_MAX_RETRIES", "4"))
+BACKOFF_BASE_MS = float(os.getenv("INVOKE_BACKOFF_BASE_MS", "200"))
+BACKOFF_CAP_MS = float(os.getenv("INVOKE_BACKOFF_CAP_MS", "4000"))
+WORKERS = int(os.getenv("INVOKE_WORKERS", "16"))                # primaries, at least
+HEDGE_WORKERS = int(os.getenv("INVOKE_HEDGE_WORKERS", "8"))     # hedges in flight, at most
+
+# Error codes worth retrying after a pause.
+THROTTLE_CODES = frozenset({"ThrottlingException", "TooManyRequestsException",
+                            "ServiceUnavailableException", "ModelNotReadyException"})
+
+
+class Throttled(Exception):
+    """Still throttled when the retries or the time budget ran out."""
+
+
+class DeadlineExceeded(Exception):
+    """No answer before the request's deadline."""
+
+# ------------------------------------------------------------------ #
+# Latency histogram
+# ------------------------------------------------------------------ #
+
+_BASE_S = 0.01    # first bucket edge: 10 ms
+_RATIO = 1.1      # ~10% resolution
+_BUCKETS = 100    # up to ~125 s
+
+
+def _bucket(seconds: float) -> int:
+    if seconds <= _BASE_S:
+        return 0
+    return min(int(math.log(seconds / _BASE_S, _RATIO)) + 1, _BUCKETS - 1)
+
+
+class LatencyHistogram:
+    """Log-bucketed counts of the last `window` latencies (thread-safe)."""
+
+    def __init__(self, window: int = WINDOW) -> None:
+        self.window = window
+        self.counts = [0] * _BUCKETS
+        self._recent: Deque[int] = deque()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._recent)
+
+    def add(self, seconds: float) -> None:
+        b = _bucket(seconds)
+        with self._lock:
+            self._recent.append(b)
+            self.counts[b] += 1
+            if len(self._recent) > self.window:
+                self.counts[self._recent.popleft()] -= 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper edge (s) of the bucket holding the q-quantile, or None if empty."""
+        with self._lock:
+            n = len(self._recent)
+            if not n:
+                return None
+            rank, seen = max(math.ceil(q * n), 1), 0
+            for b, c in enumerate(self.counts):
+                seen += c
+                if seen >= rank:
+                    return _BASE_S * _RATIO ** b
+
+
+class LatencyTracker:
+    """One `LatencyHistogram` per model id."""
+
+    def __init__(self, window: int = WINDOW) -> None:
+        self.window = window
+        self._hists: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def hist(self, model_id: str) -> LatencyHistogram:
+        h = self._hists.get(model_id)
+        if h is None:
+            with self._lock:
+                h = self._hists.setdefault(model_id, LatencyHistogram(self.window))
+        return h
+
+    def hedge_after(self, model_id: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there is too little data."""
+        h = self.hist(model_id)
+        if len(h) < MIN_SAMPLES:
+            return None
+        return max(h.quantile(HEDGE_QUANTILE), HEDGE_MIN_MS / 1000.0)
+
+    def expected(self, model_id: str) -> float:
+        """Median latency (s), 0 if unknown."""
+        return self.hist(model_id).quantile(0.5) or 0.0
+
+
+LATENCY = LatencyTracker()
+
+_workers = WORKERS
+_POOL = ThreadPoolExecutor(max_workers=_workers, thread_name_prefix="invoke")
+_HEDGE_POOL = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+_HEDGE_SLOTS = threading.BoundedSemaphore(HEDGE_WORKERS)
+_pool_lock = threading.Lock()
+
+
+def reserve(callers: int) -> None:
+    """Room for `callers` concurrent primaries (grows the pool, never shrinks it)."""
+    global _POOL, _workers
+    with _pool_lock:
+        if callers <= _workers:
+            return
+        # not shut down: a caller may still be submitting to the old pool;
+        # its threads (started on demand, usually none yet) just stay idle
+        _workers = callers
+        _POOL = ThreadPoolExecutor(max_workers=_workers, thread_name_prefix="invoke")
+
+
+def _after_fork() -> None:
+    # a forked server worker inherits the pools but not their threads
+    global _POOL, _HEDGE_POOL, _HEDGE_SLOTS, _pool_lock
+    _POOL = ThreadPoolExecutor(max_workers=_workers, thread_name_prefix="invoke")
+    _HEDGE_POOL = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+    _HEDGE_SLOTS = threading.BoundedSemaphore(HEDGE_WORKERS)
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+_rnd = random.Random()
+
+# ------------------------------------------------------------------ #
+# Invocation
+# ------------------------------------------------------------------ #
+
+
+def is_throttle(err: BaseException) -> bool:
+    code = ((getattr(err, "response", None) or {}).get("Error") or {}).get("Code")
+    return code in THROTTLE_CODES
+
+
+def is_timeout(err: BaseException) -> bool:
+    """A socket timeout (botocore's ReadTimeoutError) or `clients` refusing a request past the deadline."""
+    return isinstance(err, TimeoutError) or type(err).__name__ in ("ReadTimeoutError", "ConnectTimeoutError")
+
+
+def _call(client, model_id: str, body: bytes, deadline: float, done: threading.Event,
+          tracker: LatencyTracker):
+    """One request, not sent after `deadline`; None if another one already won."""
+    if done.is_set():
+        return None
+    t = time.perf_counter()
+    with clients.deadline(deadline):
+        resp = client.invoke_model(modelId=model_id, body=body)
+    tracker.hist(model_id).add(time.perf_counter() - t)
+    if done.is_set():  # lost the race: drop the body unread
+        close = getattr(resp.get("body"), "close", None)
+        if close is not None:
+            close()
+        return None
+    return resp["body"].read(), (resp.get("ResponseMetadata") or {}).get("HTTPHeaders")
+
+
+def _race(client, model_id: str, body: bytes, deadline: float, hedge: bool,
+          tracker: LatencyTracker, m) -> Tuple[bytes, Optional[Dict]]:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("no time left to call the model")
+    done = threading.Event()
+    first = _POOL.submit(_call, client, model_id, body, deadline, done, tracker)
+    after = tracker.hedge_after(model_id) if hedge else None
+    hedging = after is not None and after < remaining
+    try:
+        # the common case: one call, answered before the hedge point
+        return first.result(timeout=after if hedging else remaining)
+    except FuturesTimeout:
+        if first.done():
+            raise  # the call itself timed out
+    slots = _HEDGE_SLOTS
+    if hedging and not slots.acquire(blocking=False):
+        hedging = False  # every hedge thread is busy: keep waiting on the primary
+        m.set(hedge_skipped=True)
+        try:
+            return first.result(timeout=max(deadline - time.monotonic(), 0.0))
+        except FuturesTimeout:
+            if first.done():
+                raise
+    if not hedging:
+        done.set()
+        first.cancel()
+        raise DeadlineExceeded("model did not answer within the deadline")
+
+    second = _HEDGE_POOL.submit(_call, client, model_id, body, deadline, done, tracker)
+    second.add_done_callback(lambda _: slots.release())
+    futs = [first, second]
+    m.set(hedged=True)
+    errors: List[BaseException] = []
+    while futs:
+        finished, _ = wait(futs, timeout=max(deadline - time.monotonic(), 0.0),
+                           return_when=FIRST_COMPLETED)
+        if not finished:
+            done.set()
+            for f in futs:
+                f.cancel()
+            raise DeadlineExceeded(f"model did not answer within the deadline ({len(futs)} in flight)")
+        for f in finished:
+            futs.remove(f)
+            if f.exception() is not None:
+                errors.append(f.exception())
+                continue
+            done.set()
+            for loser in futs:
+                loser.cancel()  # only takes effect if it has not started
+            m.set(hedge_won=f is not first)
+            return f.result()
+    # both attempts failed: prefer a non-throttle error, it is not retryable
+    raise next((e for e in errors if not is_throttle(e)), errors[0])
+
+
+def invoke(
+    client,
+    model_id: str,
+    body: bytes,
+    deadline: float,
+    m=metrics.NULL,
+    tracker: Optional[LatencyTracker] = None,
+) -> Tuple[bytes, Optional[Dict]]:
+    """
+    `client.invoke_model` with hedging and throttle retries before the
+    monotonic `deadline`; returns (raw response body, HTTP headers).
+    """
+    tracker = tracker or LATENCY
+    hedge, attempt = HEDGE, 0
+    while True:
+        try:
+            return _race(client, model_id, body, deadline, hedge, tracker, m)
+        except Exception as err:
+            if is_timeout(err):
+                raise DeadlineExceeded(f"model did not answer within the deadline: {err}") from err
+            if not is_throttle(err):
+                raise
+            hedge = False
+            m.set(throttles=attempt + 1)
+            pause = _rnd.uniform(0.0, min(BACKOFF_CAP_MS, BACKOFF_BASE_MS * 2 ** attempt)) / 1000.0
+            if attempt >= MAX_RETRIES or time.monotonic() + pause + tracker.expected(model_id) > deadline:
+                raise Throttled(f"model throttled after {attempt + 1} attempt(s): {err}") from err
+            attempt += 1
+            m.set(retries=attempt)
+            time.sleep(pause)
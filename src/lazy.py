@@ -0,0 +1,66 @@
+"""
+Deferred imports for the Time-Series -> LLM Lambda.
+
+Responsibilities
+----------------
+1. Import optional heavy dependencies (NumPy) on first use, not at
+   module import, so cold starts and 400s never pay for them.
+2. Give modules a sentinel for "not imported yet" that is distinct from
+   None ("not installed" / disabled).
+
+3. Decide, in one place, when an input is large enough for NumPy
+   (`np_for`, `NP_MIN_POINTS`).
+
+Design notes
+------------
+- Modules gate on `lazy.np_for(n)` and, inside their NumPy paths, bind
+  `np = lazy.numpy()` locally; neither imports anything after the
+  first call.
+- Setting `lazy.np` to None (tests, `--no-numpy` benchmarks) forces
+  every pure-Python path.
+"""
+
+from __future__ import annotations
+from functools import lru_cache
+from typing import Optional
+import importlib
+
+
+class _Unloaded:
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "<not imported yet>"
+
+
+UNLOADED = _Unloaded()
+
+# Below this many values (points, rows) the NumPy setup costs more than
+# the loop it replaces.
+NP_MIN_POINTS = 256
+
+np = UNLOADED
+
+
+@lru_cache(maxsize=None)
+def optional(name: str):
+    """Module `name`, or None if it is not installed."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def numpy():
+    """numpy, or None if it is not installed (or `np` was set to None)."""
+    global np
+    if np is UNLOADED:
+        np = optional("numpy")
+    return np
+
+
+def np_for(n: int, min_points: Optional[int] = None):
+    """numpy if `n` values are worth vectorising and it is available, else None."""
+    if n < (NP_MIN_POINTS if min_points is None else min_points):
+        return None
+    return numpy()
@@ -0,0 +1,228 @@
+"""
+Per-invocation metrics for the Time-Series -> LLM Lambda.
+
+Responsibilities
+----------------
+1. Time each request stage (parse, validate, fetch, context, invoke,
+   extract, ...) with a monotonic clock.
+2. Collect request facts: payload points, context bytes / tokens, series
+   left out by the relevance router, cascade tier / reason / escalation,
+   the model that answered, hedges / throttles / retries, Bedrock
+   request counters (in flight, peak, sent), cold start,
+   cache hit (exact or near-duplicate, with its similarity), status.
+3. Emit exactly one structured record per invocation, formatted as a
+   CloudWatch Embedded Metric Format (EMF) log line.
+
+Design notes
+------------
+- Sinks are plain callables taking the finished record (a dict); the
+  default prints the EMF JSON line to stdout, which Lambda ships to
+  CloudWatch Logs where the metrics are extracted without API calls.
+  Tests swap in a list-appending sink via `set_sinks`.
+- A record costs a few microseconds (two perf_counter calls per stage,
+  one json.dumps); `METRICS=off` turns emission off entirely.
+- A failing sink never fails a request.
+"""
+
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional
+import json
+import os
+import sys
+import time
+
+NAMESPACE = os.getenv("METRICS_NAMESPACE", "TimeSeriesLLM")
+ENABLED = os.getenv("METRICS", "on").lower() not in ("0", "off", "false", "no")
+
+# Low-cardinality properties promoted to CloudWatch dimensions.
+DIMENSIONS = ("route", "model_id")
+
+# Non-timing metrics and their EMF units; stage timings are "<stage>_ms".
+_UNITS = {
+    "points": "Count",
+    "context_bytes": "Bytes",
+    "context_tokens": "Count",
+    "input_tokens": "Count",
+    "cache_read_tokens": "Count",
+    "cache_write_tokens": "Count",
+    "items": "Count",
+    "items_failed": "Count",
+    "series_skipped": "Count",
+    "escalated": "Count",
+    "hedged": "Count",
+    "hedge_skipped": "Count",
+    "retries": "Count",
+    "throttles": "Count",
+    "requests_in_flight": "Count",
+    "requests_peak": "Count",
+    "requests_sent": "Count",
+    "cache_hit": "Count",
+    "semantic_hit": "Count",
+    "cold_start": "Count",
+}
+
+Sink = Callable[[Dict], None]
+
+# ------------------------------------------------------------------ #
+# Sinks
+# ------------------------------------------------------------------ #
+
+
+_SPECS: Dict[tuple, str] = {}  # (dims, names) -> serialised CloudWatchMetrics
+
+
+def _spec(dims: tuple, names: tuple) -> str:
+    spec = _SPECS.get((dims, names))
+    if spec is None:
+        spec = _SPECS[(dims, names)] = json.dumps([{
+            "Namespace": NAMESPACE,
+            "Dimensions": [list(dims)],
+            "Metrics": [{"Name": k, "Unit": "Milliseconds" if k.endswith("_ms") else _UNITS[k]}
+                        for k in names],
+        }], separators=(",", ":"))
+    return spec
+
+
+def emf_line(record: Dict) -> str:
+    """One EMF log line: the flat record plus the `_aws` envelope."""
+    dims = tuple(d for d in DIMENSIONS if record.get(d) is not None)
+    names = tuple(k for k in record if k.endswith("_ms") or k in _UNITS)
+    # EMF metric values must be numbers; flags are reported as 0/1
+    flat = dict(record, **{k: int(record[k]) for k in names if isinstance(record[k], bool)})
+    body = json.dumps(flat, separators=(",", ":"), default=str)
+    head = '{"_aws":{"Timestamp":%d,"CloudWatchMetrics":%s}' % (time.time() * 1000, _spec(dims, names))
+    return head + ("," + body[1:] if len(body) > 2 else "}")
+
+
+def stdout_sink(record: Dict) -> None:
+    sys.stdout.write(emf_line(record) + "\n")
+
+
+_SINKS: List[Sink] = [stdout_sink]
+
+
+def set_sinks(sinks: List[Sink]) -> List[Sink]:
+    """Replace the sinks; returns the previous list (for restoring)."""
+    global _SINKS
+    prev, _SINKS = _SINKS, list(sinks)
+    return prev
+
+# ------------------------------------------------------------------ #
+# Recorder
+# ------------------------------------------------------------------ #
+
+_COLD = True
+
+
+def _take_cold() -> bool:
+    """True for the first invocation in this container only."""
+    global _COLD
+    cold, _COLD = _COLD, False
+    return cold
+
+
+class _Stage:
+    __slots__ = ("_inv", "_name", "_t0")
+
+    def __init__(self, inv: "Invocation", name: str) -> None:
+        self._inv = inv
+        self._name = name
+
+    def __enter__(self) -> "_Stage":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        t = self._inv.timings
+        ms = (time.perf_counter() - self._t0) * 1000.0
+        t[self._name] = t.get(self._name, 0.0) + ms  # stages may repeat
+
+
+class Invocation:
+    """
+    Metrics for one request:
+
+        m = Invocation(route="query")
+        with m.stage("parse"):
+            ...
+        m.set(points=n, cache_hit=False)
+        m.emit(status=200)
+    """
+
+    __slots__ = ("data", "timings", "_t0", "_done")
+
+    def __init__(self, **props) -> None:
+        self._t0 = time.perf_counter()
+        self._done = False
+        self.data: Dict = {"cold_start": _take_cold()}
+        self.data.update(props)
+        self.timings: Dict[str, float] = {}
+
+    def stage(self, name: str) -> _Stage:
+        return _Stage(self, name)
+
+    def set(self, **values) -> None:
+        self.data.update(values)
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._t0) * 1000.0
+
+    def record(self) -> Dict:
+        """Flat record: properties, values and `<stage>_ms` timings."""
+        out = dict(self.data)
+        for name, ms in self.timings.items():
+            out[name + "_ms"] = round(ms, 3)
+        out["total_ms"] = round(self.elapsed_ms(), 3)
+        return out
+
+    def emit(self, **values) -> Optional[Dict]:
+        """Finish the record and hand it to every sink (once)."""
+        if self._done:
+            return None
+        self._done = True
+        self.data.update(values)
+        if not ENABLED or not _SINKS:
+            return None
+        rec = self.record()
+        for sink in _SINKS:
+            try:
+                sink(rec)
+            except Exception:  # metrics must never fail a request
+                pass
+        return rec
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullStage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _NullInvocation(Invocation):
+    """Recorder that records nothing (batch items, internal callers)."""
+
+    __slots__ = ()
+
+    def __init__(self) -> None:  # no cold-start bookkeeping
+        self.data = {}
+        self.timings = {}
+        self._done = True
+
+    def stage(self, name: str) -> _NullStage:  # type: ignore[override]
+        return _NULL_STAGE
+
+    def set(self, **values) -> None:
+        pass
+
+    def emit(self, **values) -> None:
+        return None
+
+
+NULL = _NullInvocation()
@@ -0,0 +1,123 @@
+"""
+Bedrock request bodies with provider-side prompt caching.
+
+Responsibilities
+----------------
+1. Build the model request body for a (system prompt, vitals context,
+   question) triple, marking cache points after the system prompt and
+   after the vitals block so a patient's follow-up questions reuse the
+   cached prefix instead of paying prefill for it again.
+2. Read input / cache-read / cache-write token counts back from the
+   response (body `usage`, falling back to Bedrock's HTTP headers).
+
+Design notes
+------------
+- Anthropic models take `cache_control` on content blocks; Amazon Nova
+  takes explicit `cachePoint` blocks.  Any other model gets the original
+  message list unchanged (style "off").
+- Everything before the question depends only on the system prompt and
+  the context, which `utils.build_context_from_payload` serialises
+  deterministically, so the prefix repeats byte for byte.
+- Providers only cache prefixes above a model-specific minimum length
+  (about 1-2k tokens for Claude); shorter prefixes are simply processed
+  as usual, so the markers are always safe to send.
+"""
+
+from __future__ import annotations
+from typing import Dict, Optional
+
+ANTHROPIC_VERSION = "bedrock-2023-05-31"
+STYLES = ("anthropic", "nova", "off")
+
+# Heads the vitals block; every style labels it "vitals", as the system
+# prompts say, and the wording does not assume JSON (see wire.py).
+VITALS_LABEL = "vitals:\n"
+
+_EPHEMERAL = {"type": "ephemeral"}
+_CACHE_POINT = {"cachePoint": {"type": "default"}}
+
+
+def cache_style(model_id: Optional[str], setting: str = "auto") -> str:
+    """Marker style for `model_id`; `setting` may force one of STYLES."""
+    setting = (setting or "auto").lower()
+    if setting in STYLES:
+        return setting
+    mid = (model_id or "").lower()
+    if "anthropic" in mid:
+        return "anthropic"
+    if "amazon.nova" in mid:
+        return "nova"
+    return "off"
+
+
+def build_body(
+    system: str,
+    context: str,
+    question: str,
+    style: str = "off",
+    max_tokens: int = 2000,
+) -> Dict:
+    """Request body; cache points (if any) sit after `system` and `context`."""
+    if style == "anthropic":
+        return {
+            "anthropic_version": ANTHROPIC_VERSION,
+            "max_tokens": max_tokens,
+            "system": [{"type": "text", "text": system, "cache_control": _EPHEMERAL}],
+            "messages": [{"role": "user", "content": [
+                {"type": "text", "text": VITALS_LABEL + context, "cache_control": _EPHEMERAL},
+                {"type": "text", "text": question},
+            ]}],
+        }
+    if style == "nova":
+        return {
+            "schemaVersion": "messages-v1",
+            "system": [{"text": system}, _CACHE_POINT],
+            "messages": [{"role": "user", "content": [
+                {"text": VITALS_LABEL + context}, _CACHE_POINT,
+                {"text": question},
+            ]}],
+            "inferenceConfig": {"maxTokens": max_tokens},
+        }
+    return {
+        "messages": [
+            {"role": "system", "content": system},
+            {"role": "assistant", "name": "vitals", "content": context},
+            {"role": "user", "content": question},
+        ],
+        "max_tokens": max_tokens,
+    }
+
+
+def prefix(body: Dict) -> str:
+    """Style and system prompt of a `build_body` body; part of cache keys."""
+    if "anthropic_version" in body:
+        return "anthropic\x1f" + body["system"][0]["text"]
+    if "schemaVersion" in body:
+        return "nova\x1f" + body["system"][0]["text"]
+    return "off\x1f" + body["messages"][0]["content"]
+
+
+# (body usage key, Bedrock response header) per reported field
+_USAGE = {
+    "input_tokens": (("input_tokens", "inputTokens"),
+                     "x-amzn-bedrock-input-token-count"),
+    "cache_read_tokens": (("cache_read_input_tokens", "cacheReadInputTokenCount", "cacheReadInputTokens"),
+                          "x-amzn-bedrock-cache-read-input-token-count"),
+    "cache_write_tokens": (("cache_creation_input_tokens", "cacheWriteInputTokenCount", "cacheWriteInputTokens"),
+                           "x-amzn-bedrock-cache-write-input-token-count"),
+}
+
+
+def cache_usage(body_json: Optional[Dict], headers: Optional[Dict] = None) -> Dict[str, int]:
+    """Token counts reported by the model; fields it did not report are omitted."""
+    usage = (body_json or {}).get("usage") or {}
+    headers = {k.lower(): v for k, v in (headers or {}).items()}
+    out = {}
+    for field, (keys, header) in _USAGE.items():
+        value = next((usage[k] for k in keys if usage.get(k) is not None), headers.get(header))
+        if value is not None:
+            try:
+                out[field] = int(value)
+            except (TypeError, ValueError):
+                pass
+    return out
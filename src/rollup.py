@@ -0,0 +1,276 @@
+"""
+Multi-resolution rollups for the Time-Series -> LLM Lambda.
+
+Responsibilities
+----------------
+1. Aggregate a timed series into hourly, daily and weekly buckets
+   (mean / min / max / count) in one pass, and extend them in
+   O(new points) as readings arrive.
+2. Detect the time horizon a question is about ("this morning",
+   "last 3 weeks", "this year") and the coarsest level that still
+   resolves it.
+3. Cut a level down to the horizon and coarsen it further when the
+   rows do not fit the token budget (`utils` does the fitting).
+
+Design notes
+------------
+- Buckets store sum/min/max/count, so merging two of them is exact:
+  appending points and coarsening (day -> 2 days -> 4 days ...) never
+  re-reads raw data.
+- Buckets are UTC-aligned; weeks start on Monday.  Each level keeps a
+  bounded number of buckets (`LEVELS`), dropping the oldest.
+- Points at or before the latest timestamp already folded in are
+  skipped, as in `session`, so overlapping deltas are safe.
+- Pyramids for sessionless requests are memoised by content hash;
+  sessions keep theirs in `session.SeriesState`.
+"""
+
+from __future__ import annotations
+from array import array
+from bisect import bisect_right
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import math
+import re
+
+import cache
+import lazy
+from series import DAY, Series
+
+HOUR = 3600
+WEEK = 7 * DAY
+_MONDAY = 4 * DAY  # 1970-01-05, the first Monday after the epoch
+
+# name -> (bucket width s, alignment offset s, buckets kept)
+LEVELS = {
+    "hour": (HOUR, 0, 24 * 92),
+    "day": (DAY, 0, 3 * 366),
+    "week": (WEEK, _MONDAY, 520),
+}
+
+# A level resolves a horizon if the horizon spans at least this many of
+# its buckets; below that the next finer level (or raw points) is used.
+MIN_BUCKETS = 6
+
+Bucket = Tuple[int, float, float, float, int]  # start, sum, min, max, count
+
+# ------------------------------------------------------------------ #
+# One level
+# ------------------------------------------------------------------ #
+
+
+class Level:
+    """Columnar buckets of one width."""
+
+    __slots__ = ("width", "offset", "cap", "start", "sum", "min", "max", "count")
+
+    def __init__(self, width: int, offset: int = 0, cap: int = 0) -> None:
+        self.width, self.offset, self.cap = width, offset, cap
+        self.start = array("q")
+        self.sum = array("d")
+        self.min = array("d")
+        self.max = array("d")
+        self.count = array("q")
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def add(self, t: int, v: float) -> None:
+        b = t - (t - self.offset) % self.width
+        if len(self.start) and self.start[-1] == b:
+            self.sum[-1] += v
+            self.count[-1] += 1
+            if v < self.min[-1]:
+                self.min[-1] = v
+            elif v > self.max[-1]:
+                self.max[-1] = v
+            return
+        self.start.append(b)
+        self.sum.append(v)
+        self.min.append(v)
+        self.max.append(v)
+        self.count.append(1)
+        if self.cap and len(self.start) > self.cap + self.cap // 4:
+            self.trim()  # amortised: at most one shift per cap/4 buckets
+
+    def trim(self) -> None:
+        extra = len(self.start) - self.cap
+        if self.cap and extra > 0:
+            for col in (self.start, self.sum, self.min, self.max, self.count):
+                del col[:extra]
+
+    def buckets(self, since: Optional[float] = None) -> List[Bucket]:
+        """Buckets overlapping [since, latest] (all if `since` is None)."""
+        lo = 0 if since is None else bisect_right(self.start, since - self.width)
+        return list(zip(self.start[lo:], self.sum[lo:], self.min[lo:], self.max[lo:], self.count[lo:]))
+
+    def to_dict(self) -> Dict:
+        return {k: getattr(self, k).tolist() for k in ("start", "sum", "min", "max", "count")}
+
+    @classmethod
+    def from_dict(cls, d: Dict, width: int, offset: int, cap: int) -> "Level":
+        lvl = cls(width, offset, cap)
+        for k, code in (("start", "q"), ("sum", "d"), ("min", "d"), ("max", "d"), ("count", "q")):
+            setattr(lvl, k, array(code, d.get(k) or []))
+        return lvl
+
+
+def _level_np(ts, vals, width: int, offset: int, cap: int) -> Level:
+    """Same buckets as repeated `Level.add`, via one reduceat per column."""
+    np = lazy.numpy()
+    t = np.frombuffer(ts, dtype=np.int64)
+    v = np.frombuffer(vals, dtype=np.float64)
+    keys = t - (t - offset) % width
+    first = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    lvl = Level(width, offset, cap)
+    lvl.start = array("q", keys[first].tobytes())
+    lvl.sum = array("d", np.add.reduceat(v, first).tobytes())
+    lvl.min = array("d", np.minimum.reduceat(v, first).tobytes())
+    lvl.max = array("d", np.maximum.reduceat(v, first).tobytes())
+    lvl.count = array("q", np.diff(np.append(first, len(v))).astype(np.int64).tobytes())
+    lvl.trim()
+    return lvl
+
+# ------------------------------------------------------------------ #
+# Pyramid
+# ------------------------------------------------------------------ #
+
+
+class Pyramid:
+    """Hourly / daily / weekly rollups of one timed series."""
+
+    __slots__ = ("levels", "last_ts", "n")
+
+    def __init__(self) -> None:
+        self.levels = {name: Level(*spec) for name, spec in LEVELS.items()}
+        self.last_ts: Optional[int] = None
+        self.n = 0
+
+    @classmethod
+    def build(cls, s: Series) -> "Pyramid":
+        """All levels in one pass over `s` (one vector pass each with NumPy)."""
+        if s.timed and lazy.np_for(len(s)) is not None:
+            pyr = cls()
+            pyr.levels = {name: _level_np(s.ts, s.values, *spec) for name, spec in LEVELS.items()}
+            pyr.last_ts, pyr.n = s.ts[-1], len(s)
+            return pyr
+        pyr = cls()
+        pyr.extend(s)
+        for lvl in pyr.levels.values():
+            lvl.trim()
+        return pyr
+
+    def extend(self, s: Series) -> int:
+        """Fold in points newer than `last_ts`; returns how many."""
+        if not s.timed or not len(s):
+            return 0
+        start = 0 if self.last_ts is None else s.index_at(self.last_ts + 1)
+        levels = list(self.levels.values())
+        ts, vals = s.ts, s.values
+        for i in range(start, len(s)):
+            t, v = ts[i], vals[i]
+            for lvl in levels:
+                lvl.add(t, v)
+        if start < len(s):
+            self.last_ts = ts[-1]
+            self.n += len(s) - start
+        return len(s) - start
+
+    def to_dict(self) -> Dict:
+        return {"last_ts": self.last_ts, "n": self.n,
+                "levels": {k: lvl.to_dict() for k, lvl in self.levels.items()}}
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "Pyramid":
+        pyr = cls()
+        pyr.last_ts, pyr.n = d.get("last_ts"), d.get("n", 0)
+        for name, spec in LEVELS.items():
+            if name in d.get("levels", {}):
+                pyr.levels[name] = Level.from_dict(d["levels"][name], *spec)
+        return pyr
+
+
+_PYRAMIDS = cache.LRUCache(maxsize=64, ttl=900.0)
+
+
+def pyramid_for(s: Series) -> Pyramid:
+    """Memoised `Pyramid.build` keyed by the series' bytes."""
+    key = hashlib.blake2b(s.ts.tobytes() + s.values.tobytes(), digest_size=16).hexdigest()
+    pyr = _PYRAMIDS.get(key)
+    if pyr is None:
+        pyr = Pyramid.build(s)
+        _PYRAMIDS.set(key, pyr)
+    return pyr
+
+# ------------------------------------------------------------------ #
+# Horizon detection
+# ------------------------------------------------------------------ #
+
+_UNITS = {"hour": HOUR, "day": DAY, "week": WEEK, "month": 31 * DAY, "year": 366 * DAY}
+_NUMBERS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+            "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+            "couple of": 2, "few": 3}
+
+# (pattern, horizon in seconds) - the widest match wins
+_PHRASES = [
+    (re.compile(r"\b(right now|currently|at the moment|just now|latest|last reading|most recent)\b"), 3 * HOUR),
+    (re.compile(r"\b(today|tonight|last night|this (morning|afternoon|evening))\b"), DAY),
+    (re.compile(r"\byesterday\b"), 2 * DAY),
+    (re.compile(r"\b(this|last|past|previous) week\b|\bweekly\b"), WEEK),
+    (re.compile(r"\bfortnight\b"), 2 * WEEK),
+    (re.compile(r"\b(this|last|past|previous) month\b|\bmonthly\b"), _UNITS["month"]),
+    (re.compile(r"\b(this|last|past|previous) (year|12 months)\b|\b(yearly|annual)\b"), _UNITS["year"]),
+    (re.compile(r"\b(all[- ]time|ever|overall|long[- ]term|since i (started|began)|whole history)\b"), math.inf),
+]
+_COUNTED = re.compile(
+    r"\b(\d+|" + "|".join(_NUMBERS) + r")[ -](hour|day|week|month|year)s?\b")
+
+
+def horizon(prompt: str) -> Optional[float]:
+    """Seconds of history the question asks about (inf = all), or None."""
+    text = (prompt or "").lower()
+    found = [h for pat, h in _PHRASES if pat.search(text)]
+    for num, unit in _COUNTED.findall(text):
+        found.append((int(num) if num.isdigit() else _NUMBERS[num]) * _UNITS[unit])
+    return max(found) if found else None
+
+
+def level_for(horizon_s: float) -> str:
+    """Coarsest level with at least MIN_BUCKETS buckets in the horizon, else "raw"."""
+    for name in reversed(list(LEVELS)):
+        if LEVELS[name][0] * MIN_BUCKETS <= horizon_s:
+            return name
+    return "raw"
+
+# ------------------------------------------------------------------ #
+# Views
+# ------------------------------------------------------------------ #
+
+
+def coarsen(buckets: List[Bucket], width: int, offset: int) -> List[Bucket]:
+    """Merge buckets into `width`-wide ones (exact: sums, extremes, counts)."""
+    out: List[list] = []
+    for start, s, lo, hi, n in buckets:
+        b = start - (start - offset) % width
+        if out and out[-1][0] == b:
+            last = out[-1]
+            last[1] += s
+            last[2] = min(last[2], lo)
+            last[3] = max(last[3], hi)
+            last[4] += n
+        else:
+            out.append([b, s, lo, hi, n])
+    return [tuple(b) for b in out]
+
+
+def res_label(width: int) -> str:
+    return f"{width // HOUR}h" if width < DAY else f"{width // DAY}d"
+
+
+def rows(buckets: List[Bucket], width: int) -> List[list]:
+    """[start, mean, min, max, count] rows with ISO start labels."""
+    fmt = "%Y-%m-%dT%H" if width < DAY else "%Y-%m-%d"
+    return [[datetime.fromtimestamp(start, timezone.utc).strftime(fmt),
+             round(s / n, 1) + 0.0, round(lo, 1) + 0.0, round(hi, 1) + 0.0, n]
+            for start, s, lo, hi, n in buckets]
@@ -0,0 +1,255 @@
+"""
+Near-duplicate question cache for the Time-Series -> LLM Lambda.
+
+Responsibilities
+----------------
+1. Embed a question locally: series words are folded to their canonical
+   name through `utils`' keyword table (so "sugar", "BG" and "glucose"
+   agree, as do the `_ALIASES`), a few synonyms are folded, filler
+   words are dropped, and the remaining words and their character
+   trigrams are hashed into a `DIM`-wide, L2-normalised vector.
+2. Keep answered questions in an in-memory index scoped by (model,
+   prompt version, vitals context), and return the cached answer of
+   the most similar earlier question when the cosine similarity reaches
+   `threshold`.
+3. Count hits, misses and evictions (see `stats`); the handler also
+   records per-request `semantic_hit` / `semantic_score` metrics.
+
+Design notes
+------------
+- Scopes come from the vitals context hash, so an answer is only ever
+  reused for the same numbers.  The scope also includes the question's
+  time horizon (`rollup.horizon`) and any numbers in it, so "last 7
+  days" never answers "last 30 days" however similar the text.
+- Features are hashed with crc32 and a sign bit (the hashing trick), so
+  no vocabulary is stored and results are stable across processes.
+- Vectors are kept sparse (dicts).  Once a scope holds `lazy.NP_MIN_POINTS`
+  questions and NumPy is available, it also keeps a dense float32
+  feature-by-entry matrix; a lookup reads only the rows of the query's
+  non-zero features (a few dozen) and is one small product: about
+  0.2 ms at 10k entries, embedding included.  Scopes are usually a
+  handful of questions, for which pure-Python dot products are faster.
+- Bounded like `cache.LRUCache`: `maxsize` entries in total, the least
+  recently used scope is dropped first, and a scope that alone
+  outgrows `maxsize` overwrites its oldest entries.  Entries expire
+  after `ttl` seconds.
+- `SEMANTIC_CACHE_SIZE=0` (the default) disables the layer.
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+import math
+import os
+import re
+import threading
+import time
+import zlib
+
+import cache
+import lazy
+import rollup
+import utils
+
+DIM = 256
+TRIGRAM_WEIGHT = 0.5  # per trigram, against 1.0 per word
+
+_CONTRACTIONS = [(re.compile(p), r) for p, r in (
+    (r"n't\b", " not"), (r"'s\b", " is"), (r"'re\b", " are"), (r"'m\b", " am"), (r"'ve\b", " have"))]
+_WORD = re.compile(r"[a-z0-9_/]+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_STOP = frozenset(
+    "a an the my me i im is are was were am be been being do does did doing done has have "
+    "had how what whats hows please can could would you tell show give let know of in on "
+    "for to at with about and or it its so there looking look looked going blood".split())
+_SYNONYMS = {"okay": "ok", "fine": "ok", "alright": "ok", "avg": "average", "mean": "average",
+             "current": "latest", "recent": "latest"}
+
+Vector = Dict[int, float]
+
+# ------------------------------------------------------------------ #
+# Embedding
+# ------------------------------------------------------------------ #
+
+
+def normalise(question: str) -> List[str]:
+    """Content words with series words folded to their canonical name."""
+    text = question.casefold()
+    for pat, rep in _CONTRACTIONS:
+        text = pat.sub(rep, text)
+    for name, pat in utils._ROUTES.items():
+        text = pat.sub(f" {name} ", text)
+    return [_SYNONYMS.get(w, w) for w in _WORD.findall(text) if w not in _STOP]
+
+
+def _feature(vec: Vector, key: str, weight: float) -> None:
+    h = zlib.crc32(key.encode())
+    i = h % DIM
+    vec[i] = vec.get(i, 0.0) + (weight if h & 0x10000 else -weight)
+
+
+def embed(question: str) -> Vector:
+    """Sparse, L2-normalised hashed word + character-trigram vector."""
+    vec: Vector = {}
+    for w in normalise(question):
+        _feature(vec, w, 1.0)
+        padded = f"<{w}>"
+        for i in range(len(padded) - 2):
+            _feature(vec, padded[i:i + 3], TRIGRAM_WEIGHT)
+    norm = math.sqrt(sum(v * v for v in vec.values()))
+    return {i: v / norm for i, v in vec.items() if v} if norm else {}
+
+
+def _dot(a: Vector, b: Vector) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(i, 0.0) for i, v in a.items())
+
+
+def scope_key(model_id: str, prompt_version: str, context: str, system: str = "") -> str:
+    return cache.make_key(model_id or "", prompt_version, "", context, system)
+
+
+def _guard(question: str) -> Tuple:
+    """Parts of a question that must match exactly: horizon and numbers."""
+    return rollup.horizon(question), tuple(sorted(set(_NUMBER.findall(question))))
+
+# ------------------------------------------------------------------ #
+# Index
+# ------------------------------------------------------------------ #
+
+
+class _Scope:
+    """Entries of one scope; a ring once it reaches `cap`."""
+
+    __slots__ = ("cap", "vecs", "answers", "expires", "next", "mat")
+
+    def __init__(self, cap: int) -> None:
+        self.cap = cap
+        self.vecs: List[Vector] = []
+        self.answers: List[str] = []
+        self.expires: List[float] = []
+        self.next = 0
+        self.mat = None  # dense (DIM, rows) float32, built once the scope is large
+
+    def __len__(self) -> int:
+        return len(self.vecs)
+
+    def add(self, vec: Vector, answer: str, expires: float) -> int:
+        """Store an entry; returns 1 if it grew the scope, 0 if it overwrote one."""
+        if len(self.vecs) < self.cap:
+            i = len(self.vecs)
+            self.vecs.append(vec)
+            self.answers.append(answer)
+            self.expires.append(expires)
+            grew = 1
+        else:
+            i = self.next
+            self.next = (i + 1) % self.cap
+            self.vecs[i], self.answers[i], self.expires[i] = vec, answer, expires
+            grew = 0
+        if self.mat is not None:
+            np = lazy.numpy()
+            if i >= self.mat.shape[1]:
+                cols = np.zeros((DIM, min(2 * self.mat.shape[1], self.cap)), dtype=np.float32)
+                cols[:, :self.mat.shape[1]] = self.mat
+                self.mat = cols
+            self.mat[:, i] = 0.0
+            self.mat[list(vec), i] = list(vec.values())
+        return grew
+
+    def best(self, vec: Vector) -> Tuple[int, float]:
+        """(index, cosine) of the closest entry."""
+        n = len(self.vecs)
+        np = lazy.np_for(n) if self.mat is None else lazy.numpy()
+        if self.mat is None and np is not None:
+            self.mat = np.zeros((DIM, max(n, min(2 * n, self.cap))), dtype=np.float32)
+            for i, v in enumerate(self.vecs):
+                self.mat[list(v), i] = list(v.values())
+        if self.mat is not None:
+            # only the query's non-zero features are read: k rows of n floats
+            scores = np.asarray(list(vec.values()), dtype=np.float32) @ self.mat[list(vec), :n]
+            i = int(scores.argmax())
+            return i, float(scores[i])
+        best, score = -1, -1.0
+        for i, v in enumerate(self.vecs):
+            s = _dot(vec, v)
+            if s > score:
+                best, score = i, s
+        return best, score
+
+
+class SemanticCache:
+    """Similarity-thresholded answers per scope, bounded and TTL'd (thread-safe)."""
+
+    def __init__(
+        self,
+        maxsize: int = 4096,
+        ttl: float = 900.0,
+        threshold: float = 0.9,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._clock = clock
+        self._scopes: "OrderedDict[tuple, _Scope]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def get(self, scope: str, question: str) -> Tuple[Optional[str], float]:
+        """(cached answer or None, best similarity seen)."""
+        if self.maxsize <= 0:
+            return None, 0.0
+        vec = embed(question)
+        with self._lock:
+            sc = self._scopes.get((scope, _guard(question)))
+            if sc is None or not vec:
+                self.misses += 1
+                return None, 0.0
+            i, score = sc.best(vec)
+            if score >= self.threshold and sc.expires[i] > self._clock():
+                self._scopes.move_to_end((scope, _guard(question)))
+                self.hits += 1
+                return sc.answers[i], score
+            self.misses += 1
+            return None, max(score, 0.0)
+
+    def set(self, scope: str, question: str, answer: str) -> None:
+        if self.maxsize <= 0:
+            return
+        vec = embed(question)
+        if not vec:
+            return
+        key = (scope, _guard(question))
+        with self._lock:
+            sc = self._scopes.get(key)
+            if sc is None:
+                sc = self._scopes[key] = _Scope(self.maxsize)
+            self._scopes.move_to_end(key)
+            self._size += sc.add(vec, answer, self._clock() + self.ttl)
+            while self._size > self.maxsize:
+                _, old = self._scopes.popitem(last=False)
+                self._size -= len(old)
+                self.evictions += len(old)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": self._size, "scopes": len(self._scopes), "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+
+def from_env() -> SemanticCache:
+    """
+    SEMANTIC_CACHE_SIZE       (entries, 0 disables the layer; default 0)
+    SEMANTIC_CACHE_TTL        (seconds; default RESPONSE_CACHE_TTL or 900)
+    SEMANTIC_CACHE_THRESHOLD  (cosine similarity for a hit; default 0.9)
+    """
+    return SemanticCache(
+        maxsize=int(os.getenv("SEMANTIC_CACHE_SIZE", "0")),
+        ttl=float(os.getenv("SEMANTIC_CACHE_TTL", os.getenv("RESPONSE_CACHE_TTL", "900"))),
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9")),
+    )
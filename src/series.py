@@ -0,0 +1,201 @@
+"""
+Columnar, timestamp-preserving series for the Time-Series -> LLM Lambda.
+
+Responsibilities
+----------------
+1. Hold one vital as two contiguous arrays: int64 epoch seconds and
+   float64 values (16 bytes per point, no per-point Python objects).
+2. Coerce raw client elements (numbers, numeric strings, or
+   {"timestamp": ..., "value": ...} objects) in a single pass.
+3. Answer time-based windows ("last 7 days") by binary search.
+
+Design notes
+------------
+- A series is *timed* only if every kept point carried a parseable
+  timestamp; otherwise `ts` is None and windows fall back to point
+  counts, exactly as before.
+- Timed input is sorted once on construction (stable, so equal
+  timestamps keep arrival order); already-sorted input is detected in
+  O(n) and left alone.
+- Behaves like a read-only sequence of floats, so the stats helpers in
+  `utils` accept it unchanged.
+"""
+
+from __future__ import annotations
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+import math
+import operator
+
+DAY = 86_400  # seconds
+
+# Numeric timestamps above this are taken to be epoch *milliseconds*
+# (1e11 s is roughly the year 5138).
+_MS_THRESHOLD = 1e11
+
+
+def parse_timestamp(raw) -> Optional[int]:
+    """ISO-8601 string or epoch seconds/millis -> int epoch seconds."""
+    if raw is None or isinstance(raw, bool):
+        return None
+    if isinstance(raw, (int, float)):
+        if not math.isfinite(raw):
+            return None
+        return int(raw / 1000) if abs(raw) > _MS_THRESHOLD else int(raw)
+    if isinstance(raw, str):
+        try:
+            dt = datetime.fromisoformat(raw.strip())
+        except ValueError:
+            try:
+                return parse_timestamp(float(raw))
+            except ValueError:
+                return None
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return int(dt.timestamp())
+    return None
+
+
+def _coerce_point(x) -> Tuple[Optional[int], Optional[float]]:
+    """One raw element -> (timestamp or None, value or None)."""
+    ts = None
+    if isinstance(x, dict):
+        ts = parse_timestamp(x.get("timestamp", x.get("time")))
+        x = x.get("value")
+    if x is None or isinstance(x, bool):
+        return ts, None
+    try:
+        v = float(x)
+    except (TypeError, ValueError, OverflowError):  # 10**400 overflows a double
+        return ts, None
+    if math.isnan(v) or math.isinf(v):
+        return ts, None
+    return ts, v
+
+
+class Series:
+    """Compact (timestamps, values) pair; see module docstring."""
+
+    __slots__ = ("ts", "values")
+
+    def __init__(
+        self,
+        values: Iterable[float] = (),
+        timestamps: Optional[Iterable[int]] = None,
+        *,
+        presorted: bool = False,
+    ) -> None:
+        self.values = values if isinstance(values, array) and values.typecode == "d" else array("d", values)
+        if timestamps is None:
+            self.ts = None
+            return
+        self.ts = timestamps if isinstance(timestamps, array) and timestamps.typecode == "q" else array("q", timestamps)
+        if len(self.ts) != len(self.values):
+            raise ValueError("timestamps and values differ in length")
+        if not presorted and not _is_sorted(self.ts):
+            order = sorted(range(len(self.ts)), key=self.ts.__getitem__)
+            self.ts = array("q", (self.ts[i] for i in order))
+            self.values = array("d", (self.values[i] for i in order))
+
+    # -------------------------------------------------------------- #
+    # Construction from client payloads
+    # -------------------------------------------------------------- #
+
+    @classmethod
+    def from_raw(cls, seq: Sequence, max_points: Optional[int] = None) -> "Series":
+        """
+        Coerce a raw client array, dropping unusable elements.
+        Keeps only the latest `max_points` points (after sorting).
+        """
+        vals = array("d")
+        tss = array("q")
+        timed = True
+        for x in seq:
+            if timed and not isinstance(x, dict):
+                timed = False
+            ts, v = _coerce_point(x)
+            if v is None:
+                continue
+            vals.append(v)
+            if timed:
+                if ts is None:
+                    timed = False
+                else:
+                    tss.append(ts)
+        out = cls(vals, tss if timed and len(vals) else None)
+        if max_points is not None and len(out) > max_points:
+            out = out[-max_points:]
+        return out
+
+    # -------------------------------------------------------------- #
+    # Sequence protocol (values only)
+    # -------------------------------------------------------------- #
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __iter__(self) -> Iterator[float]:
+        return iter(self.values)
+
+    def __getitem__(self, i: Union[int, slice]):
+        if isinstance(i, slice):
+            if i.step not in (None, 1):
+                raise ValueError("Series slices must be contiguous")
+            return Series(self.values[i], None if self.ts is None else self.ts[i], presorted=True)
+        return self.values[i]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Series):
+            return self.values == other.values and self.ts == other.ts
+        if isinstance(other, (list, tuple)):
+            return list(self.values) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        kind = "timed" if self.timed else "untimed"
+        return f"Series({kind}, n={len(self)})"
+
+    def tolist(self) -> List[float]:
+        return self.values.tolist()
+
+    @property
+    def timed(self) -> bool:
+        return self.ts is not None
+
+    @property
+    def nbytes(self) -> int:
+        n = self.values.itemsize * len(self.values)
+        return n + (self.ts.itemsize * len(self.ts) if self.ts is not None else 0)
+
+    # -------------------------------------------------------------- #
+    # Time windows (binary search over `ts`)
+    # -------------------------------------------------------------- #
+
+    def span(self) -> int:
+        """Seconds between first and latest point (0 if untimed/short)."""
+        if self.ts is None or len(self.ts) < 2:
+            return 0
+        return self.ts[-1] - self.ts[0]
+
+    def index_at(self, ts: int) -> int:
+        """Index of the first point at or after `ts`."""
+        if self.ts is None:
+            raise ValueError("series has no timestamps")
+        return bisect_left(self.ts, ts)
+
+    def window_start(self, seconds: int) -> int:
+        """Index of the first point inside the trailing `seconds` window."""
+        if not len(self):
+            return 0
+        return self.index_at(self.ts[-1] - seconds + 1)
+
+    def covers(self, seconds: int) -> bool:
+        """True if data reaches back at least `seconds` before the latest point."""
+        return self.span() >= seconds
+
+
+def _is_sorted(a: Sequence[int]) -> bool:
+    return all(map(operator.le, a, islice(a, 1, None)))
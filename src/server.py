@@ -0,0 +1,371 @@
+"""
+Long-lived HTTP server for the Time-Series -> LLM handler.
+
+    MODEL_ID=<bedrock-model-id> python src/server.py --port 8080 --workers 4
+
+POST /query         -> `handler.handler` (API-Gateway-shaped event in,
+                       response dict out, as in Lambda)
+POST /query/batch   -> `handler.handler` with `{"items": [...]}` (see
+                       `handler._batch`)
+POST /query/stream  -> `handler.stream_handler`, sent as chunked
+                       `text/event-stream`
+GET  /healthz       -> {"status": "ok", "pid": ..., "inflight": ...}
+
+Responsibilities
+----------------
+1. Serve HTTP/1.1 with keep-alive from an asyncio event loop in each of
+   `SERVER_WORKERS` processes sharing one listening socket, so module
+   state (clients, response / semantic / series caches, latency
+   histograms) stays warm across requests: no cold starts.
+2. Run the handler on a per-process thread pool (`SERVER_THREADS`):
+   parsing, context building and Bedrock waits never block the loop,
+   so slow model calls do not hold up other requests.
+3. Enforce limits before any work: header size (431), body size (413,
+   from the Content-Length alone), in-flight requests per worker (503),
+   and idle / slow-client timeouts.
+4. Shut down gracefully on SIGTERM / SIGINT: stop accepting, close idle
+   keep-alive connections, let in-flight requests finish for up to
+   `SERVER_GRACE_S`, then exit.
+
+Design notes
+------------
+- Each request gets a Lambda-like context whose remaining time starts
+  at `SERVER_REQUEST_TIMEOUT_S`, so the handler's deadlines (hedging,
+  throttle retries, batch cut-off) work exactly as in Lambda.
+- The handler is CPU-bound Python, so one process runs one request's
+  CPU work at a time (the GIL); threads overlap the waits and worker
+  processes add CPU parallelism.  Caches are per process; set
+  RESPONSE_CACHE_DIR / SESSION_DIR to share them between workers.
+- Workers are forked when the platform allows it, and `handler` is
+  imported in each worker rather than in the supervisor, so no boto3
+  client crosses a fork (`invoke` rebuilds its thread pool in a forked
+  child).  A worker that dies is
+  replaced until shutdown starts.
+- Standard library only; `dev_server.py` stays the minimal
+  single-process server for local use.
+"""
+
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Set
+import argparse
+import asyncio
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+import threading
+import time
+
+WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
+THREADS = int(os.getenv("SERVER_THREADS", "32"))
+MAX_INFLIGHT = int(os.getenv("SERVER_MAX_INFLIGHT", "64"))      # per worker
+MAX_HEADER_BYTES = int(os.getenv("SERVER_MAX_HEADER_BYTES", "16384"))
+MAX_BODY_BYTES = int(os.getenv("SERVER_MAX_BODY_BYTES", "0"))  # 0: handler.MAX_BODY_BYTES
+REQUEST_TIMEOUT_S = float(os.getenv("SERVER_REQUEST_TIMEOUT_S", "10"))
+IDLE_TIMEOUT_S = float(os.getenv("SERVER_IDLE_TIMEOUT_S", "15"))
+GRACE_S = float(os.getenv("SERVER_GRACE_S", "20"))
+
+_REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+            405: "Method Not Allowed", 408: "Request Timeout", 411: "Length Required", 413: "Payload Too Large",
+            429: "Too Many Requests", 431: "Request Header Fields Too Large",
+            500: "Internal Server Error", 502: "Bad Gateway", 503: "Service Unavailable",
+            504: "Gateway Timeout"}
+
+
+class _Context:
+    """The part of the Lambda context the handler reads."""
+
+    def __init__(self, timeout_s: float) -> None:
+        self._deadline = time.monotonic() + timeout_s
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(int((self._deadline - time.monotonic()) * 1000), 0)
+
+
+def _json_resp(status: int, payload: Dict) -> Dict:
+    return {"statusCode": status, "headers": {"Content-Type": "application/json"},
+            "body": json.dumps(payload)}
+
+
+class _Reject(Exception):
+    """An HTTP error answered before the handler runs; closes the connection."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+# ------------------------------------------------------------------ #
+# Worker: one event loop, one thread pool
+# ------------------------------------------------------------------ #
+
+
+class Worker:
+    def __init__(
+        self,
+        threads: int = THREADS,
+        max_inflight: int = MAX_INFLIGHT,
+        max_header_bytes: int = MAX_HEADER_BYTES,
+        max_body_bytes: int = MAX_BODY_BYTES,
+        request_timeout_s: float = REQUEST_TIMEOUT_S,
+        idle_timeout_s: float = IDLE_TIMEOUT_S,
+        grace_s: float = GRACE_S,
+    ) -> None:
+        import handler  # deferred: imported per worker process, after fork
+        handler.invoke.reserve(threads)  # one primary model call per request thread
+        self.handler = handler
+        self.threads = threads
+        self.max_inflight = max_inflight
+        self.max_header_bytes = max_header_bytes
+        self.max_body_bytes = max_body_bytes or handler.MAX_BODY_BYTES
+        self.request_timeout_s = request_timeout_s
+        self.idle_timeout_s = idle_timeout_s
+        self.grace_s = grace_s
+        self.inflight = 0
+        self._stopping = False
+        self._idle: Set[asyncio.Task] = set()
+        self._conns: Set[asyncio.Task] = set()
+        self._stop: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def run(self, sock: socket.socket, ready: Optional[threading.Event] = None,
+            install_signals: bool = True) -> None:
+        """Serve `sock` until `stop()` or SIGTERM / SIGINT (blocking)."""
+        asyncio.run(self.serve(sock, ready, install_signals))
+
+    def stop(self) -> None:
+        """Begin a graceful shutdown (thread-safe)."""
+        if self._loop is not None and self._stop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._stop.set)
+
+    async def serve(self, sock: socket.socket, ready: Optional[threading.Event] = None,
+                    install_signals: bool = True) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        if install_signals and threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                self._loop.add_signal_handler(sig, self._stop.set)
+        self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="server")
+        server = await asyncio.start_server(self._connection, sock=sock, limit=self.max_header_bytes)
+        if ready is not None:
+            ready.set()
+        try:
+            await self._stop.wait()
+        finally:
+            self._stopping = True
+            server.close()
+            for task in list(self._idle):   # waiting for a next request: just close
+                task.cancel()
+            if self._conns:
+                _, pending = await asyncio.wait(set(self._conns), timeout=self.grace_s)
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+            await server.wait_closed()
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # -------------------------------------------------------------- #
+    # Connections
+    # -------------------------------------------------------------- #
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._conns.add(task)
+        try:
+            keep_alive = True
+            while keep_alive and not self._stopping:
+                self._idle.add(task)
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.idle_timeout_s)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, _json_resp(431, {"error": "request headers too large"}), False)
+                    return
+                finally:
+                    self._idle.discard(task)
+                try:
+                    method, path, keep_alive, event = await self._read_request(head, reader)
+                except _Reject as err:
+                    await self._send(writer, _json_resp(err.status, {"error": str(err)}), False)
+                    return
+                await self._dispatch(method, path, event, writer, keep_alive)
+                keep_alive = keep_alive and not self._stopping
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._conns.discard(task)
+            writer.close()
+
+    async def _read_request(self, head: bytes, reader: asyncio.StreamReader):
+        try:
+            line, *fields = head[:-4].decode("latin-1").split("\r\n")
+            method, target, version = line.split(" ")
+            headers = {}
+            for f in fields:
+                k, _, v = f.partition(":")
+                headers[k.strip().lower()] = v.strip()
+        except ValueError:
+            raise _Reject(400, "malformed request") from None
+        conn = headers.get("connection", "").lower()
+        keep_alive = conn != "close" if version == "HTTP/1.1" else conn == "keep-alive"
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise _Reject(411, "a Content-Length is required")
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise _Reject(400, "bad Content-Length") from None
+        if length > self.max_body_bytes:  # refuse before reading it
+            raise _Reject(413, "request body too large")
+        try:
+            body = await asyncio.wait_for(reader.readexactly(length), self.idle_timeout_s) if length else b""
+        except asyncio.TimeoutError:
+            raise _Reject(408, "request body too slow") from None
+        path = target.split("?", 1)[0].rstrip("/") or "/"
+        event = {"body": body.decode("utf-8", errors="replace"), "rawPath": path,
+                 "headers": headers, "requestContext": {"http": {"method": method, "path": path}}}
+        return method, path, keep_alive, event
+
+    async def _dispatch(self, method: str, path: str, event: Dict,
+                        writer: asyncio.StreamWriter, keep_alive: bool) -> None:
+        if path == "/healthz":
+            await self._send(writer, _json_resp(200, {"status": "ok", "pid": os.getpid(),
+                                                      "inflight": self.inflight}), keep_alive)
+            return
+        if path not in ("/query", "/query/batch", "/query/stream"):
+            await self._send(writer, _json_resp(404, {"error": "not found"}), keep_alive)
+            return
+        if method != "POST":
+            await self._send(writer, _json_resp(405, {"error": "use POST"}), keep_alive)
+            return
+        if self.inflight >= self.max_inflight:
+            resp = _json_resp(503, {"error": "server busy; please retry shortly"})
+            resp["headers"]["Retry-After"] = "1"
+            await self._send(writer, resp, keep_alive)
+            return
+        loop = asyncio.get_running_loop()
+        context = _Context(self.request_timeout_s)
+        self.inflight += 1
+        try:
+            if path == "/query/stream":
+                await self._stream(self.handler.stream_handler(event, context), writer, keep_alive)
+                return
+            try:
+                # looked up per call so a wrapped handler (loadgen, tests) is used
+                resp = await loop.run_in_executor(self._pool, self.handler.handler, event, context)
+            except Exception as err:  # an unhandled handler error: 500, as Lambda would
+                resp = _json_resp(500, {"error": type(err).__name__})
+            await self._send(writer, resp, keep_alive)
+        finally:
+            self.inflight -= 1
+
+    async def _send(self, writer: asyncio.StreamWriter, resp: Dict, keep_alive: bool) -> None:
+        keep_alive = keep_alive and not self._stopping
+        status = resp.get("statusCode", 200)
+        body = (resp.get("body") or "").encode("utf-8")
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}"]
+        head += [f"{k}: {v}" for k, v in (resp.get("headers") or {}).items()]
+        head += [f"Content-Length: {len(body)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def _stream(self, frames, writer: asyncio.StreamWriter, keep_alive: bool) -> None:
+        loop = asyncio.get_running_loop()
+        keep_alive = keep_alive and not self._stopping
+        writer.write(("HTTP/1.1 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\n"
+                      "Cache-Control: no-cache\r\nTransfer-Encoding: chunked\r\n"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode())
+        try:
+            try:
+                while True:
+                    frame = await loop.run_in_executor(self._pool, next, frames, None)
+                    if frame is None:
+                        break
+                    writer.write(b"%x\r\n%s\r\n" % (len(frame), frame))
+                    await writer.drain()
+            finally:
+                await loop.run_in_executor(self._pool, frames.close)
+            # the last chunk goes out once the request is finished with
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        except Exception as err:  # the status is already sent: drop the connection
+            writer.transport.abort()
+            raise ConnectionError("stream aborted") from err
+
+# ------------------------------------------------------------------ #
+# Supervisor: shared socket, N worker processes
+# ------------------------------------------------------------------ #
+
+
+def bind(host: str = "127.0.0.1", port: int = 8080, backlog: int = 1024) -> socket.socket:
+    return socket.create_server((host, port), backlog=backlog, reuse_port=False)
+
+
+def _worker_main(sock: socket.socket, limits: Dict) -> None:
+    Worker(**limits).run(sock)
+
+
+class Supervisor:
+    """Runs `workers` processes on one listening socket and replaces dead ones."""
+
+    def __init__(self, sock: socket.socket, workers: int = WORKERS, **limits) -> None:
+        self.sock = sock
+        self.workers = workers
+        self.limits = limits
+        self.procs = []
+        self._stop = threading.Event()
+        methods = multiprocessing.get_all_start_methods()
+        self._ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+
+    def _spawn(self):
+        p = self._ctx.Process(target=_worker_main, args=(self.sock, self.limits), daemon=False)
+        p.start()
+        return p
+
+    def run(self) -> None:
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(sig, lambda *_: self._stop.set())
+        self.procs = [self._spawn() for _ in range(self.workers)]
+        try:
+            while not self._stop.is_set():
+                multiprocessing.connection.wait([p.sentinel for p in self.procs], timeout=0.2)
+                if self._stop.is_set():
+                    break
+                self.procs = [p if p.is_alive() else self._spawn() for p in self.procs]
+        finally:
+            for p in self.procs:
+                if p.is_alive():
+                    p.terminate()  # SIGTERM: the worker drains, then exits
+            end = time.monotonic() + self.limits.get("grace_s", GRACE_S) + 1.0
+            for p in self.procs:
+                p.join(max(end - time.monotonic(), 0.0))
+                if p.is_alive():
+                    p.kill()
+                    p.join()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def serve(host: str = "127.0.0.1", port: int = 8080, workers: int = WORKERS, **limits) -> None:
+    """Blocking: one worker in this process, or a supervisor with `workers` processes."""
+    sock = bind(host, port)
+    print(f"listening on http://{host}:{sock.getsockname()[1]} ({workers} worker(s))", flush=True)
+    if workers <= 1:
+        Worker(**limits).run(sock)
+    else:
+        Supervisor(sock, workers, **limits).run()
+    sock.close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--threads", type=int, default=THREADS)
+    args = ap.parse_args()
+    serve(args.host, args.port, args.workers, threads=args.threads)
@@ -0,0 +1,274 @@
+"""
+Per-session vitals state for the Time-Series -> LLM Lambda.
+
+Responsibilities
+----------------
+1. Keep compact running aggregates per series for a client `session_id`:
+   Welford count/mean/variance, min/max, the latest reading, a
+   fixed-size ring buffer of the most recent points and, for timed
+   series, a `rollup.Pyramid` covering the whole history.
+2. Merge a request's *new* points (a delta) in O(new points), so clients
+   no longer resend their whole history with every question.
+3. Persist state through the same tiers as the response cache: an
+   in-process LRU (default), a local directory, or a DynamoDB table.
+
+Design notes
+------------
+- Timed points at or before a series' latest timestamp are treated as
+  already seen and skipped, so resending an overlapping window is safe.
+  Untimed points are always appended.
+- A series stays timed or untimed for the life of the session; mixing
+  the two is rejected with ValueError (a 400 in the handler).
+- Sessions belong to the authenticated patient: the store is keyed on
+  a hash of (patient id, session id), so the same `session_id` sent
+  under another identity is a different, empty session.
+- `get` always returns a private copy and a request `put`s it back only
+  once it has passed validation, so a request that ends in a 400
+  leaves its session as it was.  Concurrent requests to one session:
+  last writer wins, in every tier.
+- The ring holds `SESSION_MAX_POINTS` points (default 2048), which covers
+  the context budget and the 7/30-day windows of typical daily/hourly
+  vitals; the Welford totals cover the full history.
+"""
+
+from __future__ import annotations
+from array import array
+from typing import Dict, Optional, Sequence
+import copy
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+
+import cache
+import rollup
+from series import Series
+
+MAX_POINTS = int(os.getenv("SESSION_MAX_POINTS", "2048"))
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_.:\-]{1,128}$")
+
+
+def check_id(session_id) -> str:
+    if not isinstance(session_id, str) or not _SESSION_ID.match(session_id):
+        raise ValueError("Invalid 'session_id' (1-128 chars of A-Z a-z 0-9 _ . : -).")
+    return session_id
+
+
+def store_key(patient_id: str, session_id: str) -> str:
+    """Store key for one patient's session (safe as a file name)."""
+    return hashlib.sha256(f"{patient_id}\x1f{session_id}".encode()).hexdigest()
+
+# ------------------------------------------------------------------ #
+# One series
+# ------------------------------------------------------------------ #
+
+
+class SeriesState:
+    """Running aggregates plus a ring buffer of the latest `cap` points."""
+
+    __slots__ = ("cap", "timed", "n", "mean", "m2", "lo", "hi", "_vals", "_ts", "_head", "pyramid")
+
+    def __init__(self, cap: int = MAX_POINTS, timed: Optional[bool] = None) -> None:
+        self.cap = cap
+        self.timed = timed            # decided by the first non-empty delta
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.lo = math.inf
+        self.hi = -math.inf
+        self._vals = array("d")
+        self._ts = array("q")
+        self._head = 0                # index of the oldest point once full
+        self.pyramid: Optional[rollup.Pyramid] = None
+
+    def __len__(self) -> int:
+        return len(self._vals)
+
+    @property
+    def latest_ts(self) -> Optional[int]:
+        if not self.timed or not len(self._ts):
+            return None
+        return self._ts[self._head - 1]
+
+    def merge(self, delta: Series) -> int:
+        """Fold new points into the state; returns how many were new."""
+        if not len(delta):
+            return 0
+        if self.timed is None:
+            self.timed = delta.timed
+        elif self.timed != delta.timed:
+            raise ValueError("A session series cannot mix timestamped and plain points.")
+        if self.timed and self.pyramid is None:
+            # sessions stored before rollups existed: seed from the ring
+            self.pyramid = rollup.Pyramid.build(self.series()) if len(self) else rollup.Pyramid()
+        start = 0
+        last = self.latest_ts
+        if last is not None:
+            start = delta.index_at(last + 1)  # skip points already merged
+        added = 0
+        for i in range(start, len(delta)):
+            self._push(delta.values[i], delta.ts[i] if self.timed else 0)
+            added += 1
+        if self.timed:
+            self.pyramid.extend(delta)
+        return added
+
+    def _push(self, v: float, t: int) -> None:
+        self.n += 1
+        d = v - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (v - self.mean)
+        self.lo = min(self.lo, v)
+        self.hi = max(self.hi, v)
+        if len(self._vals) < self.cap:
+            self._vals.append(v)
+            self._ts.append(t)
+            self._head = len(self._vals) % self.cap
+        else:
+            self._vals[self._head] = v
+            self._ts[self._head] = t
+            self._head = (self._head + 1) % self.cap
+
+    def series(self) -> Series:
+        """The buffered points, oldest first (O(cap), independent of history)."""
+        h = self._head if len(self._vals) == self.cap else 0
+        vals = self._vals[h:] + self._vals[:h]
+        ts = self._ts[h:] + self._ts[:h] if self.timed else None
+        return Series(vals, ts, presorted=True)
+
+    def totals(self) -> Dict[str, Optional[float]]:
+        """All-history aggregates (Welford)."""
+        if not self.n:
+            return {"count": 0, "mean": None, "std": None, "min": None, "max": None}
+        std = math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+        return {"count": self.n, "mean": self.mean, "std": std, "min": self.lo, "max": self.hi}
+
+    def to_dict(self) -> Dict:
+        s = self.series()
+        return {"timed": self.timed, "n": self.n, "mean": self.mean, "m2": self.m2,
+                "min": self.lo if self.n else None, "max": self.hi if self.n else None,
+                "values": s.tolist(), "ts": list(s.ts) if s.timed else None,
+                "pyramid": self.pyramid.to_dict() if self.pyramid is not None else None}
+
+    @classmethod
+    def from_dict(cls, d: Dict, cap: int = MAX_POINTS) -> "SeriesState":
+        st = cls(cap, d.get("timed"))
+        vals, ts = d.get("values") or [], d.get("ts")
+        keep = len(vals) - min(len(vals), cap)
+        st._vals = array("d", vals[keep:])
+        st._ts = array("q", ts[keep:] if ts else [0] * (len(vals) - keep))
+        st._head = len(st._vals) % cap
+        st.n, st.mean, st.m2 = d.get("n", 0), d.get("mean", 0.0), d.get("m2", 0.0)
+        st.lo = math.inf if d.get("min") is None else d["min"]
+        st.hi = -math.inf if d.get("max") is None else d["max"]
+        if d.get("pyramid"):
+            st.pyramid = rollup.Pyramid.from_dict(d["pyramid"])
+        return st
+
+# ------------------------------------------------------------------ #
+# One session
+# ------------------------------------------------------------------ #
+
+
+class SessionState:
+    """Per-series states for one session (merges are thread-safe)."""
+
+    def __init__(self, series: Optional[Dict[str, SeriesState]] = None, cap: int = MAX_POINTS) -> None:
+        self.cap = cap
+        self.states: Dict[str, SeriesState] = series or {}
+        self._lock = threading.Lock()
+
+    def merge(self, delta: Dict[str, Sequence[float]]) -> Dict[str, int]:
+        """Fold a request's series in; returns new points per series."""
+        added = {}
+        with self._lock:
+            for name, s in delta.items():
+                if not isinstance(s, Series):
+                    s = Series(s)
+                st = self.states.get(name)
+                if st is None:
+                    st = self.states[name] = SeriesState(self.cap)
+                added[name] = st.merge(s)
+        return added
+
+    def copy(self) -> "SessionState":
+        """An independent deep copy (a request merges into this)."""
+        with self._lock:
+            return SessionState({k: copy.deepcopy(st) for k, st in self.states.items()}, self.cap)
+
+    def series(self) -> Dict[str, Series]:
+        with self._lock:
+            return {k: st.series() for k, st in self.states.items() if len(st)}
+
+    def pyramids(self) -> Dict[str, rollup.Pyramid]:
+        with self._lock:
+            return {k: st.pyramid for k, st in self.states.items() if st.pyramid is not None}
+
+    def totals(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {k: st.totals() for k, st in self.states.items() if st.n}
+
+    def dumps(self) -> str:
+        with self._lock:
+            return json.dumps({k: st.to_dict() for k, st in self.states.items()},
+                              separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, raw: str, cap: int = MAX_POINTS) -> "SessionState":
+        data = json.loads(raw)
+        return cls({k: SeriesState.from_dict(d, cap) for k, d in data.items()}, cap)
+
+# ------------------------------------------------------------------ #
+# Stores
+# ------------------------------------------------------------------ #
+
+
+class SessionStore:
+    """
+    `get(key) -> Optional[SessionState]` / `put(key, state)` over any
+    cache tier, `key` from `store_key`.  The in-process LRU holds live
+    objects and `get` copies them; file and DynamoDB tiers hold the JSON
+    form.  Either way the caller owns what `get` returns.
+    """
+
+    def __init__(self, backend, serialise: bool = True) -> None:
+        self.backend = backend
+        self.serialise = serialise
+
+    def get(self, key: str) -> Optional[SessionState]:
+        raw = self.backend.get(key)
+        if raw is None:
+            return None
+        if not self.serialise:
+            return raw.copy()
+        try:
+            return SessionState.loads(raw)
+        except (ValueError, TypeError, KeyError):
+            return None  # unreadable state: start over rather than fail
+
+    def put(self, key: str, state: SessionState) -> None:
+        self.backend.set(key, state.dumps() if self.serialise else state)
+
+
+def memory_store(maxsize: int = 1024, ttl: float = 3600.0) -> SessionStore:
+    return SessionStore(cache.LRUCache(maxsize, ttl), serialise=False)
+
+
+def from_env() -> SessionStore:
+    """
+    SESSION_TTL    (seconds; default 3600)
+    SESSION_SIZE   (sessions kept in memory; default 1024)
+    SESSION_DIR    (JSON files in a local / EFS directory)
+    SESSION_TABLE  (DynamoDB table, same layout as the response cache;
+                    wins over SESSION_DIR)
+    """
+    ttl = float(os.getenv("SESSION_TTL", "3600"))
+    if os.getenv("SESSION_TABLE"):
+        import boto3  # deferred: only needed when the tier is enabled
+        return SessionStore(cache.DynamoCache(boto3.client("dynamodb"), os.environ["SESSION_TABLE"], ttl))
+    if os.getenv("SESSION_DIR"):
+        return SessionStore(cache.FileCache(os.environ["SESSION_DIR"], ttl))
+    return memory_store(int(os.getenv("SESSION_SIZE", "1024")), ttl)
@@ -0,0 +1,96 @@
+"""
+Incremental answer extraction for Bedrock response streams.
+
+Responsibilities
+----------------
+1. Pull the text delta out of one decoded stream chunk, whatever the
+   provider's chunk shape (mirrors the fall-through used for full
+   responses in `handler`).
+2. Iterate an `invoke_model_with_response_stream` body, yielding text
+   deltas as they arrive.
+3. Frame deltas as Server-Sent Events for HTTP clients.
+
+Design notes
+------------
+- Chunks that carry no text (message_start, stop events, metrics) are
+  skipped rather than treated as errors.
+- Exception events in the stream (throttling, model errors) are raised
+  as `StreamError` so callers can emit a terminal error frame.
+"""
+
+from __future__ import annotations
+from typing import Dict, Iterable, Iterator, Optional
+import json
+
+
+class StreamError(RuntimeError):
+    """Bedrock reported an exception event mid-stream."""
+
+
+def content_text(content) -> Optional[str]:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):  # [{"type": "text", "text": ...}, ...]
+        parts = [c.get("text", "") for c in content if isinstance(c, dict)]
+        return "".join(parts) or None
+    return None
+
+
+def chunk_text(chunk: Dict) -> Optional[str]:
+    """Text delta carried by one decoded stream chunk, if any."""
+    delta = chunk.get("delta")
+    if isinstance(delta, dict) and delta.get("text"):           # Claude messages API
+        return delta["text"]
+    if chunk.get("completion"):                                   # Claude text-completion
+        return chunk["completion"]
+    if chunk.get("generation"):                                   # Meta Llama
+        return chunk["generation"]
+    text = content_text(chunk.get("content"))                    # generic "content"
+    if text:
+        return text
+    text = content_text((chunk.get("message") or {}).get("content"))
+    if text:                                                      # Meta/DeepSeek "message"
+        return text
+    choices = chunk.get("choices")
+    if choices:                                                   # OpenAI-style / DeepSeek
+        c0 = choices[0] or {}
+        return (
+            (c0.get("delta") or {}).get("content")
+            or (c0.get("message") or {}).get("content")
+            or c0.get("text")
+        )
+    nova = (chunk.get("contentBlockDelta") or {}).get("delta") or {}
+    if nova.get("text"):                                          # Amazon Nova
+        return nova["text"]
+    if chunk.get("outputText"):                                   # Titan
+        return chunk["outputText"]
+    results = chunk.get("results")
+    if results:                                                   # AI21-style
+        return (results[0] or {}).get("outputText")
+    return None
+
+
+def iter_text(events: Iterable[Dict]) -> Iterator[str]:
+    """Yield text deltas from a Bedrock `EventStream` (or any iterable of events)."""
+    for event in events:
+        part = event.get("chunk")
+        if part is None:
+            for name, detail in event.items():
+                if name.endswith("Exception"):
+                    raise StreamError(f"{name}: {(detail or {}).get('message', '')}")
+            continue
+        raw = part.get("bytes", b"")
+        try:
+            chunk = json.loads(raw)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            text = raw.decode("utf-8", errors="ignore") if isinstance(raw, bytes) else str(raw)
+        else:
+            text = chunk_text(chunk) if isinstance(chunk, dict) else None
+        if text:
+            yield text
+
+
+def sse(data: Dict, event: Optional[str] = None) -> bytes:
+    """One Server-Sent Events frame."""
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
@@ -0,0 +1,197 @@
+"""
+Timestream access for the Time-Series -> LLM Lambda.
+
+Responsibilities
+----------------
+1. Fetch every requested vital for one patient with a *single* query.
+2. Follow NextToken pagination, fetching the next page while the
+   current one is decoded.
+3. Decode rows straight into `series.Series` arrays (no per-row dicts).
+4. Cache results per patient with a short TTL; stale entries are
+   refreshed incrementally ("since the last timestamp we have").
+
+Design notes
+------------
+- The query client only needs `query(QueryString=..., NextToken=...)`,
+  so boto3's timestream-query client and test fakes are interchangeable.
+- Times are selected as epoch milliseconds to skip timestamp parsing.
+- Identifiers are validated before being spliced into SQL; Timestream
+  has no bind parameters.
+- Every query is filtered to one patient: `build_query` and
+  `SeriesCache.get` refuse a missing patient id rather than read (and
+  cache) every patient's rows as one series.
+"""
+
+from __future__ import annotations
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import re
+import threading
+import time
+
+from series import Series
+
+SERIES = ("glucose", "weight", "bp_sys", "bp_dia")
+
+_IDENT = re.compile(r"^[A-Za-z0-9_.:\-]{1,128}$")
+
+
+def _check(value: str, what: str) -> str:
+    if not isinstance(value, str) or not _IDENT.match(value):
+        raise ValueError(f"Invalid {what}: {value!r}")
+    return value
+
+
+def build_query(
+    db: str,
+    tbl: str,
+    series: Sequence[str],
+    hours: int = 168,
+    patient_id: Optional[str] = None,
+    since_ms: Optional[int] = None,
+    patient_dim: str = "patient_id",
+) -> str:
+    if not patient_id:
+        raise ValueError("A patient_id is required; queries are never run across patients.")
+    names = ", ".join(f"'{_check(s, 'series')}'" for s in series)
+    where = [f"measure_name IN ({names})"]
+    if since_ms is not None:
+        where.append(f"time > from_milliseconds({int(since_ms)})")
+    else:
+        where.append(f"time > ago({int(hours)}h)")
+    where.append(f"{_check(patient_dim, 'dimension')} = '{_check(patient_id, 'patient_id')}'")
+    return (
+        "SELECT measure_name, to_milliseconds(time) AS t, measure_value::double AS val "
+        f'FROM "{_check(db, "database")}"."{_check(tbl, "table")}" '
+        f"WHERE {' AND '.join(where)} "
+        "ORDER BY time ASC"
+    )
+
+
+def _pages(client, query: str) -> Iterator[List[Dict]]:
+    """Yield row pages, requesting page k+1 while the caller decodes page k."""
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        fut = pool.submit(client.query, QueryString=query)
+        while fut is not None:
+            page = fut.result()
+            token = page.get("NextToken")
+            fut = pool.submit(client.query, QueryString=query, NextToken=token) if token else None
+            yield page.get("Rows", [])
+
+
+def _decode(pages: Iterable[List[Dict]], series: Sequence[str]) -> Dict[str, Series]:
+    cols = {s: (array("q"), array("d")) for s in series}
+    for rows in pages:
+        for r in rows:
+            d = r["Data"]
+            col = cols.get(d[0].get("ScalarValue"))
+            val = d[2].get("ScalarValue")
+            if col is None or val is None:
+                continue
+            col[0].append(int(d[1]["ScalarValue"]) // 1000)
+            col[1].append(float(val))
+    return {s: Series(v, t) for s, (t, v) in cols.items() if len(v)}
+
+
+def fetch_latest_many(
+    client,
+    db: str,
+    tbl: str,
+    series: Sequence[str] = SERIES,
+    hours: int = 168,
+    patient_id: Optional[str] = None,
+    since_ms: Optional[int] = None,
+) -> Dict[str, Series]:
+    """All requested series in one query; series with no rows are omitted."""
+    if not series:
+        return {}
+    q = build_query(db, tbl, series, hours, patient_id, since_ms)
+    return _decode(_pages(client, q), series)
+
+# ------------------------------------------------------------------ #
+# Per-patient cache with incremental refresh
+# ------------------------------------------------------------------ #
+
+
+def _concat(old: Series, new: Series, horizon_s: int) -> Series:
+    """Append `new` after `old`, dropping points older than the horizon."""
+    vals = array("d", old.values)
+    ts = array("q", old.ts)
+    last = ts[-1] if len(ts) else None
+    for t, v in zip(new.ts, new.values):
+        if last is None or t > last:
+            ts.append(t)
+            vals.append(v)
+    out = Series(vals, ts, presorted=True)
+    if len(out):
+        out = out[out.index_at(out.ts[-1] - horizon_s):]
+    return out
+
+
+class SeriesCache:
+    """
+    Per-patient series with TTL `ttl` seconds (bounded to `maxsize`
+    patients, oldest first out).
+    Expired entries are topped up with rows newer than the latest cached
+    timestamp instead of re-reading the whole window.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[..., Dict[str, Series]],
+        ttl: float = 60.0,
+        hours: int = 168,
+        maxsize: int = 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._fetch = fetch
+        self.ttl = ttl
+        self.hours = hours
+        self.maxsize = maxsize
+        self._clock = clock
+        # patient -> (fetched_at, {series: Series}, series names covered)
+        self._data: Dict[str, Tuple[float, Dict[str, Series], set]] = {}
+        self._lock = threading.Lock()
+        self.hits = self.refreshes = self.misses = 0
+
+    def get(self, patient_id: str, series: Sequence[str] = SERIES) -> Dict[str, Series]:
+        if not patient_id:
+            raise ValueError("A patient_id is required.")
+        key = patient_id
+        now = self._clock()
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None or any(s not in entry[1] and s not in entry[2] for s in series):
+            self.misses += 1
+            data = self._fetch(series=series, hours=self.hours, patient_id=patient_id)
+            self._store(key, now, data, series)
+            return {s: data[s] for s in series if s in data}
+
+        fetched_at, data, known = entry
+        if now - fetched_at >= self.ttl:
+            self.refreshes += 1
+            # the oldest "latest" keeps every series gap-free; overlap is
+            # dropped by _concat
+            last = min((d.ts[-1] for d in data.values() if len(d)), default=None)
+            since = None if last is None else last * 1000 + 999
+            fresh = self._fetch(series=tuple(known), hours=self.hours,
+                                patient_id=patient_id, since_ms=since)
+            empty = Series([], [])
+            data = {s: _concat(data.get(s, empty), fresh.get(s, empty), self.hours * 3600)
+                    for s in known}
+            data = {s: v for s, v in data.items() if len(v)}
+            self._store(key, now, data, known)
+        else:
+            self.hits += 1
+        return {s: data[s] for s in series if s in data}
+
+    def _store(self, key, now, data, series) -> None:
+        with self._lock:
+            prev = self._data.get(key)
+            known = set(series) | (prev[2] if prev else set())
+            merged = {s: v for s, v in (prev[1].items() if prev else ()) if s not in series}
+            merged.update(data)
+            self._data[key] = (now, merged, known)
+            while len(self._data) > self.maxsize:
+                self._data.pop(next(iter(self._data)))
@@ -0,0 +1,186 @@
+"""
+Token counting for the Time-Series -> LLM Lambda.
+
+Responsibilities
+----------------
+1. Provide a pluggable, offline token counter, built once per container.
+2. Memoise counts per serialised fragment so repeated context pieces
+   (series samples, the truncation mark) are only counted once.
+
+Design notes
+------------
+- Default counter ("pretok") mimics cl100k-style pre-tokenisation:
+  digits split in runs of <= 3, letter runs, punctuation runs.  Numeric
+  JSON is mostly digits and delimiters, where the old 4-chars/token rule
+  is off by ~2x; this stays within a few percent.
+- `TOKENIZER=tiktoken:<encoding>` uses tiktoken when it is installed and
+  TIKTOKEN_CACHE_DIR points at the baked-in BPE files; otherwise we fall
+  back to "pretok" rather than download anything at runtime.
+- `TOKENIZER=chars` restores the legacy 4-chars/token estimate.
+- The memo holds only fragments up to `FRAGMENT_MEMO_CHARS` long: the
+  ones that recur are short, and a long one would pin up to 4096 whole
+  contexts' worth of text in a warm container.
+"""
+
+from __future__ import annotations
+from functools import lru_cache
+from typing import Optional
+import os
+import re
+
+import lazy
+
+AVG_CHARS_PER_TOKEN = 4.0  # legacy heuristic, still used for first guesses
+FRAGMENT_MEMO_CHARS = 1024  # longer fragments are counted, not memoised
+
+
+class TokenCounter:
+    """Interface: `count(text) -> int`."""
+
+    name = "base"
+
+    def count(self, text: str) -> int:  # pragma: no cover - interface
+        raise NotImplementedError
+
+
+class CharCounter(TokenCounter):
+    """Legacy estimate: ~4 characters per token."""
+
+    name = "chars"
+
+    def count(self, text: str) -> int:
+        return int(len(text) / AVG_CHARS_PER_TOKEN) + 1
+
+
+# Pre-token rules shared by both implementations below:
+#   digits in runs of <= 3 | letters in runs of <= 6 | punctuation
+#   (incl. "_") in runs of <= 3 | any other whitespace run = 1 token.
+# A single " " directly before a letter/punctuation run is absorbed
+# into it, as BPE vocabularies do with leading spaces.
+_PRETOK = re.compile(r"\d{1,3}| ?[^\W\d_]{1,6}| ?(?:[^\s\w]|_){1,3}|\s+")
+
+_SPACE, _DIGIT, _LETTER, _PUNCT = 0, 1, 2, 3
+
+
+def _class_lut(np):
+    lut = np.full(129, _PUNCT, dtype=np.uint8)
+    lut[:33] = _SPACE                      # control chars + " "
+    lut[ord("0"):ord("9") + 1] = _DIGIT
+    lut[ord("A"):ord("Z") + 1] = _LETTER
+    lut[ord("a"):ord("z") + 1] = _LETTER
+    lut[128] = _LETTER                     # all non-ASCII
+    return lut
+
+
+class PretokCounter(TokenCounter):
+    """
+    Dependency-free approximation of a BPE tokenizer.
+
+    With NumPy the text is classified per code point and runs are
+    counted in bulk (~50x faster than the regex on numeric JSON); the
+    regex path gives the same counts for ASCII text.
+    """
+
+    name = "pretok"
+
+    _lut = None
+
+    def count(self, text: str) -> int:
+        np = lazy.np_for(len(text), min_points=160)
+        if np is None:
+            return len(_PRETOK.findall(text))
+        if self._lut is None:
+            self._lut = _class_lut(np)
+            self._run_len = np.array([1 << 30, 3, 6, 3], dtype=np.int64)
+        if text.isascii():
+            cp = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+            cls = self._lut[cp]
+        else:
+            cp = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+            cls = self._lut[np.minimum(cp, 128)]
+        edge = np.empty(len(cls), dtype=bool)
+        edge[0] = True
+        np.not_equal(cls[1:], cls[:-1], out=edge[1:])
+        idx = np.flatnonzero(edge)
+        bounds = np.empty(len(idx) + 1, dtype=np.int64)
+        bounds[:-1], bounds[-1] = idx, len(cls)
+        lens = np.diff(bounds)
+        kind = cls[idx]
+        per = self._run_len[kind]
+        n = int(((lens + per - 1) // per).sum())
+        space = kind[:-1] == _SPACE
+        if not space.any():  # compact JSON
+            return n
+        nxt = kind[1:]
+        absorbed = (
+            space & (lens[:-1] == 1) & (cp[idx[:-1]] == 32)
+            & ((nxt == _LETTER) | (nxt == _PUNCT))
+        )
+        return n - int(np.count_nonzero(absorbed))
+
+
+class TiktokenCounter(TokenCounter):
+    """Exact counts from a locally cached tiktoken encoding."""
+
+    def __init__(self, encoding: str = "cl100k_base") -> None:
+        import tiktoken  # optional dependency
+        self.name = f"tiktoken:{encoding}"
+        self._enc = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return len(self._enc.encode(text, disallowed_special=()))
+
+
+# ------------------------------------------------------------------ #
+# Container-wide singleton
+# ------------------------------------------------------------------ #
+
+_COUNTER: Optional[TokenCounter] = None
+
+
+def _from_spec(spec: str) -> TokenCounter:
+    kind, _, arg = spec.partition(":")
+    if kind == "chars":
+        return CharCounter()
+    if kind == "tiktoken" and os.getenv("TIKTOKEN_CACHE_DIR"):
+        try:
+            return TiktokenCounter(arg or "cl100k_base")
+        except Exception:  # not installed / BPE file not cached
+            return PretokCounter()
+    return PretokCounter()
+
+
+def get_counter() -> TokenCounter:
+    """Counter configured by `TOKENIZER` (built on first use)."""
+    global _COUNTER
+    if _COUNTER is None:
+        _COUNTER = _from_spec(os.getenv("TOKENIZER", "pretok"))
+    return _COUNTER
+
+
+def set_counter(counter: Optional[TokenCounter]) -> None:
+    """Install a counter (None = rebuild from env); clears the memo."""
+    global _COUNTER
+    _COUNTER = counter
+    clear_memo()
+
+
+def clear_memo() -> None:
+    """Forget every memoised fragment count (benchmarks, counter swaps)."""
+    _count_short.cache_clear()
+
+
+def count(text: str) -> int:
+    return get_counter().count(text)
+
+
+def count_fragment(fragment: str) -> int:
+    """`count`, memoised for short fragments that recur across calls."""
+    if len(fragment) > FRAGMENT_MEMO_CHARS:
+        return get_counter().count(fragment)
+    return _count_short(fragment)
+
+
+@lru_cache(maxsize=4096)
+def _count_short(fragment: str) -> int:
+    return get_counter().count(fragment)
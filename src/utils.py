@@ -3,24 +3,43 @@ Utilities for the Time-Series -> LLM Lambda.
 
 Responsibilities
 ----------------
-1. Validate & coerce inbound timeseries payloads.
+1. Validate & coerce inbound timeseries payloads, and route a question
+   to the series it is about (`relevant_series`).
 2. Compute lightweight descriptive stats that are cheap in tokens.
-3. Generate natural-language context text (bounded length).
-4. Rough token estimation & truncation helpers.
+3. Generate natural-language context text (bounded length), or a
+   compact feature digest per series (`features`).
+4. Token counting (via `tokens`) & truncation helpers.
+5. Pack raw vitals into the context budget by shape-preserving
+   downsampling (never by cutting the JSON), as JSON or as one of the
+   compact `wire` encodings.
 
 Design notes
 ------------
-- Series represented as Python lists of numeric values (floats).
-- We *do not* assume uniform sampling; stats are purely value-based.
+- Series arrive as `series.Series` (contiguous int64 timestamps +
+  float64 values); plain lists of floats are still accepted everywhere.
+- We *do not* assume uniform sampling: timed series use calendar-day
+  windows found by binary search, untimed ones fall back to point counts.
 - All functions are defensive: empty or 1-point series won't error.
+- Windowed aggregates come from one batched engine (`window_stats`)
+  that uses NumPy prefix sums when available and falls back to the
+  `statistics` module otherwise; both paths render identical text.
 """
 
 from __future__ import annotations
 from typing import Dict, List, Sequence, Tuple, Optional
 import json
 import math
+import re
 import statistics as stats
-# import numpy as np
+from array import array
+
+import features
+import lazy
+import rollup
+import tokens
+import wire
+from downsample import downsample
+from series import DAY, Series
 
 # ------------------------------------------------------------------ #
 #  Field-name aliases accepted from client payloads
@@ -31,6 +50,35 @@ _ALIASES = {
     "diastolic": "bp_dia",
 }
 
+# ------------------------------------------------------------------ #
+#  Question -> series routing
+# ------------------------------------------------------------------ #
+# Words in a question that tie it to a series; every `_ALIASES` key is
+# added for its canonical series.  Generic blood-pressure words bring
+# both readings, "systolic" / "diastolic" just one.  A question naming
+# none of them gets every series, so general questions ("how am I
+# doing?") lose nothing.
+SERIES = ("glucose", "weight", "bp_sys", "bp_dia")
+
+_KEYWORDS = {
+    "glucose": ("glucose", "sugars?", "bg", "cgm", "a1c", "hba1c", "hypos?", "hypers?",
+                r"hypoglyc\w*", r"hyperglyc\w*", "insulin", r"diabet\w*", "mg/dl"),
+    "weight": ("weight", r"weigh\w*", "kgs?", "kilos?", "lbs?", "pounds?", "bmi",
+               "heavier", "lighter", "overweight", r"obes\w*"),
+    "bp_sys": ("blood pressure", "bp", "pressure", r"hypertens\w*", r"hypotens\w*", "mmhg"),
+    "bp_dia": ("blood pressure", "bp", "pressure", r"hypertens\w*", r"hypotens\w*", "mmhg"),
+}
+for _alias, _canon in _ALIASES.items():
+    _KEYWORDS[_canon] += (re.escape(_alias),)
+
+_ROUTES = {k: re.compile(r"(?<!\w)(?:%s)(?!\w)" % "|".join(words), re.IGNORECASE)
+           for k, words in _KEYWORDS.items()}
+
+def relevant_series(prompt: str) -> Tuple[str, ...]:
+    """Series the question mentions (canonical order), or all of them."""
+    hits = tuple(k for k in SERIES if _ROUTES[k].search(prompt or ""))
+    return hits or SERIES
+
 # ------------------------------------------------------------------ #
 # Validation / Coercion
 # ------------------------------------------------------------------ #
@@ -58,12 +106,17 @@ def coerce_series(seq: Sequence) -> List[float]:
     """Return cleaned numeric list (drops bad entries)."""
     return [v for v in (_coerce_val(x) for x in seq) if v is not None]
 
-def validate_payload(payload: Dict) -> Tuple[str, Dict[str, List[float]]]:
+MAX_INPUT_POINTS = 10_000
+
+def validate_payload(payload: Dict, session=None) -> Tuple[str, Dict[str, Series]]:
     """
     Extract the user question and normalised timeseries dict.
 
     Accepts *either* a flat structure or nested `"timeseries"` object.
     Handles client aliases via `_ALIASES` map above.
+    With a `session.SessionState`, the supplied series are a delta: they
+    are merged into the session (O(new points)) and the session's
+    buffered series are returned instead.
     """
     if not isinstance(payload, dict):
         raise ValueError("Payload must be a JSON object.")
@@ -84,23 +137,23 @@ def validate_payload(payload: Dict) -> Tuple[str, Dict[str, List[float]]]:
         raw_ts.update(nested)
 
     # ------------------------------------------------------------------
-    # 2. normalise keys & coerce values
+    # 2. normalise keys, coerce values & enforce max length
     # ------------------------------------------------------------------
-    cleaned: Dict[str, List[float]] = {}
+    cleaned: Dict[str, Series] = {}
     for key, seq in raw_ts.items():
-        if not isinstance(seq, (list, tuple)):
+        if not isinstance(seq, (list, tuple, Series)):
             continue
         canon = _ALIASES.get(key, key)
-        if canon not in ("glucose", "weight", "bp_sys", "bp_dia"):
+        if canon not in SERIES:
             continue  # silently ignore unknown series
-        cleaned[canon] = coerce_series(seq)
-
-    # 3. enforce max length
-    MAX_INPUT_POINTS = 10_000
-    for k, v in cleaned.items():
-        if len(v) > MAX_INPUT_POINTS:
-            cleaned[k] = v[-MAX_INPUT_POINTS:]
-
+        if isinstance(seq, Series):  # already coerced by ingest.parse_body
+            cleaned[canon] = seq[-MAX_INPUT_POINTS:] if len(seq) > MAX_INPUT_POINTS else seq
+        else:
+            cleaned[canon] = Series.from_raw(seq, max_points=MAX_INPUT_POINTS)
+
+    if session is not None:
+        session.merge(cleaned)
+        cleaned = session.series()
     return prompt.strip(), cleaned
 
 # ------------------------------------------------------------------ #
@@ -126,6 +179,190 @@ def _pct_change(x: Sequence[float], n: int) -> Optional[float]:
 def _latest(x: Sequence[float]) -> Optional[float]:
     return x[-1] if len(x) else None
 
+# ------------------------------------------------------------------ #
+# Windowed aggregates engine
+# ------------------------------------------------------------------ #
+# Every trailing window is described by the index it starts at, so one
+# pass over a series answers any number of windows:
+#   {"n": 30, "latest": 118.0, "unit": "pt",
+#    "windows": {7: {"count", "mean", "std", "min", "max", "delta", "pct",
+#                    "full"}}}
+# Untimed series use point windows ("pt"); timed `Series` use trailing
+# calendar-day windows ("d") located by binary search.  Windows are
+# clipped to the data; `full` says whether the whole window is covered.
+
+def _window_starts(x: Sequence[float], windows: Sequence[int]) -> Dict[int, int]:
+    if isinstance(x, Series) and x.timed:
+        return {w: x.window_start(w * DAY) for w in windows}
+    return {w: max(len(x) - w, 0) for w in windows}
+
+def _window_full(x: Sequence[float], windows: Sequence[int]) -> Dict[int, bool]:
+    if isinstance(x, Series) and x.timed:
+        # daily readings spanning w calendar days are w-1 days apart
+        return {w: x.covers((w - 1) * DAY) for w in windows}
+    return {w: len(x) >= w for w in windows}
+
+def _f64(x: Sequence[float], start: int):
+    np = lazy.numpy()
+    if isinstance(x, array):
+        return np.frombuffer(x, dtype=np.float64)[start:]  # zero-copy
+    return np.asarray(x[start:], dtype=np.float64)
+
+def _window_stats_py(
+    series: Dict[str, Sequence[float]],
+    starts: Dict[str, Dict[int, int]],
+) -> Dict[str, Dict]:
+    """Reference implementation built on the `statistics` helpers."""
+    out: Dict[str, Dict] = {}
+    for name, x in series.items():
+        if not len(x):
+            continue
+        wins = {}
+        for w, s in starts[name].items():
+            seg = x[s:]
+            first = seg[0]
+            wins[w] = {
+                "count": len(seg),
+                "mean":  _safe_mean(seg),
+                "std":   _safe_std(seg),
+                "min":   min(seg),
+                "max":   max(seg),
+                "delta": x[-1] - first,
+                "pct":   ((x[-1] - first) / abs(first)) * 100.0 if first != 0 else None,
+            }
+        out[name] = {"n": len(x), "latest": _latest(x), "windows": wins}
+    return out
+
+def _window_stats_np(
+    series: Dict[str, Sequence[float]],
+    starts: Dict[str, Dict[int, int]],
+) -> Dict[str, Dict]:
+    """
+    Batched NumPy implementation.
+
+    All series are concatenated into one flat buffer so a single pair of
+    prefix sums (values and squares) serves every window of every series;
+    each window is then two lookups instead of a fresh slice.  Values are
+    shifted by their series' latest reading first, which keeps the prefix
+    sums small and the variance free of catastrophic cancellation.
+    """
+    np = lazy.numpy()
+    names = [k for k, x in series.items() if len(x)]
+    if not names:
+        return {}
+    # only the span covered by the widest window is ever read
+    base = {k: min(starts[k].values(), default=len(series[k])) for k in names}
+    lens = np.array([len(series[k]) - base[k] for k in names], dtype=np.int64)
+    offs = np.concatenate(([0], np.cumsum(lens)))
+    flat = np.concatenate([_f64(series[k], base[k]) for k in names])
+
+    ref = flat[offs[1:] - 1]                      # latest value per series
+    d = flat - np.repeat(ref, lens)
+    cs = np.concatenate(([0.0], np.cumsum(d)))
+    cs2 = np.concatenate(([0.0], np.cumsum(d * d)))
+
+    # one (lo, hi) pair per requested window, in global buffer coordinates
+    keys: List[Tuple[int, int]] = []
+    lo_l: List[int] = []
+    hi_l: List[int] = []
+    for i, name in enumerate(names):
+        for w, s in starts[name].items():
+            keys.append((i, w))
+            lo_l.append(int(offs[i]) + s - base[name])
+            hi_l.append(int(offs[i + 1]))
+    lo = np.array(lo_l, dtype=np.int64)
+    hi = np.array(hi_l, dtype=np.int64)
+    cnt = hi - lo
+    sel = np.array([i for i, _ in keys], dtype=np.int64)
+
+    s1 = cs[hi] - cs[lo]
+    s2 = cs2[hi] - cs2[lo]
+    m = s1 / cnt
+    mean = ref[sel] + m
+    std = np.sqrt(np.maximum(s2 / cnt - m * m, 0.0))
+
+    # reduceat over interleaved (lo, hi) bounds; the sentinel keeps `hi`
+    # a valid index for the last series and odd slots are discarded.
+    bounds = np.empty(2 * len(keys), dtype=np.int64)
+    bounds[0::2], bounds[1::2] = lo, hi
+    padded = np.append(flat, 0.0)
+    wmin = np.minimum.reduceat(padded, bounds)[0::2]
+    wmax = np.maximum.reduceat(padded, bounds)[0::2]
+
+    first = flat[lo]
+    delta = flat[hi - 1] - first
+    nz = first != 0
+    pct = np.divide(delta, np.abs(first), out=np.zeros_like(delta), where=nz) * 100.0
+
+    cols = [c.tolist() for c in (cnt, mean, std, wmin, wmax, delta, pct, nz)]
+    out: Dict[str, Dict] = {
+        name: {"n": len(series[name]), "latest": float(ref[i]), "windows": {}}
+        for i, name in enumerate(names)
+    }
+    for j, (i, w) in enumerate(keys):
+        c = cols[0][j]
+        out[names[i]]["windows"][w] = {
+            "count": c,
+            "mean":  cols[1][j],
+            "std":   cols[2][j] if c > 1 else None,
+            "min":   cols[3][j],
+            "max":   cols[4][j],
+            "delta": cols[5][j],
+            "pct":   cols[6][j] if cols[7][j] else None,
+        }
+    return out
+
+def window_stats(
+    series: Dict[str, Sequence[float]],
+    windows: Sequence[int] = (7, 30),
+) -> Dict[str, Dict]:
+    """
+    Trailing-window aggregates for several series in one batched pass.
+    Empty series are omitted from the result.  Uses NumPy when it is
+    installed and the input is large enough to benefit.
+    """
+    starts = {k: _window_starts(x, windows) for k, x in series.items()}
+    values = {k: (x.values if isinstance(x, Series) else x) for k, x in series.items()}
+    # NumPy once all series combined are long enough (see lazy.np_for)
+    if lazy.np_for(sum(len(x) for x in values.values())) is not None:
+        out = _window_stats_np(values, starts)
+    else:
+        out = _window_stats_py(values, starts)
+    for k, st in out.items():
+        x = series[k]
+        st["unit"] = "d" if isinstance(x, Series) and x.timed else "pt"
+        for w, full in _window_full(x, windows).items():
+            st["windows"][w]["full"] = full
+    return out
+
+# ------------------------------------------------------------------ #
+# Text rendering
+# ------------------------------------------------------------------ #
+
+def _format_series(
+    st: Dict,
+    label: str,
+    short_window: int,
+    long_window: int,
+    units: str,
+    fmt: str,
+) -> str:
+    short, long_ = st["windows"][short_window], st["windows"][long_window]
+    unit = st["unit"]
+    d_unit = "d" if unit == "d" else ""
+
+    # Show rolling averages only when we have *enough* data.
+    parts = [f"latest {label}: {st['latest']:{fmt}}{units}"]
+    if short["full"]:
+        parts.append(f"{short_window}{unit} avg: {short['mean']:{fmt}}{units}")
+    if long_["full"]:
+        parts.append(f"{long_window}{unit} avg: {long_['mean']:{fmt}}{units}")
+        parts.append(f"Δ{long_window}{d_unit}: {long_['delta']:+{fmt}}{units}")
+        if long_["pct"] is not None:
+            parts.append(f"({long_['pct']:+.1f}%)")
+
+    return " | ".join(parts)
+
 def describe_series(
     x: Sequence[float],
     label: str,
@@ -136,32 +373,13 @@ def describe_series(
 ) -> str:
     """
     Produce a concise textual bullet for one series.
-    Windows are interpreted as "number of points" unless caller
-    has pre-aggregated to daily values; keep caller-aware.
+    Windows are calendar days for a timed `Series` and "number of
+    points" otherwise (e.g. plain lists pre-aggregated by the caller).
     """
     if not x:
         return f"No {label} data available."
-
-    # Show rolling averages only when we have *enough* points.
-    mean_short = _safe_mean(x[-short_window:]) if len(x) >= short_window else None
-    mean_long  = _safe_mean(x[-long_window:])  if len(x) >= long_window else None
-    latest     = _latest(x)
-    delta_long = _delta(x, long_window) if len(x) >= long_window else None
-    pct_long   = _pct_change(x, long_window) if len(x) >= long_window else None
-
-    parts = []
-    if latest is not None:
-        parts.append(f"latest {label}: {latest:{fmt}}{units}")
-    if mean_short is not None:
-        parts.append(f"{short_window}pt avg: {mean_short:{fmt}}{units}")
-    if mean_long is not None:
-        parts.append(f"{long_window}pt avg: {mean_long:{fmt}}{units}")
-    if delta_long is not None:
-        parts.append(f"Δ{long_window}: {delta_long:+{fmt}}{units}")
-    if pct_long is not None:
-        parts.append(f"({pct_long:+.1f}%)")
-
-    return " | ".join(parts)
+    st = window_stats({label: x}, (short_window, long_window))[label]
+    return _format_series(st, label, short_window, long_window, units, fmt)
 
 # ------------------------------------------------------------------ #
 # Domain-ish wrappers for expected vitals
@@ -172,72 +390,380 @@ def summarise_vitals(
     weight: Optional[Sequence[float]] = None,
     bp_sys: Optional[Sequence[float]] = None,
     bp_dia: Optional[Sequence[float]] = None,
+    session=None,
 ) -> str:
     """
     Build a human-readable multi-line context string for LLM.
     Only include sections that have data; order is clinically intuitive.
+    All supplied series share one `window_stats` pass.
+    With a `session.SessionState`, the arguments are a delta merged into
+    the session first; windows then come from its ring buffers and an
+    all-history average from its running totals.
     """
+    supplied = {"glucose": glucose, "weight": weight, "bp_sys": bp_sys, "bp_dia": bp_dia}
+    totals: Dict[str, Dict] = {}
+    if session is not None:
+        session.merge({k: v for k, v in supplied.items() if v is not None})
+        supplied = {k: None for k in supplied}
+        supplied.update(session.series())
+        totals = session.totals()
+    glucose, weight, bp_sys, bp_dia = (supplied[k] for k in ("glucose", "weight", "bp_sys", "bp_dia"))
+    st = window_stats({k: v for k, v in supplied.items() if v is not None})
+
     lines = []
     if glucose is not None:
-        lines.append("Glucose: " + describe_series(glucose, "glucose", units=" mg/dL"))
+        lines.append("Glucose: " + (
+            _format_series(st["glucose"], "glucose", 7, 30, " mg/dL", ".1f")
+            if "glucose" in st else "No glucose data available."
+        ) + _all_time(totals.get("glucose"), " mg/dL"))
     if weight is not None:
-        lines.append("Weight: "  + describe_series(weight,  "weight",  units=" kg"))
+        lines.append("Weight: " + (
+            _format_series(st["weight"], "weight", 7, 30, " kg", ".1f")
+            if "weight" in st else "No weight data available."
+        ) + _all_time(totals.get("weight"), " kg"))
     if bp_sys is not None and bp_dia is not None and len(bp_sys) and len(bp_dia):
-        lines.append(_summ_bp(bp_sys, bp_dia))
+        lines.append(_summ_bp(bp_sys, bp_dia, st))
     elif bp_sys is not None or bp_dia is not None:
         lines.append("Blood pressure: incomplete series supplied.")
     return "\n".join(lines) if lines else "No vitals data supplied."
 
-def _summ_bp(sys: Sequence[float], dia: Sequence[float]) -> str:
+def _all_time(tot: Optional[Dict], units: str) -> str:
+    if not tot:
+        return ""
+    return f" | all-time avg: {tot['mean']:.1f}{units} (n={tot['count']})"
+
+def _summ_bp(
+    sys: Sequence[float],
+    dia: Sequence[float],
+    st: Optional[Dict[str, Dict]] = None,
+) -> str:
     latest_sys, latest_dia = _latest(sys), _latest(dia)
     if latest_sys is None or latest_dia is None:
         return "Blood pressure: no data."
+    if st is None:
+        st = window_stats({"bp_sys": sys, "bp_dia": dia}, (7,))
     # A few simple aggregates
-    sys_m = _safe_mean(sys[-7:])
-    dia_m = _safe_mean(dia[-7:])
+    sys_m = st["bp_sys"]["windows"][7]["mean"]
+    dia_m = st["bp_dia"]["windows"][7]["mean"]
+    unit = st["bp_sys"]["unit"]
     return (
         f"Blood pressure: latest {latest_sys:.0f}/{latest_dia:.0f} mmHg | "
-        f"7pt avg: {sys_m:.0f}/{dia_m:.0f} mmHg" if sys_m and dia_m else
+        f"7{unit} avg: {sys_m:.0f}/{dia_m:.0f} mmHg" if sys_m and dia_m else
         f"Blood pressure: latest {latest_sys:.0f}/{latest_dia:.0f} mmHg"
     )
 
 # ------------------------------------------------------------------ #
 # Token estimation & truncation
 # ------------------------------------------------------------------ #
+# Counting is delegated to `tokens` (pluggable, built once per
+# container); the constant stays for callers that size char buffers.
+
+AVG_CHARS_PER_TOKEN = tokens.AVG_CHARS_PER_TOKEN
 
-AVG_CHARS_PER_TOKEN = 4.0  # crude heuristic; safe on Anthropic/GPT scale
+_TRUNC_MARK = "\n[...truncated for token budget...]"
 
 def est_tokens(text: str) -> int:
-    return int(len(text) / AVG_CHARS_PER_TOKEN) + 1
+    return tokens.count(text)
 
 def trim_text_to_tokens(text: str, max_tokens: int) -> str:
     """
-    Hard truncate text at a char boundary estimated to fit token budget.
+    Truncate text to the longest prefix that, with the truncation
+    marker, fits the token budget (binary search over the cut).
     Prefer a soft cut at newline if possible.
     """
-    max_chars = int(max_tokens * AVG_CHARS_PER_TOKEN)
-    if len(text) <= max_chars:
+    if tokens.count(text) <= max_tokens:
         return text
-    cut = text[:max_chars]
+    budget = max_tokens - tokens.count_fragment(_TRUNC_MARK)
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if tokens.count(text[:mid]) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    cut = text[:lo]
     last_nl = cut.rfind("\n")
-    if last_nl > max_chars * 0.7:  # keep most of last line if near end
+    if last_nl > lo * 0.7:  # keep most of last line if near end
         cut = cut[:last_nl]
-    return cut + "\n[...truncated for token budget...]"
+    return cut + _TRUNC_MARK
+
+# ------------------------------------------------------------------ #
+# Budget packer: fit raw series into the context window
+# ------------------------------------------------------------------ #
+# The compact JSON is assembled from one fragment per series
+# (`"glucose":[...]`); fragment counts are memoised, so re-packing the
+# same vitals - or re-probing a series during the search - is cheap.
+
+# The context is also the prompt-cache prefix (see prompts.py), so its
+# bytes must depend only on the data: series in a fixed order, every
+# value as a float (100 and 100.0 both render as 100.0).
+_SERIES_ORDER = {"glucose": 0, "weight": 1, "bp_sys": 2, "bp_dia": 3}
+
+def _values(x: Sequence[float]) -> List[float]:
+    return x.tolist() if isinstance(x, Series) else [float(v) for v in x]
+
+def _ordered(ts_dict: Dict[str, Sequence[float]]) -> Dict[str, Sequence[float]]:
+    keys = sorted(ts_dict, key=lambda k: (_SERIES_ORDER.get(k, len(_SERIES_ORDER)), k))
+    return {k: ts_dict[k] for k in keys}
+
+def _dumps(ts_dict: Dict[str, Sequence[float]], encoding: str = "json") -> str:
+    if encoding != "json":
+        return wire.encode(_ordered(ts_dict), encoding)
+    return json.dumps({k: _values(x) for k, x in _ordered(ts_dict).items()}, separators=(",", ":"))
+
+def _fragment(name: str, x: Sequence[float]) -> str:
+    return json.dumps(name) + ":" + json.dumps(_values(x), separators=(",", ":"))
+
+def _tokens_per_point(x: Sequence[float], sample: int = 48) -> float:
+    tail = _values(x[-sample:])
+    return tokens.count_fragment(json.dumps(tail, separators=(",", ":"))) / len(tail)
+
+def _tokens_per_point_all(
+    ts_dict: Dict[str, Sequence[float]],
+    lens: Dict[str, int],
+    encoding: str = "json",
+    sample: int = 48,
+) -> Dict[str, float]:
+    """Tokens per point of each non-empty series, from its latest `sample` points."""
+    if encoding == "json":
+        return {k: _tokens_per_point(ts_dict[k], sample) for k in lens}
+    return {k: tokens.count_fragment(_dumps({k: ts_dict[k][-sample:]}, encoding)) / min(n, sample)
+            for k, n in lens.items()}
+
+def _common_cap(
+    lens: Dict[str, int],
+    tpp: Dict[str, float],
+    budget: float,
+) -> int:
+    """Largest per-series point cap P with sum(min(n, P) * tpp) <= budget."""
+    lo, hi = 0, max(lens.values(), default=0)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if sum(min(n, mid) * tpp[k] for k, n in lens.items()) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _pack_encoded(
+    ts_dict: Dict[str, Sequence[float]],
+    max_tokens: int,
+    encoding: str,
+) -> Dict[str, Sequence[float]]:
+    """
+    `pack_series` for a `wire` encoding.  Series are not separate
+    fragments there (a "columns" row holds every metric), so the common
+    point cap is searched against counts of the whole rendering,
+    starting from the tokens-per-point estimate.
+    """
+    lens = {k: len(v) for k, v in ts_dict.items() if len(v)}
+    if not lens:
+        return ts_dict
+
+    def cut(cap: int) -> Dict[str, Sequence[float]]:
+        return {k: (downsample(v, cap) if k in lens else v) for k, v in ts_dict.items()}
+
+    def fits(cap: int) -> bool:
+        return est_tokens(_dumps(cut(cap), encoding)) <= max_tokens
+
+    overhead = tokens.count(_dumps({k: [] for k in ts_dict}, encoding))
+    tpp = _tokens_per_point_all(ts_dict, lens, encoding)
+    top = max(lens.values())
+    lo, hi = 0, top
+    guess = _common_cap(lens, tpp, max_tokens - overhead)
+    if fits(guess):
+        lo = guess
+        hi = min(top, 2 * guess + 8)
+        if fits(hi):
+            lo, hi = hi, (hi if hi == top else top)
+    else:
+        hi = guess - 1
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if fits(mid):
+            lo = mid
+        else:
+            hi = mid - 1
+    return cut(lo)
+
+def pack_series(
+    ts_dict: Dict[str, Sequence[float]],
+    max_tokens: int,
+    encoding: str = "json",
+) -> Dict[str, Sequence[float]]:
+    """
+    Downsample every series (LTTB + exact latest readings, see
+    `downsample`) so the compact JSON of `ts_dict` fills `max_tokens`
+    as fully as possible without exceeding it.
+
+    1. estimate tokens/point per series and binary-search a common point
+       cap (short series keep everything, long ones share the rest);
+    2. binary-search the points of the largest truncated series against
+       exact fragment counts to absorb the estimation error.
+
+    With a `wire` encoding the same budget applies to that rendering
+    instead (see `_pack_encoded`).
+    """
+    if encoding != "json":
+        return _pack_encoded(ts_dict, max_tokens, encoding)
+    names = list(ts_dict)
+    lens = {k: len(v) for k, v in ts_dict.items() if len(v)}
+    overhead = tokens.count(_dumps({k: [] for k in names}))
+    budget = max_tokens - overhead
+    if budget <= 0:
+        return {k: v[:0] for k, v in ts_dict.items()}
+
+    tpp = {k: _tokens_per_point(ts_dict[k]) for k in lens}
+    cap = _common_cap(lens, tpp, budget)
+    points = {k: min(n, cap) for k, n in lens.items()}
+    frags = {k: _fragment(k, downsample(ts_dict[k], points[k])) for k in lens}
+    empty = {k: tokens.count_fragment(_fragment(k, [])) for k in lens}
+
+    def total() -> int:
+        return sum(tokens.count_fragment(frags[k]) - empty[k] for k in lens)
+
+    # refine the largest truncated series; fall through to the next one
+    # if even zero points of it cannot absorb an overshoot
+    for k in sorted((k for k in lens if points[k] < lens[k]), key=points.get, reverse=True):
+        used = total()
+        slack = budget - used
+        if slack < 0:
+            lo, hi = 0, points[k]
+        else:
+            lo = points[k]
+            hi = min(lens[k], points[k] + int(slack / tpp[k]) + 2)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            frags[k] = _fragment(k, downsample(ts_dict[k], mid))
+            if total() <= budget:
+                lo = mid
+            else:
+                hi = mid - 1
+        points[k] = lo
+        frags[k] = _fragment(k, downsample(ts_dict[k], lo))
+        if total() <= budget and slack >= 0:
+            break
+
+    out = {k: (downsample(v, points[k]) if k in lens else v) for k, v in ts_dict.items()}
+    # fragment counts are additive only up to delimiter merges; verify
+    while est_tokens(_dumps(out)) > max_tokens and any(points.values()):
+        k = max(points, key=points.get)
+        points[k] -= 1
+        out[k] = downsample(ts_dict[k], points[k])
+    return out
 
 # ------------------------------------------------------------------ #
 # High-level helper used in handler
 # ------------------------------------------------------------------ #
 
+# "raw": downsampled vitals arrays (default); "features": per-series
+# digests from `features` (means, slope, change points, outliers, TIR);
+# "rollup": bucketed rows at the resolution the question's horizon needs.
+CONTEXT_MODES = ("raw", "features", "rollup")
+
+# How "raw" vitals are written: full-precision JSON arrays (default) or
+# one of the rounded, more compact `wire` encodings.
+CONTEXT_ENCODINGS = ("json",) + wire.ENCODINGS
+
+# digest parts dropped, in order, if a digest overruns the budget
+_DIGEST_OPTIONAL = ("daily", "outliers", "changes")
+
+def _dumps_digest(ts_dict: Dict[str, Sequence[float]], max_tokens: int) -> str:
+    dig = features.digest_all(ts_dict)
+    keys = sorted(dig, key=lambda k: (_SERIES_ORDER.get(k, len(_SERIES_ORDER)), k))
+    ctx = json.dumps({k: dig[k] for k in keys}, separators=(",", ":"))
+    for part in _DIGEST_OPTIONAL:
+        if est_tokens(ctx) <= max_tokens:
+            break
+        for d in dig.values():
+            d.pop(part, None)
+        ctx = json.dumps({k: dig[k] for k in keys}, separators=(",", ":"))
+    return ctx
+
+def _dumps_rollup(
+    prompt: str,
+    ts_dict: Dict[str, Sequence[float]],
+    max_tokens: int,
+    pyramids: Optional[Dict[str, "rollup.Pyramid"]] = None,
+) -> Optional[str]:
+    """
+    Rows at the coarsest rollup level that resolves the prompt's horizon,
+    coarsened 2x at a time until they fit `max_tokens`.  None when the
+    raw context applies instead: no horizon found, a horizon too short
+    for hourly buckets, or a non-empty series without timestamps.
+    """
+    h = rollup.horizon(prompt)
+    series = {k: v for k, v in ts_dict.items() if len(v)}
+    if h is None or not series or not all(isinstance(v, Series) and v.timed for v in series.values()):
+        return None
+    level = rollup.level_for(h)
+    if level == "raw":
+        return None
+    width, offset, _ = rollup.LEVELS[level]
+    pyramids = pyramids or {}
+    keys = sorted(series, key=lambda k: (_SERIES_ORDER.get(k, len(_SERIES_ORDER)), k))
+    picked = {}
+    for k in keys:
+        pyr = pyramids.get(k) or rollup.pyramid_for(series[k])
+        since = None if math.isinf(h) else pyr.last_ts - h
+        picked[k] = pyr.levels[level].buckets(since)
+
+    def render() -> str:
+        return json.dumps({k: {"res": rollup.res_label(width), "rows": rollup.rows(picked[k], width)}
+                           for k in keys}, separators=(",", ":"))
+
+    ctx = render()
+    while est_tokens(ctx) > max_tokens:
+        if max(len(b) for b in picked.values()) <= 2:
+            # even the coarsest view overflows: keep only the latest rows
+            for k in keys:
+                picked[k] = picked[k][-1:]
+            ctx = render()
+            break
+        width *= 2
+        picked = {k: rollup.coarsen(b, width, offset) for k, b in picked.items()}
+        ctx = render()
+    return ctx
+
 def build_context_from_payload(
     _prompt: str,
-    ts_dict: Dict[str, List[float]],
+    ts_dict: Dict[str, Sequence[float]],
     max_context_tokens: int = 700,
+    mode: str = "raw",
+    pyramids: Optional[Dict[str, "rollup.Pyramid"]] = None,
+    encoding: str = "json",
 ) -> str:
     """
     Return **raw vitals JSON** (not pre-aggregated). The LLM is now
     responsible for any descriptive statistics.
+
+    Oversized input is downsampled per series rather than cut mid-string,
+    so the result is always valid JSON and ends with the latest readings.
+    With `mode="features"` the JSON holds one `features.digest` per
+    series instead; its size does not depend on the series length.
+    With `mode="rollup"` a question naming a time horizon ("this year",
+    "this morning") gets rollup rows from `pyramids` (built and memoised
+    on demand) at a matching resolution; otherwise the raw JSON.
+    In raw mode, `encoding` picks the rendering (see CONTEXT_ENCODINGS
+    and `wire`); the features and rollup modes always send JSON.
     """
-    ctx = json.dumps(ts_dict, separators=(",", ":"))  # compact JSON
-    if est_tokens(ctx) > max_context_tokens:
-        ctx = trim_text_to_tokens(ctx, max_context_tokens)
-    return ctx
+    if mode == "features":
+        return _dumps_digest(ts_dict, max_context_tokens)
+    if mode == "rollup":
+        ctx = _dumps_rollup(_prompt, ts_dict, max_context_tokens, pyramids)
+        if ctx is not None:
+            return ctx
+        mode, encoding = "raw", "json"  # the rollup prompt describes JSON arrays
+    if mode != "raw":
+        raise ValueError(f"Unknown context mode {mode!r}; expected one of {CONTEXT_MODES}.")
+    if encoding not in CONTEXT_ENCODINGS:
+        raise ValueError(f"Unknown context encoding {encoding!r}; expected one of {CONTEXT_ENCODINGS}.")
+    lens = {k: len(v) for k, v in ts_dict.items() if len(v)}
+    # skip serialising the full payload when it clearly cannot fit
+    tpp = _tokens_per_point_all(ts_dict, lens, encoding)
+    approx = sum(n * tpp[k] for k, n in lens.items())
+    if approx < 2 * max_context_tokens:
+        ctx = _dumps(ts_dict, encoding)  # compact JSON or wire encoding
+        if est_tokens(ctx) <= max_context_tokens:
+            return ctx
+    return _dumps(pack_series(ts_dict, max_context_tokens, encoding), encoding)
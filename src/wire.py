@@ -0,0 +1,267 @@
+"""
+Compact wire encodings of the vitals context for the Time-Series -> LLM Lambda.
+
+Responsibilities
+----------------
+1. Round every series to a per-metric precision (`PRECISION`: glucose
+   and blood pressure to whole numbers, weight to 0.1) instead of
+   sending full float reprs such as `181.10000000000002`.
+2. Render the rounded series in one of `ENCODINGS`:
+   - "fixed":   the usual JSON arrays, rounded;
+   - "delta":   per series a string of the first reading and the signed
+                changes after it, a repeated change written once with
+                its count ("100,+10,-5,+0*3");
+   - "columns": one CSV-like table aligned on timestamps
+                ("t,glucose,weight,..."), t in minutes after a stated
+                start time; untimed series are aligned on their latest
+                reading.  It carries the timestamps the JSON forms
+                drop, for about a quarter more tokens per point than
+                plain JSON.
+3. Decode each encoding back to the rounded values (and timestamps for
+   "columns"), so tests can prove the round trip is exact.
+4. Give the model a one-paragraph description of each format
+   (`FORMAT_NOTES`), appended to the system prompt.
+
+Design notes
+------------
+- Values are rounded to integers in units of 10**-precision first, so
+  deltas add up exactly and the decoded values equal the rounded ones.
+- Output depends only on the data (series order is the caller's, see
+  `utils`), so an encoded context is still a stable prompt-cache prefix.
+- `utils.pack_series` fits an encoding into `max_context_tokens` by
+  downsampling, as it does for the JSON context.
+- Above `lazy.NP_MIN_POINTS` values the rounding uses NumPy when it is
+  installed; both paths round half to even and give identical text.
+- `python benchmarks/bench_wire.py` reports tokens per 1k points for
+  every encoding.
+"""
+
+from __future__ import annotations
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import json
+import re
+
+import lazy
+from series import Series, parse_timestamp
+
+ENCODINGS = ("fixed", "delta", "columns")
+
+# Decimal places per metric; anything else keeps two.
+PRECISION = {"glucose": 0, "weight": 1, "bp_sys": 0, "bp_dia": 0}
+DEFAULT_PRECISION = 2
+
+# Appended to the system prompt when the raw vitals use an encoding.
+FORMAT_NOTES = {
+    "fixed": (
+        "Readings are rounded: glucose and blood pressure to whole "
+        "numbers, weight to 0.1."
+    ),
+    "delta": (
+        "Each metric maps to a string instead of an array: the first "
+        "reading, then the change from the previous reading to each next "
+        "one. '*n' repeats a change n times, so '100,+10,-5,+0*3' means "
+        "100, 110, 105, 105, 105, 105. Glucose and blood pressure are "
+        "whole numbers, weight is rounded to 0.1."
+    ),
+    "columns": (
+        "The vitals are a CSV table instead of JSON, oldest rows first. "
+        "The first line gives the start time t0 (UTC) and the unit of the "
+        "t column, the second names the columns, and each row holds the "
+        "readings taken at time t0 + t. A blank cell means no reading. "
+        "Glucose and blood pressure are whole numbers, weight is rounded "
+        "to 0.1."
+    ),
+}
+
+# ------------------------------------------------------------------ #
+# Rounding
+# ------------------------------------------------------------------ #
+
+
+def precision(name: str) -> int:
+    return PRECISION.get(name, DEFAULT_PRECISION)
+
+
+def _scaled(x: Sequence[float], p: int) -> List[int]:
+    """Values as integers in units of 10**-p (round half to even)."""
+    vals = x.values if isinstance(x, Series) else x
+    scale = 10 ** p
+    np = lazy.np_for(len(vals))
+    if np is not None:
+        return np.rint(np.asarray(vals, dtype=np.float64) * scale).astype(np.int64).tolist()
+    return [round(v * scale) for v in vals]
+
+
+def rounded(x: Sequence[float], name: str) -> List[float]:
+    """The values an encoding carries for series `name`."""
+    p = precision(name)
+    return [q / 10 ** p for q in _scaled(x, p)]
+
+
+def _fmt(q: int, p: int) -> str:
+    if not p:
+        return str(q)
+    a = abs(q)
+    return f"{'-' if q < 0 else ''}{a // 10 ** p}.{a % 10 ** p:0{p}d}"
+
+
+def _parse(text: str, p: int) -> int:
+    return round(float(text) * 10 ** p)
+
+# ------------------------------------------------------------------ #
+# "fixed": rounded JSON arrays
+# ------------------------------------------------------------------ #
+
+
+def _encode_fixed(ts_dict: Dict[str, Sequence[float]]) -> str:
+    parts = []
+    for k, x in ts_dict.items():
+        p = precision(k)
+        qs = _scaled(x, p)
+        vals = map(str, qs) if not p else (_fmt(q, p) for q in qs)
+        parts.append(f"{json.dumps(k)}:[{','.join(vals)}]")
+    return "{" + ",".join(parts) + "}"
+
+
+def _decode_fixed(text: str) -> Dict[str, List[float]]:
+    return {k: [float(v) for v in vals] for k, vals in json.loads(text).items()}
+
+# ------------------------------------------------------------------ #
+# "delta": first reading, then run-length coded changes
+# ------------------------------------------------------------------ #
+
+
+def _delta_string(qs: List[int], p: int) -> str:
+    if not qs:
+        return ""
+    out = [_fmt(qs[0], p)]
+    i, n = 1, len(qs)
+    while i < n:
+        d = qs[i] - qs[i - 1]
+        j = i + 1
+        while j < n and qs[j] - qs[j - 1] == d:
+            j += 1
+        step = ("+" if d >= 0 else "") + _fmt(d, p)
+        out.append(step if j - i == 1 else f"{step}*{j - i}")
+        i = j
+    return ",".join(out)
+
+
+def _encode_delta(ts_dict: Dict[str, Sequence[float]]) -> str:
+    return json.dumps({k: _delta_string(_scaled(x, precision(k)), precision(k))
+                       for k, x in ts_dict.items()}, separators=(",", ":"))
+
+
+def _decode_delta(text: str) -> Dict[str, List[float]]:
+    out = {}
+    for k, s in json.loads(text).items():
+        p = precision(k)
+        qs: List[int] = []
+        for tok in filter(None, s.split(",")):
+            if not qs:
+                qs.append(_parse(tok, p))
+                continue
+            step, _, count = tok.partition("*")
+            d = _parse(step, p)
+            for _ in range(int(count or 1)):
+                qs.append(qs[-1] + d)
+        out[k] = [q / 10 ** p for q in qs]
+    return out
+
+# ------------------------------------------------------------------ #
+# "columns": one table aligned on timestamps
+# ------------------------------------------------------------------ #
+
+_T0 = re.compile(r"t0=(\S+);")
+
+
+def _iso(ts: int) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _encode_columns(ts_dict: Dict[str, Sequence[float]]) -> str:
+    names = list(ts_dict)
+    cells = [[_fmt(q, precision(k)) for q in _scaled(ts_dict[k], precision(k))] for k in names]
+    present = [x for x in ts_dict.values() if len(x)]
+    timed = bool(present) and all(isinstance(x, Series) and x.timed for x in present)
+    lines: List[str] = []
+    if timed:
+        t0 = min(x.ts[0] for x in present)
+        # a row per (timestamp, n-th reading at it), so repeats keep their order
+        rows: Dict[Tuple[int, int], List[str]] = {}
+        for j, k in enumerate(names):
+            x, seen = ts_dict[k], {}
+            for t, c in zip(x.ts if len(x) else (), cells[j]):
+                n = seen[t] = seen.get(t, -1) + 1
+                rows.setdefault((t, n), [""] * len(names))[j] = c
+        unit = 60 if all((t - t0) % 60 == 0 for t, _ in rows) else 1
+        lines.append(f"# t0={_iso(t0)}; t = {'minutes' if unit == 60 else 'seconds'} after t0; "
+                     f"blank = no reading")
+        lines.append(",".join(["t"] + names))
+        for (t, _), row in sorted(rows.items()):
+            lines.append(f"{(t - t0) // unit},{','.join(row)}".rstrip(","))
+    else:
+        n = max((len(c) for c in cells), default=0)
+        lines.append("# rows oldest first, latest readings aligned on the last row; blank = no reading")
+        lines.append(",".join(names))
+        pad = [n - len(c) for c in cells]
+        for r in range(n):
+            lines.append(",".join(c[r - s] if r >= s else "" for c, s in zip(cells, pad)).rstrip(","))
+    return "\n".join(lines)
+
+
+def _decode_columns(text: str) -> Dict[str, Union[Series, List[float]]]:
+    meta, header, *rows = text.split("\n")
+    names = header.split(",")
+    m = _T0.search(meta)
+    timed = m is not None
+    if timed:
+        t0 = parse_timestamp(m.group(1).replace("Z", "+00:00"))
+        unit = 60 if "minutes" in meta else 1
+        names = names[1:]
+    vals: List[List[float]] = [[] for _ in names]
+    stamps: List[List[int]] = [[] for _ in names]
+    for line in rows:
+        row = line.split(",")
+        t = None
+        if timed:
+            t, row = t0 + int(row[0]) * unit, row[1:]
+        for j, c in enumerate(row):
+            if c:
+                p = precision(names[j])
+                vals[j].append(_parse(c, p) / 10 ** p)
+                stamps[j].append(t)
+    if timed:
+        return {k: Series(v, s, presorted=True) if v else [] for k, v, s in zip(names, vals, stamps)}
+    return dict(zip(names, vals))
+
+# ------------------------------------------------------------------ #
+# Public entry points
+# ------------------------------------------------------------------ #
+
+_ENCODERS = {"fixed": _encode_fixed, "delta": _encode_delta, "columns": _encode_columns}
+_DECODERS = {"fixed": _decode_fixed, "delta": _decode_delta, "columns": _decode_columns}
+
+
+def encode(ts_dict: Dict[str, Sequence[float]], encoding: str) -> str:
+    """Render `ts_dict` (in its key order) as `encoding`."""
+    try:
+        enc = _ENCODERS[encoding]
+    except KeyError:
+        raise ValueError(f"Unknown context encoding {encoding!r}; expected one of {ENCODINGS}.") from None
+    return enc(ts_dict)
+
+
+def decode(text: str, encoding: str) -> Dict[str, Union[Series, List[float]]]:
+    """
+    Inverse of `encode` up to rounding: lists of the rounded values, or
+    for timed "columns" tables `Series` with their timestamps.
+    """
+    return _DECODERS[encoding](text)
+
+
+def format_note(encoding: Optional[str]) -> str:
+    """System-prompt suffix for `encoding` ("" for plain JSON)."""
+    note = FORMAT_NOTES.get(encoding or "")
+    return "\n\nFormat: " + note if note else ""
@@ -0,0 +1,12 @@
+import os, sys
+from pathlib import Path
+
+# The Lambda bundle imports its siblings flat (`import utils`), so mirror
+# that layout here and make `from src import handler` resolve as well.
+ROOT = Path(__file__).resolve().parents[1]
+for p in (ROOT, ROOT / "src"):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("MODEL_ID", "test-model")
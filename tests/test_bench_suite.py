@@ -0,0 +1,35 @@
+import copy
+
+from benchmarks import suite
+
+
+def test_suite_runs_every_stage_and_restores_handler():
+    cache_before = suite.handler.RESPONSE_CACHE
+    res = suite.run(sizes=(10,), shapes=suite.SHAPES, repeat=1, min_time=0.001)
+    assert suite.handler.RESPONSE_CACHE is cache_before
+    assert "bedrock" not in suite.handler.__dict__
+    stages = {k.split("/")[0] for k in res["results"]}
+    assert {"coerce_series", "validate_payload", "summarise_vitals", "build_context",
+            "trim_text_to_tokens", "handler"} <= stages
+    assert len(res["results"]) == len(stages) * len(suite.SHAPES)
+    assert all(r["us"] > 0 and r["peak_bytes"] >= 0 for r in res["results"].values())
+
+
+def test_compare_flags_slowdowns_and_allocation_growth():
+    base = {"meta": {"calibration_us": 100.0}, "results": {
+        "a/flat/10": {"us": 1000.0, "rel": 10.0, "peak_bytes": 100_000, "blocks": 0},
+        "b/flat/10": {"us": 5.0, "rel": 0.05, "peak_bytes": 100, "blocks": 0},
+    }}
+    assert suite.compare(base, base) == []
+    # a machine twice as slow is not a regression
+    slow = copy.deepcopy(base)
+    slow["meta"]["calibration_us"] = 200.0
+    slow["results"]["a/flat/10"]["us"] = 2000.0
+    assert suite.compare(slow, base) == []
+    worse = copy.deepcopy(base)
+    worse["results"]["a/flat/10"].update(us=2500.0, peak_bytes=300_000)
+    worse["results"]["b/flat/10"].update(us=20.0)        # under the absolute floor
+    assert [line.split(":")[1].split()[0] for line in suite.compare(worse, base)] == ["time", "peak"]
+    # each entry is scaled by the calibration measured around its own group
+    worse["results"]["a/flat/10"]["calib_us"] = 250.0
+    assert [line.split(":")[1].split()[0] for line in suite.compare(worse, base)] == ["peak"]
@@ -0,0 +1,101 @@
+import io
+import json
+import random
+import time
+
+import pytest
+
+import bulk
+import handler
+import streaming
+
+RECORDS = [
+    {"id": "a", "prompt": "How is my glucose 0?", "glucose": [100, 110]},
+    {"prompt": "How is my glucose 1?", "timeseries": {"glucose": [{"timestamp": "2025-07-22T08:00:00Z",
+                                                                   "value": 112}]}},
+    "not json",
+    {"glucose": [1, 2]},                                   # no prompt
+    {"body": json.dumps({"id": 7, "prompt": "How is my glucose 4?", "glucose": [90]})},
+    {"prompt": "How is my glucose 5?", "weight": [80.0, 80.5]},
+    {"prompt": "How is my glucose 6?", "glucose": [95, 96, 97]},
+]
+
+
+class _Crash(BaseException):
+    pass
+
+
+def _corpus(tmp_path, records=RECORDS):
+    src = tmp_path / "requests.jsonl"
+    lines = [r if isinstance(r, str) else json.dumps(r) for r in records]
+    src.write_text("\n".join(lines[:3]) + "\n\n" + "\n".join(lines[3:]) + "\n", encoding="utf-8")
+    return src
+
+
+def _fake_bedrock(monkeypatch, crash_after=None):
+    calls = []
+
+    def invoke_model(modelId, body):
+        calls.append(modelId)
+        if crash_after is not None and len(calls) > crash_after:
+            raise _Crash()
+        time.sleep(random.uniform(0, 0.02))            # finish out of order
+        content = json.loads(body)["messages"][-1]["content"]
+        question = content if isinstance(content, str) else streaming.content_text(content)
+        return {"body": io.BytesIO(json.dumps({"content": "re: " + question}).encode())}
+
+    monkeypatch.setattr(handler, "RESPONSE_CACHE", handler.cache.TieredCache(handler.cache.LRUCache(0)))
+    monkeypatch.setattr(handler.bedrock, "invoke_model", invoke_model)
+    return calls
+
+
+def _read(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_results_stream_out_in_input_order(tmp_path, monkeypatch):
+    _fake_bedrock(monkeypatch)
+    src, dst = _corpus(tmp_path), tmp_path / "answers.jsonl"
+    summary = bulk.run(str(src), str(dst), processes=0, concurrency=4, chunk=2)
+    rows = _read(dst)
+    assert [r["line"] for r in rows] == [1, 2, 3, 5, 6, 7, 8]   # line 4 is blank
+    assert summary["records"] == 7 and summary["errors"] == 2
+    assert rows[0] == {"line": 1, "id": "a", "answer": "re: How is my glucose 0?", "cache": "MISS"}
+    assert rows[2]["status"] == 400 and rows[3]["status"] == 400
+    assert rows[4]["id"] == 7 and rows[4]["answer"] == "re: How is my glucose 4?"   # an event line
+    assert rows[6]["answer"] == "re: How is my glucose 6?"
+    assert json.loads((tmp_path / "answers.jsonl.ckpt").read_text())["done"] is True
+
+
+def test_resume_neither_loses_nor_repeats_lines(tmp_path, monkeypatch):
+    records = [{"prompt": f"How is my glucose {i}?", "glucose": [100 + i]} for i in range(20)]
+    src = _corpus(tmp_path, records)
+    clean = tmp_path / "clean.jsonl"
+    _fake_bedrock(monkeypatch)
+    bulk.run(str(src), str(clean), processes=0, concurrency=3, chunk=4)
+
+    dst = tmp_path / "answers.jsonl"
+    _fake_bedrock(monkeypatch, crash_after=9)
+    with pytest.raises(_Crash):
+        bulk.run(str(src), str(dst), processes=0, concurrency=3, chunk=4, checkpoint_every=3)
+    saved = json.loads((tmp_path / "answers.jsonl.ckpt").read_text())
+    assert 0 < saved["records"] < 20 and saved["outputs"][str(dst)] == dst.stat().st_size
+    with open(dst, "ab") as f:
+        f.write(b'{"line": 99, "answer": "torn wr')           # a crash mid-write
+
+    calls = _fake_bedrock(monkeypatch)
+    summary = bulk.run(str(src), str(dst), processes=0, concurrency=3, chunk=4, resume=True)
+    assert dst.read_bytes() == clean.read_bytes()
+    assert len(calls) == 20 - saved["records"] == summary["records"]
+    assert summary["resumed_after_line"] == saved["line"]
+
+
+def test_worker_processes_write_bedrock_batch_input(tmp_path, monkeypatch):
+    calls = _fake_bedrock(monkeypatch)
+    src, dst = _corpus(tmp_path), tmp_path / "batch-input.jsonl"
+    summary = bulk.run(str(src), str(dst), processes=2, chunk=2, bedrock_batch=True)
+    rows = _read(dst)
+    assert [r["recordId"] for r in rows] == ["a", "00000000002", "7", "00000000007", "00000000008"]
+    assert rows[0]["modelInput"]["messages"][-1]["content"]
+    assert [r["line"] for r in _read(tmp_path / "batch-input.jsonl.errors.jsonl")] == [3, 5]
+    assert summary["ok"] == 5 and summary["errors"] == 2 and not calls
@@ -0,0 +1,63 @@
+import cache
+
+
+class _Clock:
+    def __init__(self):
+        self.t = 0.0
+    def __call__(self):
+        return self.t
+
+
+def test_lru_evicts_and_expires():
+    clock = _Clock()
+    c = cache.LRUCache(maxsize=2, ttl=10, clock=clock)
+    c.set("a", "1"); c.set("b", "2")
+    assert c.get("a") == "1"          # a becomes most recent
+    c.set("c", "3")                   # evicts b
+    assert c.get("b") is None and c.get("c") == "3"
+    clock.t = 11
+    assert c.get("a") is None
+    assert c.stats() == {"size": 1, "hits": 2, "misses": 2, "evictions": 1}
+
+
+def test_key_normalises_prompt_and_hashes_context():
+    k = cache.make_key("m", "v1", "How is my  Glucose?", "{}")
+    assert k == cache.make_key("m", "v1", "how is my glucose", "{}")
+    assert k != cache.make_key("m", "v1", "how is my glucose", '{"glucose":[1.0]}')
+    assert k != cache.make_key("m", "v2", "how is my glucose", "{}")
+    assert k != cache.make_key("m", "v1", "how is my glucose", "{}", "off\x1fAnswer in French.")
+
+
+def test_file_tier_survives_new_process(tmp_path):
+    first = cache.TieredCache(cache.LRUCache(), cache.FileCache(str(tmp_path)))
+    first.set("k", "answer")
+    fresh = cache.TieredCache(cache.LRUCache(), cache.FileCache(str(tmp_path)))
+    assert fresh.get("k") == "answer"
+    assert fresh.l2_hits == 1 and fresh.l1.get("k") == "answer"  # promoted
+
+    expired = cache.FileCache(str(tmp_path), ttl=-1)
+    expired.set("old", "answer")
+    assert expired.get("old") is None and not (tmp_path / "old.json").exists()
+
+
+def test_dynamo_tier_and_error_isolation():
+    class FakeDynamo:
+        def __init__(self):
+            self.items = {}
+        def get_item(self, TableName, Key):
+            item = self.items.get(Key["pk"]["S"])
+            return {"Item": item} if item else {}
+        def put_item(self, TableName, Item):
+            self.items[Item["pk"]["S"]] = Item
+
+    tier = cache.TieredCache(cache.LRUCache(maxsize=0), cache.DynamoCache(FakeDynamo(), "t"))
+    tier.set("k", "v")
+    assert tier.get("k") == "v"
+
+    class Broken:
+        def get(self, key): raise RuntimeError("down")
+        def set(self, key, value): raise RuntimeError("down")
+
+    tier = cache.TieredCache(cache.LRUCache(), Broken())
+    tier.set("k", "v")
+    assert tier.get("other") is None and tier.l2_errors == 2
@@ -0,0 +1,104 @@
+import io
+import json
+import time
+
+import pytest
+
+import cascade
+import metrics
+from src import handler
+
+FAST, LARGE = "fast-model", handler.MODEL_ID
+VITALS = {"glucose": [100 + i % 7 for i in range(40)], "bp_sys": [120] * 40, "bp_dia": [80] * 40}
+
+
+class FakeBedrock:
+    """invoke_model with a per-model delay; the fast model escalates on cue."""
+
+    def __init__(self, delay=None, escalate_on="trend"):
+        self.delay = delay or {FAST: 0.0, LARGE: 0.0}
+        self.escalate_on = escalate_on
+        self.calls = []
+
+    def invoke_model(self, modelId, body):
+        self.calls.append(modelId)
+        time.sleep(self.delay[modelId])
+        question = json.loads(body)["messages"][-1]["content"]
+        text = cascade.ESCALATE if modelId == FAST and self.escalate_on in question else f"{modelId} says hi"
+        return {"body": io.BytesIO(json.dumps({"content": text}).encode())}
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fb = FakeBedrock()
+    monkeypatch.setattr(cascade, "ENABLED", True)
+    monkeypatch.setattr(cascade, "FAST_MODEL_ID", FAST)
+    monkeypatch.setattr(handler, "RESPONSE_CACHE", handler.cache.TieredCache(handler.cache.LRUCache(0)))
+    monkeypatch.setattr(handler.bedrock, "invoke_model", fb.invoke_model)
+    return fb
+
+
+def _ask(question, vitals=VITALS):
+    resp = handler.handler({"body": json.dumps({"prompt": question, **vitals})}, None)
+    assert resp["statusCode"] == 200
+    return json.loads(resp["body"])["answer"]
+
+
+@pytest.mark.parametrize("question, tier, reason", [
+    ("What's my latest BP?", "stats", "lookup"),
+    ("what is my average glucose", "stats", "lookup"),
+    ("What was my average glucose this year?", "fast", "routine"),  # beyond the 30-day summary
+    ("What's my latest weight?", "fast", "routine"),                 # no weight data
+    ("Is my latest reading normal?", "large", "complex:normal"),
+    ("Why is my glucose higher at night?", "large", "complex:why"),
+    ("How has my glucose looked?", "fast", "routine"),
+    ("tell me " + "more " * 40, "large", "long"),
+])
+def test_plan_tiers(question, tier, reason):
+    ts = {k: VITALS.get(k, []) for k in handler.utils.relevant_series(question)}
+    plan = cascade.plan(question, ts, LARGE, enabled=True, fast_model=FAST)
+    assert (plan.tier, plan.reason) == (tier, reason)
+    assert (plan.answer is not None) == (tier == "stats")
+    assert cascade.plan(question, ts, LARGE, enabled=False).tier == "large"
+
+
+def test_rejection_signals():
+    for text in ("ESCALATE", "  ESCALATE.", "", "I don't know based on this data.",
+                 "Not enough data to say.", None):
+        assert cascade.rejected(text)
+    assert not cascade.rejected("Your glucose averaged 103 mg/dL; I cannot see any lows.")
+
+
+def test_handler_routes_escalates_and_logs(fake):
+    records = []
+    prev = metrics.set_sinks([records.append])
+    try:
+        assert _ask("What's my latest BP?").startswith("Blood pressure:")
+        assert _ask("How has my glucose looked?") == f"{FAST} says hi"
+        assert _ask("How has my glucose trend looked?") == f"{LARGE} says hi"
+        assert _ask("Why is my glucose up?") == f"{LARGE} says hi"
+    finally:
+        metrics.set_sinks(prev)
+    assert fake.calls == [FAST, FAST, LARGE, LARGE]
+    got = [(r["tier"], r["route_reason"], r.get("escalated"), r["model_id"]) for r in records]
+    assert got == [("stats", "lookup", None, "none"), ("fast", "routine", False, FAST),
+                   ("fast", "routine", True, LARGE), ("large", "complex:why", None, LARGE)]
+    assert "context_ms" not in records[0] and records[2]["invoke_fast_ms"] > 0
+
+
+def test_cascade_cuts_latency_against_large_only(fake, monkeypatch):
+    fake.delay = {FAST: 0.01, LARGE: 0.08}
+    mix = ["What's my latest BP?", "How has my glucose looked?", "How were my readings?",
+           "How has my glucose trend looked?", "Why is my glucose up?"]
+
+    def run():
+        t = time.perf_counter()
+        for q in mix:
+            _ask(q)
+        return time.perf_counter() - t
+
+    cascaded = run()
+    monkeypatch.setattr(cascade, "ENABLED", False)
+    large_only = run()
+    # 2 large + 3 fast calls (0.19 s) against 5 large calls (0.40 s)
+    assert cascaded < 0.75 * large_only
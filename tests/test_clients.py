@@ -0,0 +1,167 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import clients
+import invoke
+
+pytest.importorskip("boto3")
+
+
+class Bedrock(BaseHTTPRequestHandler):
+    """Answers any POST after `delay` seconds, keeping the connection open;
+    records each request's client port, i.e. which connection it used.
+    GETs (warm-up calls) wait at `gate` until all of them have arrived, so
+    no warm-up call can finish early and hand its connection to another."""
+
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+    deny = False        # answer GETs (warm-up calls) with AccessDenied
+    gate = None         # threading.Barrier for the expected GETs
+    ports = []
+
+    def _send(self, status, body, headers=()):
+        Bedrock.ports.append(self.client_address[1])
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in headers:
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.delay)
+        self._send(200, {"content": "ok"})
+
+    def do_GET(self):
+        if Bedrock.gate is not None:
+            Bedrock.gate.wait()
+        if self.deny:
+            self._send(403, {"message": "denied"}, [("x-amzn-errortype", "AccessDeniedException")])
+        else:
+            self._send(200, {"asyncInvokeSummaries": []})
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def endpoint():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Bedrock)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    Bedrock.ports = []
+    yield f"http://127.0.0.1:{server.server_port}", server
+    server.shutdown()
+    server.server_close()
+    Bedrock.delay, Bedrock.deny, Bedrock.gate = 0.0, False, None
+
+
+def _client(url, stats):
+    return clients.build("bedrock-runtime", stats, endpoint_url=url, region_name="us-east-1",
+                         aws_access_key_id="x", aws_secret_access_key="y")
+
+
+def test_connections_are_reused_and_fan_out_is_counted(endpoint):
+    url, _ = endpoint
+    stats = clients.RequestStats()
+    client = _client(url, stats)
+    assert client.meta.config.max_pool_connections == clients.MAX_POOL
+    assert client.meta.config.tcp_keepalive is clients.TCP_KEEPALIVE
+    assert client.meta.config.read_timeout == clients.READ_TIMEOUTS["bedrock-runtime"]
+
+    Bedrock.gate = threading.Barrier(2, timeout=5)
+    assert clients.warm(client, 2) == 2
+    assert len(set(Bedrock.ports)) == 2
+    for _ in range(3):                                  # sequential: warm connections reused
+        json.loads(client.invoke_model(modelId="m", body=b"{}")["body"].read())
+    assert len(set(Bedrock.ports)) == 2
+    assert stats.snapshot() == {"in_flight": 0, "peak": 2, "sent": 5}
+
+    Bedrock.delay = 0.3
+    threads = [threading.Thread(target=lambda: client.invoke_model(modelId="m", body=b"{}")["body"].read())
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    until = time.monotonic() + 0.25
+    while stats.snapshot()["in_flight"] < 4 and time.monotonic() < until:
+        time.sleep(0.005)
+    assert stats.snapshot()["in_flight"] == 4           # concurrent fan-out holds 4
+    for t in threads:
+        t.join()
+    assert stats.snapshot() == {"in_flight": 0, "peak": 4, "sent": 9}
+    assert len(set(Bedrock.ports)) == 4                 # two warm + two new
+
+
+def test_timeouts_and_the_deadline(monkeypatch, endpoint):
+    url, _ = endpoint
+    Bedrock.delay = 1.0
+    monkeypatch.setitem(clients.READ_TIMEOUTS, "bedrock-runtime", 0.2)
+    client = _client(url, clients.RequestStats())
+    t = time.perf_counter()
+    with pytest.raises(Exception) as err:
+        client.invoke_model(modelId="m", body=b"{}")
+    assert "timeout" in type(err.value).__name__.lower() or "timed out" in str(err.value)
+    assert time.perf_counter() - t < 0.6                 # one attempt, no botocore retries
+
+    stats = clients.RequestStats()
+    client = _client(url, stats)
+    sent = len(Bedrock.ports)
+    with clients.deadline(time.monotonic() - 0.01):
+        assert clients.expired()
+        with pytest.raises(TimeoutError):
+            client.invoke_model(modelId="m", body=b"{}")
+    assert not clients.expired() and stats.snapshot()["sent"] == 0
+    time.sleep(0.3)
+    assert len(Bedrock.ports) == sent                    # nothing reached the server
+
+    monkeypatch.setitem(clients.READ_TIMEOUTS, "bedrock-runtime", 60.0)
+    slow = _client(url, clients.RequestStats())
+    t = time.perf_counter()
+    with pytest.raises(invoke.DeadlineExceeded):       # through invoke: 504 territory
+        invoke.invoke(slow, "m", b"{}", time.monotonic() + 0.2, tracker=invoke.LatencyTracker())
+    assert time.perf_counter() - t < 0.5
+
+
+def test_memoised_client_and_handler_metrics(monkeypatch, endpoint):
+    from src import handler
+    url, _ = endpoint
+    monkeypatch.setenv("AWS_ENDPOINT_URL_BEDROCK_RUNTIME", url)
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "x")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "y")
+    monkeypatch.setattr(clients, "_CLIENTS", {})
+    monkeypatch.setattr(clients, "_STATS", {})
+    monkeypatch.delitem(handler.__dict__, "bedrock", raising=False)
+    monkeypatch.setattr(handler, "RESPONSE_CACHE", handler.cache.TieredCache(handler.cache.LRUCache(0)))
+    assert clients.stats("bedrock-runtime") == {}
+
+    records = []
+    prev = handler.metrics.set_sinks([records.append])
+    try:
+        for q in ("How is my glucose?", "And my weight?"):
+            event = {"body": json.dumps({"prompt": q, "glucose": [100, 110], "weight": [70]})}
+            assert handler.handler(event, None)["statusCode"] == 200
+    finally:
+        handler.metrics.set_sinks(prev)
+    assert clients.get("bedrock-runtime") is handler.bedrock
+    assert [(r["requests_sent"], r["requests_in_flight"], r["requests_peak"]) for r in records] == [
+        (1, 0, 1), (2, 0, 1)]
+    assert len(set(Bedrock.ports)) == 1                 # the second request reused the connection
+
+
+def test_denied_warm_up_still_opens_connections(endpoint):
+    url, _ = endpoint
+    Bedrock.deny = True
+    client = _client(url, clients.RequestStats())
+    Bedrock.gate = threading.Barrier(3, timeout=5)
+    assert clients.warm(client, 3) == 3
+    assert len(set(Bedrock.ports)) == 3
+    client.invoke_model(modelId="m", body=b"{}")["body"].read()
+    assert len(set(Bedrock.ports)) == 3
+    assert clients.warm(client, 0) == 0
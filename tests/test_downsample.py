@@ -0,0 +1,44 @@
+import json
+import random
+
+import pytest
+import utils
+import downsample
+from series import Series
+
+
+def test_lttb_keeps_extremes():
+    y = [0.0] * 1000
+    y[321], y[654] = 50.0, -40.0
+    idx = downsample.lttb_indices(y, 20)
+    assert len(idx) == 20 and idx[0] == 0 and idx[-1] == 999
+    assert 321 in idx and 654 in idx
+
+
+def test_numpy_and_python_lttb_agree():
+    pytest.importorskip("numpy")
+    rnd = random.Random(7)
+    y = [rnd.gauss(0, 1) for _ in range(5000)]
+    x = sorted(rnd.uniform(0, 1e6) for _ in range(5000))
+    assert downsample._lttb_np(y, x, 123) == downsample._lttb_py(y, x, 123)
+
+
+def test_downsample_keeps_latest_exact():
+    s = Series([float(i % 17) for i in range(2000)], range(0, 2000 * 60, 60))
+    out = downsample.downsample(s, 100)
+    assert len(out) == 100 and out.timed
+    assert out.tolist()[-downsample.KEEP_LATEST:] == s.tolist()[-downsample.KEEP_LATEST:]
+    assert list(out.ts) == sorted(out.ts)
+
+
+def test_context_is_valid_json_within_budget():
+    rnd = random.Random(0)
+    ts = {k: [round(rnd.uniform(70, 200), 1) for _ in range(10_000)]
+          for k in ("glucose", "weight", "bp_sys", "bp_dia")}
+    ts["weight"] = ts["weight"][-5:]
+    ctx = utils.build_context_from_payload("q", ts, max_context_tokens=700)
+    assert utils.est_tokens(ctx) <= 700
+    data = json.loads(ctx)
+    assert data["weight"] == ts["weight"]              # short series untouched
+    assert data["glucose"][-12:] == ts["glucose"][-12:]  # latest kept exactly
+    assert len(data["glucose"]) > 12
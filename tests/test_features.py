@@ -0,0 +1,120 @@
+import io
+import json
+import math
+import random
+import time
+
+import pytest
+
+import features
+import utils
+from series import DAY, Series
+from src import handler
+
+T0 = 1_750_000_000
+
+
+def _shifted(n=3000, at=2000, seed=0):
+    rnd = random.Random(seed)
+    y = [100 + rnd.gauss(0, 5) + (20 if i >= at else 0) for i in range(n)]
+    y[500] = 250.0  # lone spike
+    return y
+
+
+def test_level_shift_is_a_change_point_and_spike_an_outlier(monkeypatch):
+    monkeypatch.setattr(features.lazy, "np", None)
+    d = features.digest(_shifted())
+    ((at, before, after),) = d["changes"]
+    assert abs(at - 2000) <= 5 and before == pytest.approx(100, abs=1) and after == pytest.approx(120, abs=1)
+    assert d["outliers"]["top"][0][:2] == [500, 250.0]
+    assert d["mean"]["7pt"] > d["mean"]["all"] and d["slope_per_pt"]["all"] > 0
+
+
+def test_a_large_shift_does_not_hide_a_smaller_one(monkeypatch):
+    # levels 100 -> 200 -> 240: the values' own MAD (~59) would put the
+    # second step below the CUSUM allowance; the noise is only 5
+    rnd = random.Random(1)
+    y = [rnd.gauss(0, 5) + (100 if i < 400 else 200 if i < 800 else 240) for i in range(1200)]
+    for np_ in (features.lazy.numpy(), None):
+        monkeypatch.setattr(features.lazy, "np", np_)
+        d = features.digest(y)
+        assert [c[0] for c in d["changes"]] == pytest.approx([400, 800], abs=5)
+        assert d["changes"][1][1:] == pytest.approx([200, 240], abs=1)
+
+
+def test_a_daily_cycle_is_not_a_change(monkeypatch):
+    # hourly, 30-unit daily swing over noise 8, one +25 step at 70%: the
+    # cycle drifts a flat CUSUM past its threshold every half-day
+    rnd = random.Random(2)
+    n = 10_000
+    y = [110 + 25 * math.sin(2 * math.pi * (i % 24) / 24) + rnd.gauss(0, 8) + (25 if i >= 7000 else 0)
+         for i in range(n)]
+    x = Series(y, [T0 - T0 % DAY + i * 3600 for i in range(n)])
+    for np_, limit in ((features.lazy.numpy(), 0.01), (None, 0.2)):
+        monkeypatch.setattr(features.lazy, "np", np_)
+        ((at, before, after),) = features.digest(x)["changes"]
+        assert min(_timed(lambda: features.digest(x)) for _ in range(3)) < limit
+        assert at in {features._label(x, i) for i in range(7000 - 24, 7000 + 24)}
+        assert before == pytest.approx(110, abs=1) and after == pytest.approx(135, abs=1)
+
+
+def test_numpy_and_python_digests_agree(monkeypatch):
+    pytest.importorskip("numpy")
+    rnd = random.Random(3)
+    y = [110 + 25 * math.sin(i / 4) + rnd.gauss(0, 8) + (30 if i > 6000 else 0) for i in range(10_000)]
+    x = Series(y, [T0 + i * 3600 for i in range(10_000)])
+    fast = features.digest(x, "glucose")
+    monkeypatch.setattr(features.lazy, "np", None)
+    assert features.digest(x, "glucose") == fast
+
+
+def test_glucose_daily_extremes_and_time_in_range():
+    day0 = (T0 // DAY) * DAY
+    # two days of readings: 60 / 100 / 200, then 90 / 120 / 150
+    x = Series([60, 100, 200, 90, 120, 150], [day0 + h * 3600 for h in (1, 2, 3, 25, 26, 27)])
+    d = features.digest(x, "glucose")
+    assert [row[1:] for row in d["daily"]] == [[60, 200, 33], [90, 150, 100]]
+    assert d["tir_30d"] == 67 and d["span"][0] == d["daily"][0][0]
+    assert "daily" not in features.digest(x, "weight")
+
+
+def test_features_context_is_small_fast_and_deterministic():
+    rnd = random.Random(0)
+    ts = {k: Series([100 + rnd.gauss(0, 10) for _ in range(10_000)], [T0 + i * 300 for i in range(10_000)])
+          for k in ("weight", "glucose", "bp_sys", "bp_dia")}
+    ctx = utils.build_context_from_payload("q", ts, mode="features")
+    assert list(json.loads(ctx)) == ["glucose", "weight", "bp_sys", "bp_dia"]
+    assert ctx == utils.build_context_from_payload("q", dict(reversed(ts.items())), mode="features")
+    assert utils.est_tokens(ctx) <= 700
+    assert utils.est_tokens(ctx) * 10 < utils.est_tokens(utils._dumps(ts))
+    with pytest.raises(ValueError):
+        utils.build_context_from_payload("q", ts, mode="prose")
+
+    if features.lazy.numpy() is not None:
+        best = min(_timed(lambda: features.digest(ts["glucose"], "glucose")) for _ in range(5))
+        assert best < 0.010
+
+
+def _timed(fn):
+    t = time.perf_counter()
+    fn()
+    return time.perf_counter() - t
+
+
+def test_handler_context_mode_per_request(monkeypatch):
+    bodies = []
+
+    def invoke_model(modelId, body):
+        bodies.append(json.loads(body))
+        return {"body": io.BytesIO(json.dumps({"content": "OK"}).encode())}
+
+    monkeypatch.setattr(handler, "RESPONSE_CACHE", handler.cache.TieredCache(handler.cache.LRUCache(0)))
+    monkeypatch.setattr(handler.bedrock, "invoke_model", invoke_model)
+    payload = {"prompt": "trend?", "glucose": [100 + i % 5 for i in range(300)], "context_mode": "features"}
+    assert handler.handler({"body": json.dumps(payload)}, None)["statusCode"] == 200
+    system, vitals, _ = bodies[0]["messages"]
+    assert system["content"] == handler.SYSTEM_PROMPT_FEATURES
+    assert json.loads(vitals["content"])["glucose"]["n"] == 300
+
+    payload["context_mode"] = "prose"
+    assert handler.handler({"body": json.dumps(payload)}, None)["statusCode"] == 400
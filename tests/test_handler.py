@@ -7,11 +7,110 @@ def reload():
     importlib.reload(handler)
 
 def test_stub(monkeypatch):
-    monkeypatch.setattr(handler, "fetch_latest",
-                        lambda *_: [100.0]*10)
+    monkeypatch.setattr(handler, "fetch_latest_many",
+                        lambda *_, **__: {})
     monkeypatch.setattr(handler.bedrock, "invoke_model",
         lambda **_: {"body":io.BytesIO(
             json.dumps({"content":"OK"}).encode())})
     evt = {"body": json.dumps({"prompt": "Hello", "timeseries": {}})}
     out = handler.handler(evt, None)
     assert json.loads(out["body"])["answer"] == "OK"
+
+def test_repeat_question_served_from_cache(monkeypatch):
+    calls = []
+    def invoke(**kw):
+        calls.append(kw)
+        return {"body": io.BytesIO(json.dumps({"content": "OK"}).encode())}
+    monkeypatch.setattr(handler.bedrock, "invoke_model", invoke)
+    body = {"prompt": "How is my glucose?", "glucose": [100, 110]}
+    first = handler.handler({"body": json.dumps(body)}, None)
+    body["prompt"] = "how is my  glucose"
+    second = handler.handler({"body": json.dumps(body)}, None)
+    assert len(calls) == 1
+    assert first["headers"]["X-Cache"] == "MISS"
+    assert second["headers"]["X-Cache"] == "HIT"
+    assert json.loads(second["body"])["answer"] == "OK"
+
+
+def test_cache_is_keyed_on_the_system_prompt_sent(monkeypatch):
+    calls = []
+    def invoke(**kw):
+        calls.append(json.loads(kw["body"]))
+        return {"body": io.BytesIO(json.dumps({"content": "OK"}).encode())}
+    monkeypatch.setattr(handler.bedrock, "invoke_model", invoke)
+    body = json.dumps({"prompt": "How is my glucose?", "glucose": [100, 110]})
+    handler.handler({"body": body}, None)
+    monkeypatch.setattr(handler.wire, "format_note", lambda _: "\nValues are in mmol/L.")
+    second = handler.handler({"body": body}, None)
+    assert len(calls) == 2 and second["headers"]["X-Cache"] == "MISS"
+    assert handler.prompts.prefix(calls[1]).endswith("Values are in mmol/L.")
+
+
+class _Ctx:
+    def __init__(self, ms):
+        self.ms = ms
+    def get_remaining_time_in_millis(self):
+        return self.ms
+
+
+def _slow_invoke(delay):
+    import time
+    def invoke(modelId, body):
+        time.sleep(delay)
+        q = json.loads(body)["messages"][-1]["content"]
+        if q == "boom":
+            raise RuntimeError("model exploded")
+        return {"body": io.BytesIO(json.dumps({"content": "A:" + q}).encode())}
+    return invoke
+
+
+def test_batch_fans_out_concurrently(monkeypatch):
+    import time
+    monkeypatch.setattr(handler.bedrock, "invoke_model", _slow_invoke(0.2))
+    items = [{"prompt": f"q{i}", "timeseries": {"glucose": [100 + i]}} for i in range(8)]
+    items += [{"prompt": ""}, {"prompt": "boom"}]
+    t = time.monotonic()
+    out = handler.handler({"body": json.dumps({"items": items}), "rawPath": "/query/batch"}, _Ctx(10_000))
+    elapsed = time.monotonic() - t
+    results = json.loads(out["body"])["results"]
+    assert out["statusCode"] == 200
+    assert [r["answer"] for r in results[:8]] == [f"A:q{i}" for i in range(8)]
+    assert results[8]["status"] == 400 and results[9]["status"] == 502
+    assert elapsed < 0.2 * 9 / 2      # ~max(latency) * ceil(9 / 8), not the sum
+
+
+def test_batch_deadline_reports_unfinished_items(monkeypatch):
+    monkeypatch.setattr(handler.bedrock, "invoke_model", _slow_invoke(1.0))
+    monkeypatch.setattr(handler, "BATCH_CONCURRENCY", 1)
+    items = [{"prompt": f"q{i}"} for i in range(3)]
+    out = handler.handler({"body": json.dumps({"items": items}), "rawPath": "/query/batch"}, _Ctx(1_700))
+    results = json.loads(out["body"])["results"]
+    assert results[0]["answer"] == "A:q0"
+    assert [r["status"] for r in results[1:]] == [504, 504]
+    too_many = {"items": [{"prompt": "x"}] * (handler.BATCH_MAX_ITEMS + 1)}
+    assert handler.handler({"body": json.dumps(too_many), "rawPath": "/query/batch"}, None)["statusCode"] == 400
+
+
+def test_batch_bodies_only_on_the_batch_route(monkeypatch):
+    monkeypatch.setattr(handler.bedrock, "invoke_model", _slow_invoke(0))
+    batch, single = {"items": [{"prompt": "q"}]}, {"prompt": "q"}
+
+    def status(body, raw_path, **ctx):
+        event = {"body": json.dumps(body), "rawPath": raw_path}
+        if ctx:  # HTTP API v2 event without rawPath
+            event = {"body": json.dumps(body), "requestContext": {"http": ctx}}
+        return handler.handler(event, None)["statusCode"]
+
+    assert status(batch, "/query") == 400                    # no batch mode by body shape
+    assert status(single, "/query/batch") == 400
+    assert status(batch, None, path="/query") == 400
+    assert status(batch, "/prod/query/batch/") == 200        # stage prefix, trailing slash
+    assert status(single, "/query?x=1") == 200
+    assert handler.handler({"body": json.dumps(batch)}, None)["statusCode"] == 200  # direct invoke
+
+
+def test_oversized_body_rejected_before_parsing(monkeypatch):
+    monkeypatch.setattr(handler, "MAX_BODY_BYTES", 64)
+    monkeypatch.setattr(handler.ingest, "parse_body", lambda *a: pytest.fail("parsed"))
+    resp = handler.handler({"body": json.dumps({"prompt": "q", "glucose": list(range(50))})}, None)
+    assert resp["statusCode"] == 413
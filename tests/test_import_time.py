@@ -0,0 +1,28 @@
+import os
+
+from benchmarks import import_time
+
+# Cold-start budget for `import handler` (CI runners are slower than a
+# warm laptop; boto3 + numpy alone used to take ~0.4 s).
+BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "250"))
+
+
+def test_handler_import_is_lazy_and_within_budget():
+    rows = import_time.best_of("handler")
+    names = {name for name, _, _ in rows}
+    assert "boto3" not in names and "botocore" not in names
+    assert "numpy" not in names
+    total = import_time.total_ms(rows)
+    assert total <= BUDGET_MS, f"import handler took {total:.1f} ms\n{import_time.report(rows)}"
+
+
+def test_bedrock_client_is_built_once(monkeypatch):
+    from src import handler
+
+    built = []
+    monkeypatch.setattr(handler.clients, "_CLIENTS", {})
+    monkeypatch.delitem(handler.__dict__, "bedrock", raising=False)
+    import boto3
+    monkeypatch.setattr(boto3, "client", lambda service, **kw: built.append(service) or object())
+    assert handler.bedrock is handler.bedrock
+    assert built == ["bedrock-runtime"]
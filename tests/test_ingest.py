@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+import ingest
+import utils
+from series import DAY
+
+
+def _parse(obj, **kw):
+    return ingest.parse_body(json.dumps(obj), aliases=utils._ALIASES, **kw)
+
+
+def test_matches_json_loads_path():
+    t0 = 1_750_000_000
+    payload = {
+        "prompt": "How am I doing?",
+        "patient_id": "p-1",
+        "systolic": [120, "121", None, 122.5],
+        "steps": [{"timestamp": t0, "value": 1}] * 50,
+        "timeseries": {
+            "glucose": [{"timestamp": t0 + i * DAY, "value": 100 + i} for i in range(5)],
+            "sleep": {"nested": ["x", {"y": "]}"}]},
+        },
+        "meta": {"ignored": True},
+    }
+    fast = utils.validate_payload(_parse(payload))
+    slow = utils.validate_payload(payload)
+    assert fast[0] == slow[0]
+    assert fast[1] == slow[1]
+    assert fast[1]["glucose"].timed
+    assert list(fast[1]["glucose"].ts) == list(slow[1]["glucose"].ts)
+
+
+def test_unknown_series_and_blobs_are_not_kept():
+    out = _parse({"prompt": "q", "steps": list(range(100)), "extra": {"a": [1]}, "n": 3})
+    assert out == {"prompt": "q", "n": 3, "timeseries": {}}
+
+
+def test_ring_buffer_keeps_latest_points():
+    nums = _parse({"glucose": list(range(50))}, max_points=10)["timeseries"]["glucose"]
+    objs = _parse({"glucose": [{"value": v} for v in range(50)]}, max_points=10)["timeseries"]["glucose"]
+    assert nums.tolist() == objs.tolist() == [float(v) for v in range(40, 50)]
+    assert _parse({"glucose": [1]}, max_points=10)["timeseries"]["glucose"] == [1.0]
+    assert _parse({"glucose": []})["timeseries"]["glucose"] == []
+
+
+def test_numeric_fast_path_parses_json_numbers():
+    text = '{"weight": [ 70 , -1.5e2,0.25 ]}'
+    assert ingest.parse_body(text)["timeseries"]["weight"] == [70.0, -150.0, 0.25]
+
+
+def test_numbers_that_overflow_are_dropped():
+    text = '{"prompt": "q", "glucose": [5, 1e999, 7, -1e400, 9, %s]}' % ("1" * 400)
+    slow = utils.validate_payload(json.loads(text))[1]["glucose"]
+    assert ingest.parse_body(text)["timeseries"]["glucose"].tolist() == slow.tolist() == [5.0, 7.0, 9.0]
+    # like the general path, the ring keeps the last raw elements, then drops
+    assert ingest.parse_body(text, max_points=3)["timeseries"]["glucose"].tolist() == [9.0]
+
+
+@pytest.mark.parametrize("item", ["+1", "1_0", ".5", "01", "1.", "0x1", "1e", "--1", "1 2"])
+def test_non_json_numerals_are_rejected_even_in_the_skipped_prefix(item):
+    for text in ('{"glucose": [%s, 2, 3]}' % item, '{"glucose": [2, 3, %s]}' % item):
+        with pytest.raises(ValueError):
+            json.loads(text)
+        with pytest.raises(ValueError):
+            ingest.parse_body(text, max_points=1)
+
+
+def test_nan_and_infinity_take_the_json_loads_route():
+    text = '{"glucose": [NaN, 1, Infinity, 2, -Infinity]}'
+    assert ingest.parse_body(text)["timeseries"]["glucose"].tolist() == [1.0, 2.0]
+
+
+def test_nested_timeseries_wins_over_flat():
+    out = _parse({"glucose": [1], "timeseries": {"glucose": [2]}})
+    assert out["timeseries"]["glucose"] == [2.0]
+
+
+def test_batch_items_and_non_objects_pass_through():
+    items = [{"prompt": "a", "glucose": [1]}]
+    assert _parse({"items": items})["items"] == items
+    assert ingest.parse_body("[1, 2]") == [1, 2]
+
+
+@pytest.mark.parametrize("text", ['{"glucose": [1, 2', '{"a": 1} x', '{"a" 1}', '{"s": [1, "]'])
+def test_malformed_json_raises_value_error(text):
+    with pytest.raises(ValueError):
+        ingest.parse_body(text)
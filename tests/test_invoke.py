@@ -0,0 +1,144 @@
+import io
+import json
+import threading
+import time
+
+import pytest
+
+import invoke
+import metrics
+from src import handler
+
+
+class Throttle(Exception):
+    response = {"Error": {"Code": "ThrottlingException"}}
+
+
+class Body(io.BytesIO):
+    def __init__(self, data, closed_unread):
+        super().__init__(data)
+        self._closed_unread = closed_unread
+
+    def close(self):
+        if self.tell() == 0:
+            self._closed_unread.set()
+        super().close()
+
+
+class FakeClient:
+    """Each call takes the next scripted step: a delay (s) or an exception."""
+
+    def __init__(self, *steps):
+        self.steps = list(steps)
+        self.calls = 0
+        self.closed_unread = threading.Event()
+        self._lock = threading.Lock()
+
+    def invoke_model(self, modelId, body):
+        with self._lock:
+            step = self.steps[min(self.calls, len(self.steps) - 1)]
+            self.calls += 1
+            n = self.calls
+        if isinstance(step, Exception):
+            raise step
+        time.sleep(step)
+        return {"body": Body(json.dumps({"content": f"answer {n}"}).encode(), self.closed_unread)}
+
+
+def _primed(ms=20.0, n=30):
+    tracker = invoke.LatencyTracker()
+    for _ in range(n):
+        tracker.hist("m").add(ms / 1000.0)
+    return tracker
+
+
+def _run(client, tracker=None, budget=5.0):
+    m = metrics.Invocation()
+    t = time.perf_counter()
+    raw, _ = invoke.invoke(client, "m", b"{}", time.monotonic() + budget, m, tracker or invoke.LatencyTracker())
+    return json.loads(raw)["content"], m.data, time.perf_counter() - t
+
+
+def test_histogram_quantiles_roll_over_the_window():
+    h = invoke.LatencyHistogram(window=100)
+    for i in range(1, 101):
+        h.add(i / 100.0)                      # 10 ms .. 1 s
+    assert h.quantile(0.9) == pytest.approx(0.9, rel=0.1)
+    assert h.quantile(0.5) == pytest.approx(0.5, rel=0.1)
+    for _ in range(100):
+        h.add(2.0)
+    assert len(h) == 100 and h.quantile(0.1) == pytest.approx(2.0, rel=0.1)
+    assert invoke.LatencyHistogram().quantile(0.5) is None
+
+
+def test_slow_call_is_hedged_and_loser_dropped(monkeypatch):
+    monkeypatch.setattr(invoke, "HEDGE_MIN_MS", 0.0)
+    client = FakeClient(0.5, 0.01)
+    answer, data, took = _run(client, _primed())
+    assert answer == "answer 2" and took < 0.3
+    assert data["hedged"] is True and data["hedge_won"] is True
+    assert client.closed_unread.wait(2.0)     # the primary finished later; body never read
+
+    quick = FakeClient(0.005)
+    answer, data, _ = _run(quick, _primed())
+    assert answer == "answer 1" and quick.calls == 1 and "hedged" not in data
+    # no hedge without enough samples
+    cold = FakeClient(0.1, 0.01)
+    assert _run(cold)[0] == "answer 1" and cold.calls == 1
+
+
+def test_saturated_callers_neither_queue_primaries_nor_hedges(monkeypatch):
+    # 24 concurrent callers (more than INVOKE_WORKERS), every call slow
+    # enough to be hedged, and room for only two hedges at a time
+    monkeypatch.setattr(invoke, "HEDGE_MIN_MS", 0.0)
+    monkeypatch.setattr(invoke, "_POOL", invoke._POOL)          # restored after the test
+    monkeypatch.setattr(invoke, "_workers", invoke._workers)
+    monkeypatch.setattr(invoke, "_HEDGE_POOL", invoke.ThreadPoolExecutor(2))
+    monkeypatch.setattr(invoke, "_HEDGE_SLOTS", threading.BoundedSemaphore(2))
+    callers = invoke.WORKERS + 8
+    invoke.reserve(callers)
+    client, tracker, results = FakeClient(0.2), _primed(), []
+    threads = [threading.Thread(target=lambda: results.append(_run(client, tracker, budget=1.0)))
+               for _ in range(callers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(results) == callers and max(took for _, _, took in results) < 0.35
+    hedged = sum(1 for _, data, _ in results if data.get("hedged"))
+    skipped = sum(1 for _, data, _ in results if data.get("hedge_skipped"))
+    assert hedged == 2 and skipped == callers - 2 and client.calls == callers + 2
+
+
+def test_throttles_back_off_then_succeed_or_give_up_within_budget(monkeypatch):
+    monkeypatch.setattr(invoke, "BACKOFF_BASE_MS", 5.0)
+    answer, data, _ = _run(FakeClient(Throttle(), Throttle(), 0.0))
+    assert answer == "answer 3" and data["retries"] == 2 and data["throttles"] == 2
+
+    monkeypatch.setattr(invoke, "BACKOFF_BASE_MS", 10_000.0)   # pauses longer than the budget
+    monkeypatch.setattr(invoke, "BACKOFF_CAP_MS", 10_000.0)
+    client = FakeClient(Throttle())
+    t = time.perf_counter()
+    with pytest.raises(invoke.Throttled):
+        invoke.invoke(client, "m", b"{}", time.monotonic() + 0.2, tracker=invoke.LatencyTracker())
+    assert time.perf_counter() - t < 0.5      # never sleeps past the deadline
+
+    with pytest.raises(ValueError):
+        _run(FakeClient(ValueError("bad request")))
+
+
+def test_deadline_and_handler_status_codes(monkeypatch):
+    t = time.perf_counter()
+    with pytest.raises(invoke.DeadlineExceeded):
+        invoke.invoke(FakeClient(1.0), "m", b"{}", time.monotonic() + 0.1, tracker=invoke.LatencyTracker())
+    assert time.perf_counter() - t < 0.5
+
+    monkeypatch.setattr(handler, "RESPONSE_CACHE", handler.cache.TieredCache(handler.cache.LRUCache(0)))
+    monkeypatch.setattr(invoke, "BACKOFF_BASE_MS", 1.0)
+    event = {"body": json.dumps({"prompt": "How is my glucose?", "glucose": [100, 110]})}
+    monkeypatch.setattr(handler.bedrock, "invoke_model", FakeClient(Throttle()).invoke_model)
+    assert handler.handler(event, None)["statusCode"] == 429
+    monkeypatch.setattr(handler.bedrock, "invoke_model", FakeClient(1.0).invoke_model)
+    monkeypatch.setattr(handler, "REQUEST_DEADLINE_S", 0.6)   # 0.1 s after the response margin
+    assert handler.handler(event, None)["statusCode"] == 504
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from benchmarks import loadgen
+
+
+def test_fake_bedrock_latency_grows_with_tokens_and_throttles():
+    fb = loadgen.FakeBedrock(median_ms=100, sigma=0.0, ms_per_input_token=0.5, ms_per_output_token=10)
+    assert fb.latency_ms(0, 0) == pytest.approx(100)
+    assert fb.latency_ms(200, 30) == pytest.approx(100 + 100 + 300)
+
+    always = loadgen.FakeBedrock(throttle_rate=1.0, time_scale=0.0)
+    with pytest.raises(loadgen.ThrottlingException) as err:
+        always.invoke_model(modelId="m", body=b'{"messages": []}')
+    assert err.value.response["Error"]["Code"] == "ThrottlingException" and always.throttled == 1
+
+
+def test_inproc_run_reports_percentiles_errors_and_restores_handler(tmp_path, monkeypatch):
+    monkeypatch.setattr(loadgen.handler.invoke, "BACKOFF_BASE_MS", 1.0)
+    monkeypatch.setattr(loadgen.handler.invoke, "MAX_RETRIES", 1)
+    cache_before, handler_before = loadgen.handler.RESPONSE_CACHE, loadgen.handler.handler
+    corpus = tmp_path / "corpus.jsonl"
+    corpus.write_text("\n".join([json.dumps({"prompt": "How is my glucose?", "glucose": [100, 110]}),
+                                 json.dumps({"body": json.dumps({"prompt": "BP?", "bp_sys": [120],
+                                                                 "bp_dia": [80]})})]))
+    fb = loadgen.FakeBedrock(median_ms=200, throttle_rate=0.5, time_scale=0.01, seed=1)
+    rep = loadgen.run(loadgen.load_corpus(str(corpus)), rps=500, concurrency=4, requests=40, bedrock=fb)
+
+    assert loadgen.handler.RESPONSE_CACHE is cache_before and loadgen.handler.handler is handler_before
+    assert "bedrock" not in loadgen.handler.__dict__
+    # throttles are retried once by the handler, then answered with 429
+    assert sum(rep["statuses"].values()) == 40 and set(rep["statuses"]) <= {"200", "429"}
+    assert 0 < rep["statuses"].get("429", 0) < fb.throttled
+    assert rep["bedrock"]["calls"] == 40 + fb.throttled - rep["statuses"]["429"]
+    lat = rep["latency_ms"]
+    assert lat["p50"] <= lat["p95"] <= lat["p99"] <= lat["max"]
+    assert lat["p50"] >= 2.0                                   # the modelled 200 ms x 0.01
+    assert rep["cpu_ms_per_request"]["p50"] > 0 and rep["memory"]["rss_peak_mb"] > 0
+
+
+def test_http_run_through_dev_server():
+    corpus = loadgen.load_corpus(str(loadgen.Path(__file__).resolve().parents[1] / "payload.json"))
+    rep = loadgen.run(corpus, rps=200, concurrency=1, requests=5, target="http",
+                      bedrock=loadgen.FakeBedrock(time_scale=0.001), trace_memory=True)
+    assert rep["statuses"] == {"200": 5} and len(corpus) == 1
+    assert rep["memory"]["alloc_peak_kb_per_request"]["p50"] > 0
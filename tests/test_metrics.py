@@ -0,0 +1,108 @@
+import io
+import json
+import time
+
+import pytest
+
+import metrics
+from src import handler
+
+
+@pytest.fixture
+def captured(monkeypatch):
+    records = []
+    prev = metrics.set_sinks([records.append])
+    monkeypatch.setattr(handler, "RESPONSE_CACHE", handler.cache.TieredCache(handler.cache.LRUCache(8)))
+    monkeypatch.setattr(handler.bedrock, "invoke_model",
+                        lambda **_: {"body": io.BytesIO(json.dumps({"content": "OK"}).encode())})
+    yield records
+    metrics.set_sinks(prev)
+
+
+def test_one_record_per_invocation_with_stages(captured, monkeypatch):
+    monkeypatch.setattr(metrics, "_COLD", True)
+    body = json.dumps({"prompt": "How is my glucose?", "glucose": [100, 110, 120]})
+    handler.handler({"body": body}, None)
+    handler.handler({"body": body}, None)
+    first, second = captured
+    for stage in ("parse", "validate", "fetch", "context", "cache", "invoke", "extract", "total"):
+        assert first[stage + "_ms"] >= 0
+    assert first["points"] == 3 and first["context_bytes"] > 0 and first["context_tokens"] > 0
+    assert first["series_skipped"] == 3 and first["skipped_series"] == "weight,bp_sys,bp_dia"
+    assert first["model_id"] == handler.MODEL_ID and first["route"] == "query"
+    assert (first["cold_start"], first["cache_hit"], first["status"]) == (True, False, 200)
+    assert (second["cold_start"], second["cache_hit"]) == (False, True)
+    assert "invoke_ms" not in second
+
+
+def test_errors_are_recorded(captured):
+    handler.handler({"body": "{not json"}, None)
+    handler.handler({"body": json.dumps({"glucose": [1]})}, None)
+    assert [r["status"] for r in captured] == [400, 400]
+    assert "validate_ms" in captured[1]
+
+
+def test_emf_envelope_and_failing_sinks():
+    def broken(_):
+        raise RuntimeError("sink down")
+
+    out = []
+    prev = metrics.set_sinks([broken, out.append])
+    try:
+        m = metrics.Invocation(route="query", model_id="m")
+        with m.stage("parse"):
+            pass
+        m.set(cache_hit=True, points=4)
+        assert m.emit(status=200) is not None
+        assert m.emit() is None  # only once
+    finally:
+        metrics.set_sinks(prev)
+    doc = json.loads(metrics.emf_line(out[0]))
+    spec = doc["_aws"]["CloudWatchMetrics"][0]
+    assert spec["Dimensions"] == [["route", "model_id"]]
+    names = {x["Name"] for x in spec["Metrics"]}
+    assert {"parse_ms", "total_ms", "points", "cache_hit"} <= names
+    assert all(doc[n] is not True and isinstance(doc[n], (int, float)) for n in names)
+
+
+def test_overhead_under_one_percent_of_stubbed_request(captured):
+    """Full metrics lifecycle (stages, record, EMF formatting) vs. a stubbed request."""
+    captured_sink = metrics.set_sinks([metrics.emf_line])
+    handler.RESPONSE_CACHE = handler.cache.TieredCache(handler.cache.LRUCache(0))
+    body = json.dumps({"prompt": "How is my glucose?",
+                       "timeseries": {k: [100.0 + i % 7 for i in range(1000)] for k in handler.timestream.SERIES}})
+
+    def best(fn, n):
+        return min(_timed(fn, n) for _ in range(5))
+
+    def lifecycle():
+        m = metrics.Invocation(route="query", model_id="m")
+        for s in ("parse", "validate", "fetch", "context", "cache", "invoke", "extract"):
+            with m.stage(s):
+                pass
+        m.set(points=4000, context_bytes=2800, context_tokens=700, cache_hit=False)
+        m.emit(status=200)
+
+    try:
+        request = best(lambda: handler.handler({"body": body}, None), 5)
+        overhead = best(lifecycle, 200)
+    finally:
+        metrics.set_sinks(captured_sink)
+    assert overhead < 0.01 * request
+
+
+def _timed(fn, n):
+    t = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t) / n
+
+
+def test_stream_records_time_to_first_token(captured, monkeypatch):
+    chunks = [{"chunk": {"bytes": json.dumps({"delta": {"text": w}}).encode()}} for w in ("a", "b")]
+    monkeypatch.setattr(handler.bedrock, "invoke_model_with_response_stream",
+                        lambda **_: {"body": iter(chunks)})
+    list(handler.stream_handler({"body": json.dumps({"prompt": "hi", "glucose": [1]})}, None))
+    (rec,) = captured
+    assert rec["route"] == "stream" and rec["status"] == 200
+    assert 0 <= rec["ttft_ms"] <= rec["total_ms"]
@@ -0,0 +1,94 @@
+import io
+import json
+
+import pytest
+
+import metrics
+import prompts
+import utils
+from src import handler
+
+CLAUDE = "anthropic.claude-3-5-haiku-20241022-v1:0"
+
+
+class FakeBedrock:
+    """Records request bytes; reports a cache write first, then reads."""
+
+    def __init__(self):
+        self.bodies = []
+
+    def invoke_model(self, modelId, body):
+        self.bodies.append(body)
+        first = len(self.bodies) == 1
+        usage = {"input_tokens": 12, "cache_creation_input_tokens": 900 if first else 0,
+                 "cache_read_input_tokens": 0 if first else 900}
+        out = {"content": [{"type": "text", "text": "Stable."}], "usage": usage}
+        return {"body": io.BytesIO(json.dumps(out).encode())}
+
+
+@pytest.fixture
+def claude(monkeypatch):
+    fake = FakeBedrock()
+    records = []
+    prev = metrics.set_sinks([records.append])
+    monkeypatch.setattr(handler, "MODEL_ID", CLAUDE)
+    monkeypatch.setattr(handler, "bedrock", fake)
+    monkeypatch.setattr(handler, "RESPONSE_CACHE", handler.cache.TieredCache(handler.cache.LRUCache(0)))
+    yield fake, records
+    metrics.set_sinks(prev)
+
+
+def test_follow_up_questions_share_a_byte_identical_prefix(claude):
+    fake, records = claude
+    t0 = 1_750_000_000
+    glucose = [{"timestamp": t0 + i * 3600, "value": 100 + i % 9} for i in range(50)]
+    for question, weight in (("How is my glucose and weight?", [80, 81]),
+                             ("And my weight and glucose?", [80.0, 81.0])):
+        # same vitals (and series routed), different key order / number spelling per request
+        payload = {"prompt": question, "weight": weight, "timeseries": {"glucose": glucose}}
+        resp = handler.handler({"body": json.dumps(payload)}, None)
+        assert json.loads(resp["body"])["answer"] == "Stable."
+
+    a, b = fake.bodies
+    cut = a.index(b"How is my glucose and weight?")
+    assert a[:cut] == b[:cut] and b[cut:cut + 26] == b"And my weight and glucose?"
+    body = json.loads(a)
+    assert body["system"][-1]["cache_control"] == {"type": "ephemeral"}
+    vitals, question = body["messages"][0]["content"]
+    assert "cache_control" in vitals and "cache_control" not in question
+
+    assert (records[0]["cache_write_tokens"], records[0]["cache_read_tokens"]) == (900, 0)
+    assert (records[1]["cache_write_tokens"], records[1]["cache_read_tokens"]) == (0, 900)
+    assert records[1]["input_tokens"] == 12
+
+
+def test_context_serialisation_is_deterministic():
+    a = utils.build_context_from_payload("q", {"weight": [81, 80], "glucose": [100, 101.5]})
+    b = utils.build_context_from_payload("q", {"glucose": [100.0, 101.5], "weight": [81.0, 80.0]})
+    assert a == b == '{"glucose":[100.0,101.5],"weight":[81.0,80.0]}'
+
+
+def test_styles_and_usage_headers():
+    assert prompts.cache_style(CLAUDE) == "anthropic"
+    assert prompts.cache_style("amazon.nova-lite-v1:0") == "nova"
+    assert prompts.cache_style("meta.llama3-70b-instruct-v1:0") == "off"
+    assert prompts.cache_style(CLAUDE, "off") == "off"
+
+    nova = prompts.build_body("sys", "{}", "q?", "nova")
+    assert nova["system"][-1] == {"cachePoint": {"type": "default"}}
+    assert [list(c) for c in nova["messages"][0]["content"]] == [["text"], ["cachePoint"], ["text"]]
+    off = prompts.build_body("sys", "{}", "q?", "off")
+    assert off["messages"][1] == {"role": "assistant", "name": "vitals", "content": "{}"}
+    # every style labels the block "vitals", which is all the system prompts promise
+    assert nova["messages"][0]["content"][0]["text"].startswith("vitals:")
+    assert prompts.build_body("sys", "{}", "q?", "anthropic")["messages"][0]["content"][0]["text"] == "vitals:\n{}"
+    for system in handler.SYSTEM_PROMPTS.values():
+        assert "labelled 'vitals'" in system and "assistant message" not in system
+    # the cache-key prefix tells styles apart even for one system prompt
+    prefixes = {prompts.prefix(prompts.build_body("sys", "{}", "q?", s)) for s in prompts.STYLES}
+    assert prefixes == {"anthropic\x1fsys", "nova\x1fsys", "off\x1fsys"}
+
+    headers = {"X-Amzn-Bedrock-Cache-Read-Input-Token-Count": "640",
+               "X-Amzn-Bedrock-Input-Token-Count": "20"}
+    assert prompts.cache_usage({}, headers) == {"cache_read_tokens": 640, "input_tokens": 20}
+    assert prompts.cache_usage({"usage": {"cacheWriteInputTokenCount": 7}}) == {"cache_write_tokens": 7}
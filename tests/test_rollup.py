@@ -0,0 +1,107 @@
+import io
+import json
+import math
+
+import pytest
+
+import rollup
+import session
+import utils
+from series import DAY, Series
+from src import handler
+
+T0 = 1_700_000_000  # 2023-11-14 22:13 UTC
+
+
+def _hourly(n, start=0):
+    return Series([float(100 + (i % 24)) for i in range(start, start + n)],
+                  [T0 + i * 3600 for i in range(start, start + n)])
+
+
+def _columns(pyr):
+    return {k: lvl.to_dict() for k, lvl in pyr.levels.items()}
+
+
+def test_incremental_extend_matches_one_pass_build(monkeypatch):
+    monkeypatch.setattr(rollup.lazy, "np", None)
+    whole = rollup.Pyramid.build(_hourly(2000))
+    parts = rollup.Pyramid.build(_hourly(700))
+    assert parts.extend(_hourly(1500, 500)) == 1300  # 200 already folded in
+    assert _columns(parts) == _columns(whole) and parts.n == whole.n == 2000
+
+    day = whole.levels["day"]
+    assert all(s % DAY == 0 for s in day.start) and sum(day.count) == 2000
+    assert max(day.max) == 123.0 and min(day.min) == 100.0
+    week = whole.levels["week"]
+    assert all((s - 4 * DAY) % (7 * DAY) == 0 for s in week.start)  # Mondays
+
+
+def test_numpy_build_matches_python(monkeypatch):
+    pytest.importorskip("numpy")
+    s = _hourly(5000)
+    fast = _columns(rollup.Pyramid.build(s))
+    monkeypatch.setattr(rollup.lazy, "np", None)
+    assert _columns(rollup.Pyramid.build(s)) == fast
+
+
+@pytest.mark.parametrize("prompt, horizon, level", [
+    ("What was my glucose this morning?", DAY, "hour"),
+    ("what's my latest reading", 3 * 3600, "raw"),
+    ("How did last week go?", 7 * DAY, "day"),
+    ("trend over the past 3 months", 93 * DAY, "week"),
+    ("How was my weight this year? and today?", 366 * DAY, "week"),
+    ("Has it ever been this high?", math.inf, "week"),
+    ("How am I doing?", None, None),
+])
+def test_horizon_detection(prompt, horizon, level):
+    assert rollup.horizon(prompt) == horizon
+    if horizon is not None:
+        assert rollup.level_for(horizon) == level
+
+
+def test_rollup_context_fits_budget_and_falls_back_to_raw():
+    ts = {k: _hourly(9000) for k in ("weight", "glucose")}
+    ctx = utils.build_context_from_payload("How was my weight this year?", ts, 400, mode="rollup")
+    doc = json.loads(ctx)
+    assert list(doc) == ["glucose", "weight"] and utils.est_tokens(ctx) <= 400
+    res = doc["glucose"]["res"]
+    assert res.endswith("d") and int(res[:-1]) % 7 == 0
+    assert sum(r[4] for r in doc["glucose"]["rows"]) >= 8000  # a year of readings, coarsened
+
+    raw = utils.build_context_from_payload("How am I doing?", ts, 400, mode="rollup")
+    assert raw == utils.build_context_from_payload("How am I doing?", ts, 400)
+    untimed = {"glucose": [100.0] * 50}
+    assert json.loads(utils.build_context_from_payload("this year?", untimed, mode="rollup")) == untimed
+
+
+def test_session_pyramid_covers_history_beyond_the_ring():
+    st = session.SessionState(cap=48)
+    for start in range(0, 1000, 100):
+        st.merge({"glucose": _hourly(100, start)})
+    st = session.SessionState.loads(st.dumps(), cap=48)
+    assert len(st.series()["glucose"]) == 48
+    ctx = utils.build_context_from_payload("this month?", st.series(), mode="rollup", pyramids=st.pyramids())
+    rows = json.loads(ctx)["glucose"]["rows"]
+    assert sum(r[4] for r in rows) > 48
+
+
+def test_handler_uses_session_pyramids(monkeypatch):
+    seen = []
+
+    def invoke_model(modelId, body):
+        seen.append(json.loads(body)["messages"])
+        return {"body": io.BytesIO(json.dumps({"content": "OK"}).encode())}
+
+    monkeypatch.setattr(handler, "SESSIONS", session.memory_store())
+    monkeypatch.setattr(handler, "RESPONSE_CACHE", handler.cache.TieredCache(handler.cache.LRUCache(0)))
+    monkeypatch.setattr(handler.bedrock, "invoke_model", invoke_model)
+    for start in (0, 200):
+        s = _hourly(200, start)
+        points = [{"timestamp": t, "value": v} for t, v in zip(s.ts, s.values)]
+        body = {"prompt": "How was this month?", "session_id": "p-7", "context_mode": "rollup", "glucose": points}
+        event = {"body": json.dumps(body),
+                 "requestContext": {"authorizer": {"jwt": {"claims": {"sub": "patient-7"}}}}}
+        assert handler.handler(event, None)["statusCode"] == 200
+    system, vitals, _ = seen[-1]
+    assert system["content"] == handler.SYSTEM_PROMPT_ROLLUP
+    assert sum(r[4] for r in json.loads(vitals["content"])["glucose"]["rows"]) == 400
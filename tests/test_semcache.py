@@ -0,0 +1,92 @@
+import io
+import json
+import random
+import time
+
+import pytest
+
+import metrics
+import semcache
+from src import handler
+
+
+def test_paraphrases_hit_and_different_questions_miss():
+    c = semcache.SemanticCache(threshold=0.9)
+    c.set("ctx", "How is my glucose doing?", "steady")
+    c.set("ctx", "What's my latest BP?", "120/80")
+    for q in ("how's my sugar?", "How is my blood sugar looking", "what is my latest blood pressure"):
+        answer, score = c.get("ctx", q)
+        assert answer is not None and score >= 0.9
+    for q in ("What's my average glucose?", "How is my weight?", "Is my glucose high?",
+              "How was my glucose this week?",   # different horizon
+              "How is my glucose doing at 2am?"):  # numbers must match
+        assert c.get("ctx", q)[0] is None
+    assert c.get("other ctx", "How is my glucose doing?")[0] is None
+    assert c.stats()["hits"] == 3 and c.stats()["misses"] == 6
+
+
+def test_bounded_size_and_ttl():
+    now = [0.0]
+    c = semcache.SemanticCache(maxsize=3, ttl=10.0, clock=lambda: now[0])
+    for i, q in enumerate(("glucose", "weight", "bp")):
+        c.set(f"ctx{i}", q, q.upper())
+    c.get("ctx0", "glucose")                       # ctx0 is now the most recent scope
+    c.set("ctx3", "sleep", "SLEEP")
+    assert len(c) == 3 and c.get("ctx1", "weight")[0] is None and c.stats()["evictions"] == 1
+    for i in range(5):                            # one scope outgrowing maxsize overwrites
+        c.set("big", f"trend {'x' * i}", str(i))
+    assert len(c) == 3 and c.stats()["scopes"] == 1
+    now[0] = 11.0
+    assert c.get("big", "trend xxxx")[0] is None
+
+
+def _fill(c, n, seed=0):
+    words = "glucose weight pressure trend latest average high low spike drop sleep meal".split()
+    rnd = random.Random(seed)
+    for i in range(n):
+        c.set("ctx", " ".join(rnd.sample(words, 4)), f"a{i}")
+
+
+def test_numpy_index_matches_python_and_is_sub_millisecond(monkeypatch):
+    pytest.importorskip("numpy")
+    fast = semcache.SemanticCache(maxsize=20_000, threshold=0.5)
+    _fill(fast, 10_000)
+    q = "how's my sugar trend after a meal"
+    got = fast.get("ctx", q)
+    assert fast._scopes[("ctx", semcache._guard(q))].mat is not None
+    best = min(_timed(lambda: fast.get("ctx", q)) for _ in range(20))
+    assert best < 0.001
+
+    monkeypatch.setattr(semcache.lazy, "np", None)
+    slow = semcache.SemanticCache(maxsize=20_000, threshold=0.5)
+    _fill(slow, 10_000)
+    answer, score = slow.get("ctx", q)
+    assert answer == got[0] and score == pytest.approx(got[1], abs=1e-5)
+
+
+def _timed(fn):
+    t = time.perf_counter()
+    fn()
+    return time.perf_counter() - t
+
+
+def test_handler_serves_paraphrase_without_calling_bedrock(monkeypatch):
+    calls, records = [], []
+
+    def invoke_model(modelId, body):
+        calls.append(modelId)
+        return {"body": io.BytesIO(json.dumps({"content": "Steady."}).encode())}
+
+    monkeypatch.setattr(handler, "RESPONSE_CACHE", handler.cache.TieredCache(handler.cache.LRUCache(0)))
+    monkeypatch.setattr(handler, "SEMANTIC_CACHE", semcache.SemanticCache(maxsize=64))
+    monkeypatch.setattr(handler.bedrock, "invoke_model", invoke_model)
+    prev = metrics.set_sinks([records.append])
+    try:
+        resps = [handler.handler({"body": json.dumps({"prompt": q, "glucose": [100, 110, 120]})}, None)
+                 for q in ("How is my glucose doing?", "how's my sugar?", "Is my sugar high?")]
+    finally:
+        metrics.set_sinks(prev)
+    assert [r["headers"]["X-Cache"] for r in resps] == ["MISS", "HIT", "MISS"]
+    assert json.loads(resps[1]["body"])["answer"] == "Steady." and len(calls) == 2
+    assert [r["semantic_hit"] for r in records] == [False, True, False]
+    assert records[1]["semantic_score"] >= 0.9 and "invoke_ms" not in records[1]
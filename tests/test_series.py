@@ -0,0 +1,50 @@
+import json
+from pathlib import Path
+
+import utils
+from series import DAY, Series, parse_timestamp
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _daily(values, start=1_750_000_000):
+    return [{"timestamp": start + i * DAY, "value": v} for i, v in enumerate(values)]
+
+
+def test_parse_timestamp_formats():
+    assert parse_timestamp("2025-07-22T08:00:00Z") == 1753171200
+    assert parse_timestamp("2025-07-22T08:00:00") == 1753171200
+    assert parse_timestamp(1753171200000) == 1753171200
+    assert parse_timestamp("not a date") is None
+
+
+def test_from_raw_sorts_once_and_trims_latest():
+    raw = _daily([1, 2, 3, 4, 5])
+    s = Series.from_raw(list(reversed(raw)) + [{"timestamp": raw[0]["timestamp"], "value": "nan"}],
+                        max_points=3)
+    assert s.timed and s.tolist() == [3.0, 4.0, 5.0]
+    assert list(s.ts) == sorted(s.ts)
+    assert s.nbytes == 3 * 16
+
+
+def test_untimed_fallback():
+    s = Series.from_raw([1, "2", {"value": 3}, None, "x"])
+    assert not s.timed and s == [1.0, 2.0, 3.0]
+
+
+def test_time_windows_by_binary_search():
+    # 40 daily readings with a 10-day gap: the 7d window holds fewer points
+    raw = _daily(range(30)) + _daily(range(30, 40), start=1_750_000_000 + 40 * DAY)
+    s = Series.from_raw(raw)
+    assert len(s) - s.window_start(7 * DAY) == 7
+    assert len(s) - s.window_start(30 * DAY) == 20
+    text = utils.describe_series(s, "glucose")
+    assert "7d avg: 36.0" in text and "30d avg: 29.5" in text and "Δ30d: +19.0" in text
+
+
+def test_validate_payload_returns_series():
+    prompt, ts = utils.validate_payload(json.loads((ROOT / "payload.json").read_text()))
+    assert set(ts) == {"glucose", "weight", "bp_sys", "bp_dia"}
+    assert all(isinstance(v, Series) and v.timed for v in ts.values())
+    ctx = json.loads(utils.build_context_from_payload(prompt, ts))
+    assert ctx["glucose"] == [112.0, 118.0]
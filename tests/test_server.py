@@ -0,0 +1,165 @@
+import http.client
+import io
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import server
+import handler
+
+EVENT = {"prompt": "How is my glucose?", "glucose": [100, 110, 120]}
+
+
+def _fake_bedrock(monkeypatch, delay=0.0):
+    def invoke_model(modelId, body):
+        time.sleep(delay)
+        return {"body": io.BytesIO(json.dumps({"content": "Steady."}).encode())}
+
+    monkeypatch.setattr(handler, "RESPONSE_CACHE", handler.cache.TieredCache(handler.cache.LRUCache(0)))
+    monkeypatch.setattr(handler.bedrock, "invoke_model", invoke_model)
+
+
+@pytest.fixture
+def running():
+    """Start a one-process server in a thread; yields (port, worker)."""
+    started = []
+
+    def start(**limits):
+        sock = server.bind(port=0)
+        worker = server.Worker(**limits)
+        ready = threading.Event()
+        t = threading.Thread(target=worker.run, args=(sock, ready), daemon=True)
+        t.start()
+        assert ready.wait(5)
+        started.append((worker, t, sock))
+        return sock.getsockname()[1], worker
+
+    yield start
+    for worker, t, sock in started:
+        worker.stop()
+        t.join(5)
+        sock.close()
+
+
+def _post(port, payload, path="/query", conn=None):
+    conn = conn or http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    conn.request("POST", path, json.dumps(payload).encode(), {"Content-Type": "application/json"})
+    resp = conn.getresponse()
+    return resp, resp.read()
+
+
+def test_query_keep_alive_stream_and_errors(monkeypatch, running):
+    _fake_bedrock(monkeypatch)
+    port, _ = running()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    for _ in range(3):                                  # one connection, several requests
+        resp, body = _post(port, EVENT, conn=conn)
+        assert resp.status == 200 and json.loads(body)["answer"] == "Steady."
+        assert resp.getheader("Connection") == "keep-alive"
+    assert _post(port, {"glucose": [1]}, conn=conn)[0].status == 400
+    assert _post(port, EVENT, path="/nope", conn=conn)[0].status == 404
+
+    resp, body = _post(port, {"items": [EVENT, {"glucose": [1]}]}, path="/query/batch", conn=conn)
+    results = json.loads(body)["results"]
+    assert resp.status == 200 and results[0]["answer"] == "Steady." and results[1]["status"] == 400
+    assert _post(port, {"items": [EVENT]}, conn=conn)[0].status == 400     # batch only on its route
+
+    monkeypatch.setattr(handler.bedrock, "invoke_model_with_response_stream", lambda modelId, body: {
+        "body": [{"chunk": {"bytes": json.dumps({"type": "content_block_delta",
+                                                 "delta": {"text": "Hi"}}).encode()}}]}, raising=False)
+    resp, body = _post(port, EVENT, path="/query/stream")
+    assert resp.status == 200 and b'"answer": "Hi"' in body
+
+    conn.request("GET", "/healthz")
+    health = json.loads(conn.getresponse().read())
+    assert health["status"] == "ok" and health["inflight"] == 0
+
+
+def test_limits(monkeypatch, running):
+    _fake_bedrock(monkeypatch, delay=0.3)
+    port, _ = running(max_body_bytes=1024, max_header_bytes=2048, max_inflight=1)
+    resp, _ = _post(port, {**EVENT, "glucose": [100] * 1000})
+    assert resp.status == 413
+
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    conn.request("GET", "/healthz", headers={"X-Big": "x" * 4096})
+    assert conn.getresponse().status == 431
+
+    with ThreadPoolExecutor(2) as pool:
+        statuses = sorted(f.result()[0].status for f in [pool.submit(_post, port, EVENT) for _ in range(2)])
+    assert statuses == [200, 503]
+
+
+def test_model_waits_do_not_block_other_requests(monkeypatch, running):
+    _fake_bedrock(monkeypatch, delay=0.4)
+    port, _ = running()
+    t = time.perf_counter()
+    with ThreadPoolExecutor(4) as pool:
+        slow = [pool.submit(_post, port, EVENT) for _ in range(4)]
+        time.sleep(0.1)
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.request("GET", "/healthz")
+        health = json.loads(conn.getresponse().read())
+        assert health["inflight"] == 4 and time.perf_counter() - t < 0.35
+        assert [f.result()[0].status for f in slow] == [200] * 4
+    assert time.perf_counter() - t < 1.2                 # overlapped, not 4 x 0.4 s
+
+
+def test_graceful_shutdown_finishes_in_flight_requests(monkeypatch, running):
+    _fake_bedrock(monkeypatch, delay=0.4)
+    port, worker = running()
+    idle = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    idle.request("GET", "/healthz")
+    idle.getresponse().read()                           # now an idle keep-alive connection
+    with ThreadPoolExecutor(1) as pool:
+        fut = pool.submit(_post, port, EVENT)
+        time.sleep(0.1)
+        worker.stop()
+        resp, body = fut.result()
+    assert resp.status == 200 and resp.getheader("Connection") == "close"
+    with pytest.raises((ConnectionError, http.client.HTTPException, OSError)):
+        idle.request("GET", "/healthz")
+        idle.getresponse()
+    with pytest.raises(OSError):
+        socket.create_connection(("127.0.0.1", port), timeout=1).recv(1) or _refused()
+
+
+def _refused():
+    raise ConnectionRefusedError
+
+
+@pytest.mark.skipif("fork" not in __import__("multiprocessing").get_all_start_methods(),
+                    reason="workers inherit the fake Bedrock through fork")
+def test_supervisor_runs_workers_and_stops_them(monkeypatch):
+    _fake_bedrock(monkeypatch)
+    sock = server.bind(port=0)
+    port = sock.getsockname()[1]
+    sup = server.Supervisor(sock, workers=2, grace_s=1.0)
+    t = threading.Thread(target=sup.run, daemon=True)
+    t.start()
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                resp, body = _post(port, EVENT)
+                break
+            except ConnectionError:
+                assert time.monotonic() < deadline
+                time.sleep(0.05)
+        assert resp.status == 200 and json.loads(body)["answer"] == "Steady."
+        assert len(sup.procs) == 2 and all(p.is_alive() for p in sup.procs)
+
+        victim = sup.procs[0]
+        victim.kill()
+        victim.join()
+        time.sleep(0.5)
+        assert victim not in sup.procs and all(p.is_alive() for p in sup.procs)   # replaced
+    finally:
+        sup.stop()
+        t.join(10)
+        sock.close()
+    assert not t.is_alive() and all(p.exitcode == 0 for p in sup.procs)
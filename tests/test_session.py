@@ -0,0 +1,112 @@
+import io
+import json
+import statistics
+
+import pytest
+
+import session
+import utils
+from series import DAY, Series
+from src import handler
+
+T0 = 1_750_000_000
+
+
+def _timed(start, n, base=100.0):
+    return Series([base + (start + i) % 11 for i in range(n)], [T0 + (start + i) * 3600 for i in range(n)])
+
+
+def test_welford_and_ring_match_full_history():
+    st = session.SessionState(cap=64)
+    for start in range(0, 300, 25):
+        st.merge({"glucose": _timed(start, 25)})
+    full = _timed(0, 300)
+    tot = st.totals()["glucose"]
+    assert tot["count"] == 300
+    assert tot["mean"] == pytest.approx(statistics.fmean(full))
+    assert tot["std"] == pytest.approx(statistics.stdev(full))
+    assert (tot["min"], tot["max"]) == (min(full), max(full))
+    assert st.series()["glucose"] == full[-64:]
+
+
+def test_resent_points_are_skipped_and_kinds_cannot_mix():
+    st = session.SessionState()
+    assert st.merge({"weight": _timed(0, 10)}) == {"weight": 10}
+    assert st.merge({"weight": _timed(5, 10)}) == {"weight": 5}  # overlaps 5
+    with pytest.raises(ValueError):
+        st.merge({"weight": Series([80.0])})
+
+
+def test_serialised_state_round_trips(tmp_path):
+    store = session.SessionStore(session.cache.FileCache(str(tmp_path)))
+    st = session.SessionState(cap=16)
+    st.merge({"glucose": _timed(0, 40), "weight": Series([80.0, 81.0])})
+    store.put("p-1", st)
+    back = store.get("p-1")
+    assert back.series() == st.series() and back.totals() == st.totals()
+    assert store.get("missing") is None
+
+
+def test_validate_and_summarise_merge_deltas():
+    st = session.SessionState()
+    utils.validate_payload({"prompt": "q", "glucose": [{"timestamp": T0, "value": 100}]}, session=st)
+    _, merged = utils.validate_payload(
+        {"prompt": "q", "glucose": [{"timestamp": T0 + DAY, "value": 110}]}, session=st)
+    assert merged["glucose"].tolist() == [100.0, 110.0]
+
+    text = utils.summarise_vitals(glucose=Series([120.0], [T0 + 2 * DAY]), session=st)
+    assert "latest glucose: 120.0 mg/dL" in text and "all-time avg: 110.0 mg/dL (n=3)" in text
+
+
+def _event(body, patient_id):
+    return {"body": body, "requestContext": {"authorizer": {"jwt": {"claims": {"sub": patient_id}}}}}
+
+
+def test_handler_accepts_deltas_per_session(monkeypatch):
+    seen = []
+
+    def invoke_model(modelId, body):
+        seen.append(json.loads(body)["messages"][1]["content"])
+        return {"body": io.BytesIO(json.dumps({"content": "OK"}).encode())}
+
+    monkeypatch.setattr(handler, "SESSIONS", session.memory_store())
+    monkeypatch.setattr(handler, "RESPONSE_CACHE", handler.cache.TieredCache(handler.cache.LRUCache(0)))
+    monkeypatch.setattr(handler.bedrock, "invoke_model", invoke_model)
+    for delta in ([100, 101], [102]):
+        body = json.dumps({"prompt": "trend?", "session_id": "p-1", "glucose": delta})
+        assert handler.handler(_event(body, "alice"), None)["statusCode"] == 200
+    assert json.loads(seen[-1])["glucose"] == [100.0, 101.0, 102.0]
+
+    bad = json.dumps({"prompt": "q", "session_id": "../etc", "glucose": [1]})
+    assert handler.handler(_event(bad, "alice"), None)["statusCode"] == 400
+    # a request that fails after the merge leaves the session untouched
+    late = json.dumps({"prompt": "trend?", "session_id": "p-1", "glucose": [500],
+                       "context_mode": "prose"})
+    assert handler.handler(_event(late, "alice"), None)["statusCode"] == 400
+    body = json.dumps({"prompt": "trend?", "session_id": "p-1", "glucose": [103]})
+    assert handler.handler(_event(body, "alice"), None)["statusCode"] == 200
+    assert json.loads(seen[-1])["glucose"] == [100.0, 101.0, 102.0, 103.0]
+
+
+def test_sessions_are_private_to_the_authenticated_patient(monkeypatch):
+    seen = []
+
+    def invoke_model(modelId, body):
+        sent = json.loads(json.loads(body)["messages"][1]["content"])
+        seen.append({k: v for k, v in sent.items() if v})
+        return {"body": io.BytesIO(json.dumps({"content": "OK"}).encode())}
+
+    monkeypatch.setattr(handler, "SESSIONS", session.memory_store())
+    monkeypatch.setattr(handler, "RESPONSE_CACHE", handler.cache.TieredCache(handler.cache.LRUCache(0)))
+    monkeypatch.setattr(handler.bedrock, "invoke_model", invoke_model)
+    alice = json.dumps({"prompt": "trend?", "session_id": "p-1", "glucose": [100, 101]})
+    assert handler.handler(_event(alice, "alice"), None)["statusCode"] == 200
+    mallory = json.dumps({"prompt": "trend?", "session_id": "p-1", "weight": [70]})
+    assert handler.handler(_event(mallory, "mallory"), None)["statusCode"] == 200
+    assert seen[-1] == {"weight": [70.0]}             # nothing of alice's session
+    again = json.dumps({"prompt": "trend?", "session_id": "p-1", "glucose": [102]})
+    assert handler.handler(_event(again, "alice"), None)["statusCode"] == 200
+    assert seen[-1] == {"glucose": [100.0, 101.0, 102.0]}   # nor did mallory write to it
+
+    anonymous = handler.handler({"body": alice}, None)
+    assert anonymous["statusCode"] == 401 and len(seen) == 3
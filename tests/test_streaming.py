@@ -0,0 +1,76 @@
+import http.client
+import json
+import threading
+
+import pytest
+import streaming
+from src import handler
+
+
+def _event(chunk):
+    return {"chunk": {"bytes": json.dumps(chunk).encode()}}
+
+
+@pytest.mark.parametrize("chunk,text", [
+    ({"type": "content_block_delta", "delta": {"type": "text_delta", "text": "Hi"}}, "Hi"),
+    ({"generation": "Hi"}, "Hi"),
+    ({"choices": [{"delta": {"content": "Hi"}}]}, "Hi"),
+    ({"choices": [{"text": "Hi", "stop_reason": None}]}, "Hi"),
+    ({"message": {"content": "Hi"}}, "Hi"),
+    ({"outputText": "Hi"}, "Hi"),
+    ({"results": [{"outputText": "Hi"}]}, "Hi"),
+    ({"type": "message_stop"}, None),
+])
+def test_chunk_text_provider_shapes(chunk, text):
+    assert streaming.chunk_text(chunk) == text
+
+
+def test_stream_handler_yields_before_model_finishes(monkeypatch):
+    produced = []
+
+    def events():
+        for word in ("Glucose ", "looks ", "stable."):
+            produced.append(word)
+            yield _event({"type": "content_block_delta", "delta": {"text": word}})
+
+    monkeypatch.setattr(handler.bedrock, "invoke_model_with_response_stream",
+                        lambda **_: {"body": events()})
+    frames = handler.stream_handler({"body": json.dumps({"prompt": "hi", "glucose": [1]})}, None)
+
+    first = next(frames)
+    assert produced == ["Glucose "]                      # first token sent immediately
+    assert json.loads(first.decode().split("data: ")[1]) == {"delta": "Glucose "}
+    rest = list(frames)
+    assert rest[-1].startswith(b"event: done")
+    assert json.loads(rest[-1].decode().split("data: ")[1])["answer"] == "Glucose looks stable."
+
+
+def test_stream_error_event(monkeypatch):
+    monkeypatch.setattr(handler.bedrock, "invoke_model_with_response_stream",
+                        lambda **_: {"body": [_event({"delta": {"text": "a"}}),
+                                              {"throttlingException": {"message": "slow down"}}]})
+    frames = list(handler.stream_handler({"body": json.dumps({"prompt": "hi"})}, None))
+    assert frames[-1].startswith(b"event: error")
+    assert b"slow down" in frames[-1]
+    bad = list(handler.stream_handler({"body": "{}"}, None))
+    assert len(bad) == 1 and b'"status": 400' in bad[0]
+
+
+def test_dev_server_streams_chunked(monkeypatch):
+    import dev_server
+    monkeypatch.setattr(dev_server.handler.bedrock, "invoke_model_with_response_stream",
+                        lambda **_: {"body": [_event({"generation": "O"}), _event({"generation": "K"})]})
+    srv = dev_server.make_server(port=0)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", srv.server_port, timeout=5)
+        conn.request("POST", "/query/stream", body=json.dumps({"prompt": "hi"}))
+        resp = conn.getresponse()
+        assert resp.getheader("Content-Type").startswith("text/event-stream")
+        body = resp.read().decode()
+        conn.request("POST", "/query/batch", body=json.dumps({"items": [{"glucose": [1]}]}))
+        batch = conn.getresponse()
+        assert batch.status == 200 and json.loads(batch.read())["results"][0]["status"] == 400
+    finally:
+        srv.shutdown()
+    assert body.count("data: ") == 3 and '"answer": "OK"' in body
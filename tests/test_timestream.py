@@ -0,0 +1,146 @@
+import json
+import re
+
+import pytest
+import timestream
+from src import handler
+
+
+def _row(name, ms, val):
+    return {"Data": [{"ScalarValue": name}, {"ScalarValue": str(ms)}, {"ScalarValue": str(val)}]}
+
+
+class FakeQueryClient:
+    """Serves rows from a table, `page_size` rows per page, honouring the
+    `time > from_milliseconds(..)` lower bound used for refreshes."""
+
+    def __init__(self, rows, page_size=2):
+        self.rows = rows
+        self.page_size = page_size
+        self.queries = []
+
+    def query(self, QueryString, NextToken=None):
+        self.queries.append((QueryString, NextToken))
+        m = re.search(r"from_milliseconds\((\d+)\)", QueryString)
+        rows = [r for r in self.rows if not m or int(r["Data"][1]["ScalarValue"]) > int(m.group(1))]
+        start = int(NextToken or 0)
+        page = {"Rows": rows[start:start + self.page_size]}
+        if start + self.page_size < len(rows):
+            page["NextToken"] = str(start + self.page_size)
+        return page
+
+
+ROWS = [_row("glucose", 1_000_000, 110), _row("weight", 1_000_000, 80.5),
+        _row("bp_sys", 2_000_000, 120), _row("bp_dia", 2_000_000, 80),
+        _row("glucose", 3_000_000, 118)]
+
+
+def _event(payload, patient_id):
+    """An HTTP API event whose JWT authorizer verified `patient_id`."""
+    return {"body": json.dumps(payload),
+            "requestContext": {"authorizer": {"jwt": {"claims": {"sub": patient_id}}}}}
+
+
+def test_single_query_with_pagination():
+    client = FakeQueryClient(ROWS, page_size=2)
+    out = timestream.fetch_latest_many(client, "vitals_db", "vitals_ts", patient_id="p-1")
+    assert len({q for q, _ in client.queries}) == 1           # one SQL statement
+    assert [tok for _, tok in client.queries] == [None, "2", "4"]
+    q = client.queries[0][0]
+    assert "measure_name IN ('glucose', 'weight', 'bp_sys', 'bp_dia')" in q
+    assert "patient_id = 'p-1'" in q
+    assert out["glucose"].tolist() == [110.0, 118.0]
+    assert list(out["glucose"].ts) == [1000, 3000]
+
+
+def test_identifiers_are_validated_and_a_patient_is_required():
+    with pytest.raises(ValueError):
+        timestream.build_query("db", "tbl", ["glucose"], patient_id="x' OR '1'='1")
+    with pytest.raises(ValueError):
+        timestream.build_query("db", "tbl", ["glucose"])
+    cache = timestream.SeriesCache(lambda **kw: pytest.fail("no query without a patient"))
+    with pytest.raises(ValueError):
+        cache.get(None)
+
+
+def test_cache_hits_then_refreshes_incrementally():
+    clock = [0.0]
+    client = FakeQueryClient(list(ROWS), page_size=10)
+    cache = timestream.SeriesCache(
+        lambda **kw: timestream.fetch_latest_many(client, "db", "tbl", **kw),
+        ttl=60, clock=lambda: clock[0])
+    assert cache.get("p")["glucose"].tolist() == [110.0, 118.0]
+    cache.get("p")
+    assert (cache.misses, cache.hits) == (1, 1) and len(client.queries) == 1
+
+    client.rows.append(_row("glucose", 4_000_000, 125))
+    clock[0] = 61
+    out = cache.get("p")
+    assert out["glucose"].tolist() == [110.0, 118.0, 125.0]
+    assert out["bp_sys"].tolist() == [120.0]
+    assert "from_milliseconds(1000999)" in client.queries[-1][0]   # oldest latest ts
+    assert cache.refreshes == 1
+
+
+def test_handler_fetches_missing_series_in_one_call(monkeypatch):
+    client = FakeQueryClient(ROWS, page_size=10)
+    monkeypatch.setattr(handler, "USE_TIMESTREAM", True)
+    monkeypatch.setattr(handler, "ts_q", client)
+    monkeypatch.setattr(handler, "DB", "vitals_db")
+    monkeypatch.setattr(handler, "TBL", "vitals_ts")
+    seen = {}
+    def invoke(modelId, body):
+        seen["ctx"] = json.loads(json.loads(body)["messages"][1]["content"])
+        return {"body": __import__("io").BytesIO(b'{"content": "OK"}')}
+    monkeypatch.setattr(handler.bedrock, "invoke_model", invoke)
+
+    evt = _event({"prompt": "hi", "glucose": [99]}, "p-2")
+    assert handler.handler(evt, None)["statusCode"] == 200
+    assert len(client.queries) == 1
+    assert "'glucose'" not in client.queries[0][0] and "patient_id = 'p-2'" in client.queries[0][0]
+    assert seen["ctx"] == {"glucose": [99.0], "weight": [80.5], "bp_sys": [120.0], "bp_dia": [80.0]}
+
+
+def test_handler_reads_timestream_only_for_the_authenticated_patient(monkeypatch):
+    client = FakeQueryClient(ROWS, page_size=10)
+    monkeypatch.setattr(handler, "USE_TIMESTREAM", True)
+    monkeypatch.setattr(handler, "ts_q", client)
+    monkeypatch.setattr(handler, "DB", "vitals_db")
+    monkeypatch.setattr(handler, "TBL", "vitals_ts")
+    seen = []
+    def invoke(modelId, body):
+        seen.append(json.loads(json.loads(body)["messages"][1]["content"]))
+        return {"body": __import__("io").BytesIO(b'{"content": "OK"}')}
+    monkeypatch.setattr(handler.bedrock, "invoke_model", invoke)
+
+    # a patient_id in the body is not an identity: nothing is fetched
+    spoofed = {"body": json.dumps({"prompt": "hi", "patient_id": "p-2", "glucose": [99]})}
+    assert handler.handler(spoofed, None)["statusCode"] == 200
+    assert not client.queries and {k: v for k, v in seen[-1].items() if v} == {"glucose": [99.0]}
+
+    # Timestream failing (or a malformed claim) falls back to the payload's vitals
+    def throttled(**_):
+        raise type("ThrottlingException", (Exception,), {})("Rate exceeded")
+    monkeypatch.setattr(client, "query", throttled)
+    for pid in ("p-4", "p' --"):
+        resp = handler.handler(_event({"prompt": "hi", "glucose": [98]}, pid), None)
+        assert resp["statusCode"] == 200 and {k: v for k, v in seen[-1].items() if v} == {"glucose": [98.0]}
+
+
+def test_handler_fetches_only_series_the_question_needs(monkeypatch):
+    client = FakeQueryClient(ROWS, page_size=10)
+    monkeypatch.setattr(handler, "USE_TIMESTREAM", True)
+    monkeypatch.setattr(handler, "ts_q", client)
+    monkeypatch.setattr(handler, "DB", "vitals_db")
+    monkeypatch.setattr(handler, "TBL", "vitals_ts")
+    seen = {}
+    def invoke(modelId, body):
+        seen["ctx"] = json.loads(json.loads(body)["messages"][1]["content"])
+        return {"body": __import__("io").BytesIO(b'{"content": "OK"}')}
+    monkeypatch.setattr(handler.bedrock, "invoke_model", invoke)
+
+    evt = _event({"prompt": "Am I losing weight?", "glucose": [99]}, "p-3")
+    assert handler.handler(evt, None)["statusCode"] == 200
+    (query,) = client.queries
+    assert "'weight'" in query[0] and "'glucose'" not in query[0] and "'bp_sys'" not in query[0]
+    assert seen["ctx"] == {"weight": [80.5]}
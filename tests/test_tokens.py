@@ -0,0 +1,73 @@
+import json
+import random
+
+import pytest
+import tokens
+import utils
+
+
+@pytest.fixture(autouse=True)
+def reset_counter():
+    yield
+    tokens.set_counter(None)
+
+
+def test_pretok_numpy_matches_regex():
+    np = pytest.importorskip("numpy")
+    rnd = random.Random(3)
+    texts = [
+        json.dumps({"glucose": [round(rnd.uniform(70, 200), 1) for _ in range(300)]}),
+        "hello  world\n\n  foo_bar  12345678 ,.;'!! x " * 20,
+        open(__file__).read(),
+    ]
+    c = tokens.PretokCounter()
+    for t in texts:
+        assert c.count(t) == len(tokens._PRETOK.findall(t))
+    assert np is not None
+
+
+def test_numeric_json_counts_digit_groups():
+    c = tokens.PretokCounter()
+    assert c.count("[112.0,1234.5]") == 10  # [ 112 . 0 , 123 4 . 5 ]
+    assert tokens.CharCounter().count("x" * 40) == 11
+
+
+def test_counter_is_pluggable_and_memoised():
+    calls = []
+
+    class Fake(tokens.TokenCounter):
+        name = "fake"
+        def count(self, text):
+            calls.append(text)
+            return len(text)
+
+    tokens.set_counter(Fake())
+    assert utils.est_tokens("abcd") == 4
+    tokens.count_fragment("frag")
+    tokens.count_fragment("frag")
+    assert calls == ["abcd", "frag"]
+    big = "9," * tokens.FRAGMENT_MEMO_CHARS            # too long to keep in the memo
+    assert tokens.count_fragment(big) == tokens.count_fragment(big) == len(big)
+    assert calls[2:] == [big, big] and tokens._count_short.cache_info().currsize == 1
+    tokens.clear_memo()
+    tokens.count_fragment("frag")
+    assert calls[4:] == ["frag"]
+
+
+def test_packer_fills_budget_exactly():
+    rnd = random.Random(0)
+    ts = {k: [float(rnd.randint(60, 200)) for _ in range(10_000)]
+          for k in ("glucose", "weight", "bp_sys", "bp_dia")}
+    for budget in (100, 700, 2000):
+        ctx = utils.build_context_from_payload("q", ts, max_context_tokens=budget)
+        used = utils.est_tokens(ctx)
+        assert budget - 5 <= used <= budget
+        assert set(json.loads(ctx)) == set(ts)
+
+
+def test_trim_text_to_tokens_fits_budget():
+    text = "\n".join(f"line {i}: " + "word " * 10 for i in range(200))
+    out = utils.trim_text_to_tokens(text, 150)
+    assert utils.est_tokens(out) <= 150
+    assert out.endswith("[...truncated for token budget...]")
+    assert utils.trim_text_to_tokens("short", 150) == "short"
@@ -0,0 +1,61 @@
+import random
+import pytest
+import utils
+
+
+def _vitals(n, seed=0):
+    rnd = random.Random(seed)
+    return {
+        "glucose": [round(rnd.uniform(70, 220), 1) for _ in range(n)],
+        "weight":  [round(80 + rnd.gauss(0, 0.5), 2) for _ in range(n)],
+        "bp_sys":  [float(rnd.randint(100, 160)) for _ in range(n)],
+        "bp_dia":  [float(rnd.randint(60, 100)) for _ in range(n)],
+    }
+
+
+def test_describe_series_text():
+    x = [100.0] * 29 + [130.0]
+    assert utils.describe_series(x, "glucose", units=" mg/dL") == (
+        "latest glucose: 130.0 mg/dL | 7pt avg: 104.3 mg/dL | "
+        "30pt avg: 101.0 mg/dL | Δ30: +30.0 mg/dL | (+30.0%)"
+    )
+    assert utils.describe_series([], "weight") == "No weight data available."
+
+
+@pytest.mark.parametrize("n", [0, 1, 6, 7, 29, 30, 1000, 10_000])
+def test_numpy_engine_parity(monkeypatch, n):
+    pytest.importorskip("numpy")
+    v = _vitals(n, seed=n)
+    starts = {k: utils._window_starts(x, (7, 30)) for k, x in v.items()}
+    py = utils._window_stats_py(v, starts)
+    fast = utils._window_stats_np(v, starts)
+    assert py.keys() == fast.keys()
+    for name in py:
+        assert py[name]["latest"] == fast[name]["latest"]
+        for w, ref in py[name]["windows"].items():
+            got = fast[name]["windows"][w]
+            for field, val in ref.items():
+                assert got[field] == pytest.approx(val, rel=1e-9, abs=1e-9), (name, w, field)
+
+    monkeypatch.setattr(utils.lazy, "NP_MIN_POINTS", 0)
+    text_np = utils.summarise_vitals(**v)
+    monkeypatch.setattr(utils.lazy, "np", None)
+    assert utils.summarise_vitals(**v) == text_np
+
+
+def test_summarise_vitals_bp():
+    out = utils.summarise_vitals(bp_sys=[120.0, 130.0], bp_dia=[80.0, 90.0])
+    assert out == "Blood pressure: latest 130/90 mmHg | 7pt avg: 125/85 mmHg"
+    assert utils.summarise_vitals(bp_sys=[120.0]) == "Blood pressure: incomplete series supplied."
+
+
+@pytest.mark.parametrize("prompt, series", [
+    ("How is my blood sugar after meals?", ("glucose",)),
+    ("Am I losing weight? (lbs/kg)", ("weight",)),
+    ("Is my BP and glucose ok this week?", ("glucose", "bp_sys", "bp_dia")),
+    ("Any trend in my systolic readings?", ("bp_sys",)),
+    ("How am I doing overall?", utils.SERIES),
+    ("", utils.SERIES),
+])
+def test_relevant_series(prompt, series):
+    assert utils.relevant_series(prompt) == series
@@ -0,0 +1,84 @@
+import io
+import json
+import random
+
+import pytest
+
+import utils
+import wire
+from series import Series
+from src import handler
+
+T0 = 1_700_000_000
+
+
+def _vitals(n=300, seed=0):
+    rnd = random.Random(seed)
+    ts = [T0 + i * 300 for i in range(n)]
+    return {
+        "glucose": Series([rnd.uniform(60, 250) for _ in range(n)], ts),
+        "weight": Series([72.46] * 5 + [72.31, 71.9], [T0 + d * 86_400 for d in range(7)]),
+        "bp_sys": Series([121.0, 119.6, 119.6], [T0, T0, T0 + 600]),   # two readings at one time
+        "bp_dia": [],
+    }
+
+
+@pytest.mark.parametrize("enc", wire.ENCODINGS)
+def test_round_trip_is_exact_after_rounding(enc):
+    vitals = _vitals()
+    text = wire.encode(vitals, enc)
+    back = wire.decode(text, enc)
+    assert list(back) == list(vitals)
+    for k, x in vitals.items():
+        assert list(back[k]) == wire.rounded(x, k)
+        if enc == "columns" and len(x):
+            assert back[k].ts == x.ts                  # timestamps survive too
+    assert "181.10000000000002" not in wire.encode({"glucose": [181.10000000000002]}, enc)
+
+    untimed = {"glucose": [100.0, 101.4, 99.5], "weight": [80.05]}
+    assert wire.decode(wire.encode(untimed, enc), enc) == {"glucose": [100.0, 101.0, 100.0], "weight": [80.0]}
+
+
+def test_formats():
+    x = {"glucose": [100, 110, 105, 105, 105, 105], "weight": [72.5, 72.5, 72.3]}
+    assert wire.encode(x, "fixed") == '{"glucose":[100,110,105,105,105,105],"weight":[72.5,72.5,72.3]}'
+    assert wire.encode(x, "delta") == '{"glucose":"100,+10,-5,+0*3","weight":"72.5,+0.0,-0.2"}'
+    timed = {"glucose": Series([100, 110], [T0, T0 + 300]), "weight": Series([72.5], [T0 + 300])}
+    assert wire.encode(timed, "columns").split("\n")[1:] == ["t,glucose,weight", "0,100", "5,110,72.5"]
+    with pytest.raises(ValueError):
+        wire.encode(x, "yaml")
+
+
+@pytest.mark.parametrize("enc", wire.ENCODINGS)
+def test_packed_encodings_fit_budget_with_more_history_than_json(enc):
+    vitals = _vitals(n=3000)
+    packed = {}
+    for e in ("json", enc):
+        ctx = utils.build_context_from_payload("q", vitals, 400, encoding=e)
+        assert utils.est_tokens(ctx) <= 400
+        packed[e] = len((json.loads(ctx) if e == "json" else wire.decode(ctx, e))["glucose"])
+    assert packed[enc] > 0
+    if enc != "columns":                               # columns also pays for timestamps
+        assert packed[enc] > 1.3 * packed["json"]
+    # rollup falls back to plain JSON arrays, which its system prompt describes
+    assert utils.build_context_from_payload("q", vitals, 400, mode="rollup", encoding=enc).startswith("{")
+    with pytest.raises(ValueError):
+        utils.build_context_from_payload("q", vitals, 400, encoding="yaml")
+
+
+def test_handler_encoding_and_format_note(monkeypatch):
+    sent = []
+
+    def invoke_model(modelId, body):
+        sent.append(json.loads(body))
+        return {"body": io.BytesIO(json.dumps({"content": "ok"}).encode())}
+
+    monkeypatch.setattr(handler, "RESPONSE_CACHE", handler.cache.TieredCache(handler.cache.LRUCache(0)))
+    monkeypatch.setattr(handler.bedrock, "invoke_model", invoke_model)
+    payload = {"prompt": "How is my glucose?", "glucose": [100.4, 110.6], "context_encoding": "delta"}
+    assert handler.handler({"body": json.dumps(payload)}, None)["statusCode"] == 200
+    text = json.dumps(sent[-1])
+    assert "100,+11" in text and wire.FORMAT_NOTES["delta"] in text
+
+    payload["context_encoding"] = "yaml"
+    assert handler.handler({"body": json.dumps(payload)}, None)["statusCode"] == 400